@@ -0,0 +1,28 @@
+"""add gallery contact_sheet
+
+Revision ID: a4d7e2b9c638
+Revises: f3c6a8e1b527
+Create Date: 2025-07-28 09:41:17.208335
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4d7e2b9c638'
+down_revision: Union[str, None] = 'f3c6a8e1b527'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('gallery', sa.Column('contact_sheet', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('gallery', 'contact_sheet')
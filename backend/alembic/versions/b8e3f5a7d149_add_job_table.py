@@ -0,0 +1,57 @@
+"""add job table
+
+Revision ID: b8e3f5a7d149
+Revises: a4d7e2b9c638
+Create Date: 2025-07-29 14:05:33.617208
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e3f5a7d149'
+down_revision: Union[str, None] = 'a4d7e2b9c638'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('type', sa.String(length=50), nullable=False),
+        sa.Column('payload', sa.JSON(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('dedupe_key', sa.String(length=100), nullable=True),
+        sa.Column(
+            'active_dedupe_key', sa.String(length=100),
+            sa.Computed("CASE WHEN status IN ('queued', 'running') THEN dedupe_key END", persisted=True),
+            nullable=True,
+        ),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('max_attempts', sa.Integer(), nullable=False),
+        sa.Column('run_at', sa.DateTime(), nullable=False),
+        sa.Column('locked_by', sa.String(length=100), nullable=True),
+        sa.Column('locked_until', sa.DateTime(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_job_id'), 'job', ['id'], unique=False)
+    op.create_index(op.f('ix_job_dedupe_key'), 'job', ['dedupe_key'], unique=False)
+    op.create_index('ix_job_status_run_at', 'job', ['status', 'run_at'], unique=False)
+    op.create_index('uq_job_active_dedupe_key', 'job', ['active_dedupe_key'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_job_active_dedupe_key', table_name='job')
+    op.drop_index('ix_job_status_run_at', table_name='job')
+    op.drop_index(op.f('ix_job_dedupe_key'), table_name='job')
+    op.drop_index(op.f('ix_job_id'), table_name='job')
+    op.drop_table('job')
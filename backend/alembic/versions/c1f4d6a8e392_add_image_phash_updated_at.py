@@ -0,0 +1,31 @@
+"""add image.phash_updated_at for incremental phash index refresh
+
+Revision ID: c1f4d6a8e392
+Revises: b8e3f5a7d149
+Create Date: 2026-10-18 10:12:41.503817
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c1f4d6a8e392'
+down_revision: Union[str, None] = 'b8e3f5a7d149'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 已有记录保持为空：它们由索引按ID加载，之后的改写会填写该列
+    op.add_column('image', sa.Column('phash_updated_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index(op.f('ix_image_phash_updated_at'), 'image', ['phash_updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_image_phash_updated_at'), table_name='image')
+    op.drop_column('image', 'phash_updated_at')
@@ -0,0 +1,30 @@
+"""add image.phash perceptual hash column
+
+Revision ID: c4e8a1d3f215
+Revises: b7d2f4a6c803
+Create Date: 2025-07-23 14:05:37.204519
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e8a1d3f215'
+down_revision: Union[str, None] = 'b7d2f4a6c803'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('image', sa.Column('phash', sa.String(length=16), nullable=True))
+    op.create_index(op.f('ix_image_phash'), 'image', ['phash'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_image_phash'), table_name='image')
+    op.drop_column('image', 'phash')
@@ -0,0 +1,45 @@
+"""add content-addressed blob table and image.blob_hash
+
+Revision ID: d9f1b3c5e724
+Revises: c4e8a1d3f215
+Create Date: 2025-07-24 10:12:48.530917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd9f1b3c5e724'
+down_revision: Union[str, None] = 'c4e8a1d3f215'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'blob',
+        sa.Column('hash', sa.String(length=64), nullable=False),
+        sa.Column('path', sa.String(length=500), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=True),
+        sa.Column('refcount', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('hash')
+    )
+    op.add_column('image', sa.Column('blob_hash', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_image_blob_hash'), 'image', ['blob_hash'], unique=False)
+    op.create_foreign_key('fk_image_blob_hash_blob', 'image', 'blob', ['blob_hash'], ['hash'])
+    # 历史文件（blob_hash 为空）删除时仍按 filepath 统计引用
+    op.create_index(op.f('ix_image_filepath'), 'image', ['filepath'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_image_filepath'), table_name='image')
+    op.drop_constraint('fk_image_blob_hash_blob', 'image', type_='foreignkey')
+    op.drop_index(op.f('ix_image_blob_hash'), table_name='image')
+    op.drop_column('image', 'blob_hash')
+    op.drop_table('blob')
@@ -0,0 +1,36 @@
+"""add image exif metadata, taken_at and camera_model
+
+Revision ID: e2a7c9d4f316
+Revises: d9f1b3c5e724
+Create Date: 2025-07-26 15:40:21.274163
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2a7c9d4f316'
+down_revision: Union[str, None] = 'd9f1b3c5e724'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('image', sa.Column('exif', sa.JSON(), nullable=True))
+    op.add_column('image', sa.Column('taken_at', sa.DateTime(), nullable=True))
+    op.add_column('image', sa.Column('camera_model', sa.String(length=100), nullable=True))
+    op.create_index(op.f('ix_image_taken_at'), 'image', ['taken_at'], unique=False)
+    op.create_index(op.f('ix_image_camera_model'), 'image', ['camera_model'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_image_camera_model'), table_name='image')
+    op.drop_index(op.f('ix_image_taken_at'), table_name='image')
+    op.drop_column('image', 'camera_model')
+    op.drop_column('image', 'taken_at')
+    op.drop_column('image', 'exif')
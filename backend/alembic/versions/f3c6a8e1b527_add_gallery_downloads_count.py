@@ -0,0 +1,28 @@
+"""add gallery downloads_count
+
+Revision ID: f3c6a8e1b527
+Revises: e2a7c9d4f316
+Create Date: 2025-07-27 10:12:48.531904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3c6a8e1b527'
+down_revision: Union[str, None] = 'e2a7c9d4f316'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('gallery', sa.Column('downloads_count', sa.Integer(), nullable=True, server_default='0'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('gallery', 'downloads_count')
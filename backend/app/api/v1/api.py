@@ -1,7 +1,8 @@
 from fastapi import APIRouter
 
 from app.api.v1.endpoints import (
-    auth, users, images, tags, comments, admin, categories, departments, galleries, contents, user_contents, links, topics, ai_analysis
+    auth, users, images, tags, comments, admin, categories, departments, galleries, contents, user_contents, links, topics, ai_analysis,
+    upload_sessions
 )
 
 api_router = APIRouter()
@@ -11,6 +12,7 @@ api_router.include_router(user_contents.router, prefix="/users", tags=["user-con
 api_router.include_router(departments.router, prefix="/departments", tags=["departments"])
 api_router.include_router(contents.router, prefix="/contents", tags=["contents"])
 api_router.include_router(images.router, prefix="/images", tags=["images"])
+api_router.include_router(upload_sessions.router, prefix="/upload-sessions", tags=["upload-sessions"])
 api_router.include_router(galleries.router, prefix="/galleries", tags=["galleries"])
 api_router.include_router(topics.router, prefix="/topics", tags=["topics"])
 api_router.include_router(tags.router, prefix="/tags", tags=["tags"])
@@ -3,13 +3,15 @@ from sqlalchemy.orm import Session
 from sqlalchemy import func, or_, desc
 from typing import Any, Dict, List, Optional
 import uuid
-import shutil
 from pathlib import Path
 
 from app import crud, models, schemas
 from app.api.v1 import dependencies
 from app.db.session import get_db
 from app.core.config import settings
+from app.core.storage import get_storage
+from app.services.image_worker import image_worker
+from app.services.upload_admission import upload_admission
 
 router = APIRouter()
 
@@ -301,25 +303,20 @@ def upload_logo(
         )
     
     try:
-        # 确保logos目录存在
-        upload_dir = Path(settings.UPLOAD_DIRECTORY)
-        logos_dir = upload_dir / "logos"
-        logos_dir.mkdir(parents=True, exist_ok=True)
-        
         # 生成唯一文件名，保持原始扩展名
         file_extension = Path(file.filename).suffix
         if not file_extension:
             file_extension = ".png"  # 默认扩展名
         
         unique_filename = f"{uuid.uuid4()}{file_extension}"
-        file_path = logos_dir / unique_filename
+        logo_key = f"logos/{unique_filename}"
         
-        # 保存文件
-        with file_path.open("wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # 流式写入存储后端
+        storage = get_storage()
+        storage.put_stream(logo_key, file.file, content_type=file.content_type)
         
-        # 构建相对URL路径
-        logo_url = f"/uploads/logos/{unique_filename}"
+        # 访问URL（由存储后端决定）
+        logo_url = storage.url(logo_key)
         
         # 更新系统设置中的site_logo
         crud.settings.update_setting(db, key="site_logo", value=logo_url)
@@ -332,9 +329,9 @@ def upload_logo(
         
     except Exception as e:
         # 如果出错，尝试删除已上传的文件
-        if 'file_path' in locals() and file_path.exists():
+        if 'logo_key' in locals():
             try:
-                file_path.unlink()
+                get_storage().delete(logo_key)
             except:
                 pass
         
@@ -346,6 +343,24 @@ def upload_logo(
         file.file.close() 
 
 
+@router.get("/metrics/uploads", response_model=Dict[str, Any])
+def get_upload_metrics(
+    current_user: models.User = Depends(dependencies.get_current_active_superuser),
+):
+    """
+    上传处理的运行指标（当前API进程）：准入控制的排队长度、占用的内存额度、等待时间，
+    以及图片处理进程池的在途任务数。仅限超级管理员。
+    """
+    return {
+        "admission": upload_admission.metrics(),
+        "image_worker": {
+            "workers": image_worker.max_workers,
+            "queue_size": image_worker.queue_size,
+            "in_flight": image_worker.in_flight,
+        },
+    }
+
+
 @router.get("/daily-stats", response_model=Dict[str, Any])
 def get_daily_stats(
     db: Session = Depends(get_db),
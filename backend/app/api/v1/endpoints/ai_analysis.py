@@ -5,13 +5,13 @@ from typing import Dict, Any
 from app import models, schemas
 from app.api.v1 import dependencies
 from app.db.session import get_db
-from app.services.background_tasks import background_task_manager
+from app.services.ai_service import enqueue_ai_analysis
 from app.crud.crud_image import image as crud_image
 
 router = APIRouter()
 
 @router.post("/{image_id}/analyze")
-async def trigger_ai_analysis(
+def trigger_ai_analysis(
     *,
     db: Session = Depends(get_db),
     image_id: int,
@@ -38,10 +38,10 @@ async def trigger_ai_analysis(
     if ai_status == "processing":
         return {"message": "AI分析正在进行中", "status": "processing"}
     
-    # 添加AI分析任务
-    await background_task_manager.add_ai_analysis_task(image_id)
+    # 添加AI分析任务（持久化任务队列，已在排队的任务不重复添加）
+    job = enqueue_ai_analysis(db, image_id)
     
-    return {"message": "AI分析任务已添加", "status": "pending"}
+    return {"message": "AI分析任务已添加", "status": "pending", "job_id": job.id}
 
 @router.get("/{image_id}/ai-status")
 def get_ai_analysis_status(
@@ -1,12 +1,21 @@
+import logging
+import re
 from typing import List, Any, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from urllib.parse import quote
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from pathlib import Path
 
 from app import crud, models, schemas
 from app.api.v1 import dependencies
-from app.db.session import get_db
-from app.core.config import settings
+from app.db.session import SessionLocal, get_db
+from app.core.image_utils import generate_image_url, generate_rendition_urls
+from app.core.storage import get_storage, storage_key
+from app.core.zip_stream import ZipEntry, ZipStream
+from app.services.contact_sheet import contact_sheet_refresher
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -15,49 +24,16 @@ def _add_image_url_to_image(image):
     if not image:
         return
     
-    # 安全获取filepath字符串
-    filepath_str = ""
-    if hasattr(image, 'filepath') and image.filepath is not None:
-        filepath_str = str(image.filepath).strip()
-    
-    if filepath_str:
-        # 将filepath转换为相对于uploads目录的路径
-        file_path = Path(filepath_str)
-        upload_dir = Path(settings.UPLOAD_DIRECTORY)
-        try:
-            # 计算相对路径
-            relative_path = file_path.relative_to(upload_dir)
-            image.image_url = f"/uploads/{relative_path}".replace("\\", "/")
-        except ValueError:
-            # 如果relative_to失败，尝试从filepath中手动提取相对路径
-            normalized_filepath = filepath_str.replace("\\", "/")
-            uploads_str = "uploads/"
-            
-            # 查找uploads/在路径中的位置
-            uploads_index = normalized_filepath.find(uploads_str)
-            if uploads_index != -1:
-                # 提取从uploads/之后的部分作为相对路径
-                relative_part = normalized_filepath[uploads_index + len(uploads_str):]
-                image.image_url = f"/uploads/{relative_part}"
-            else:
-                # 如果filepath中没有uploads，使用filename
-                image.image_url = f"/uploads/{image.filename}"
-    else:
-        # 如果没有filepath，使用filename
-        image.image_url = f"/uploads/{image.filename}"
+    image.image_url = generate_image_url(image)
 
-def _add_image_urls_to_gallery(gallery):
-    """为图集中的所有图片添加image_url字段"""
-    if not gallery:
-        return
-    
-    # 处理图集中的所有图片
-    if hasattr(gallery, 'images') and gallery.images:
-        for image in gallery.images:
-            _add_image_url_to_image(image)
-    
-    # 处理封面图片
-    if hasattr(gallery, 'cover_image') and gallery.cover_image:
+    # 衍生图URL（缩略图/中图/大图）
+    for field, url in generate_rendition_urls(image).items():
+        setattr(image, field, url)
+
+def _prepare_gallery_list(db: Session, galleries: List[models.Gallery]) -> None:
+    """列表接口：没有封面的图集以第一张图片作为封面，并为封面添加URL（列表不返回图片列表）"""
+    crud.gallery.fill_default_covers(db, galleries)
+    for gallery in galleries:
         _add_image_url_to_image(gallery.cover_image)
 
 def _map_gallery_to_schema(db: Session, gallery: models.Gallery, user_id: Optional[int] = None) -> schemas.GalleryWithImages:
@@ -84,6 +60,14 @@ def _map_gallery_to_schema(db: Session, gallery: models.Gallery, user_id: Option
                 description=image.description,
                 filename=image.filename,
                 image_url=image.image_url,
+                thumbnail_url=image.thumbnail_url,
+                medium_url=image.medium_url,
+                large_url=image.large_url,
+                width=image.width,
+                height=image.height,
+                file_size=image.file_size,
+                file_type=image.file_type,
+                blurhash=image.blurhash,
                 created_at=image.created_at,
                 owner_id=image.owner_id,
                 owner=image.owner,
@@ -111,6 +95,14 @@ def _map_gallery_to_schema(db: Session, gallery: models.Gallery, user_id: Option
             description=gallery.cover_image.description,
             filename=gallery.cover_image.filename,
             image_url=gallery.cover_image.image_url,
+            thumbnail_url=gallery.cover_image.thumbnail_url,
+            medium_url=gallery.cover_image.medium_url,
+            large_url=gallery.cover_image.large_url,
+            width=gallery.cover_image.width,
+            height=gallery.cover_image.height,
+            file_size=gallery.cover_image.file_size,
+            file_type=gallery.cover_image.file_type,
+            blurhash=gallery.cover_image.blurhash,
             created_at=gallery.cover_image.created_at,
             owner_id=gallery.cover_image.owner_id,
             owner=gallery.cover_image.owner,
@@ -129,7 +121,7 @@ def _map_gallery_to_schema(db: Session, gallery: models.Gallery, user_id: Option
 
     return gallery_schema
 
-@router.get("/feed", response_model=List[schemas.GalleryWithImages])
+@router.get("/feed", response_model=List[schemas.Gallery])
 def read_gallery_feed(
     db: Session = Depends(dependencies.get_db),
     skip: int = 0,
@@ -148,9 +140,8 @@ def read_gallery_feed(
             setattr(gallery, 'liked_by_current_user', False)
             setattr(gallery, 'bookmarked_by_current_user', False)
     
-    # 为所有图集的图片添加image_url字段
-    for gallery in galleries:
-        _add_image_urls_to_gallery(gallery)
+    # 为封面添加image_url字段
+    _prepare_gallery_list(db, galleries)
     
     return galleries
 
@@ -181,7 +172,7 @@ def get_galleries_stats(
     stats = crud.gallery.get_stats(db)
     return stats
 
-@router.get("/", response_model=List[schemas.GalleryWithImages])
+@router.get("/", response_model=List[schemas.Gallery])
 def read_galleries(
     db: Session = Depends(dependencies.get_db),
     skip: int = 0,
@@ -195,12 +186,12 @@ def read_galleries(
     current_user: models.User = Depends(dependencies.get_current_user_optional),
 ):
     """
-    获取图集列表（包含图片信息），支持搜索、按分类、部门筛选和排序
+    获取图集列表（含封面，图片列表见详情接口），支持搜索、按分类、部门筛选和排序
     """
     # 构建基础查询
     from sqlalchemy.orm import selectinload
     query = db.query(models.Gallery).options(
-        selectinload(models.Gallery.images),
+        selectinload(models.Gallery.cover_image),
         selectinload(models.Gallery.owner),
         selectinload(models.Gallery.category)
     )
@@ -242,6 +233,11 @@ def read_galleries(
             query = query.order_by(models.Gallery.bookmarks_count.desc())
         else:
             query = query.order_by(models.Gallery.bookmarks_count.asc())
+    elif sort == "downloads_count":
+        if order_desc:
+            query = query.order_by(models.Gallery.downloads_count.desc())
+        else:
+            query = query.order_by(models.Gallery.downloads_count.asc())
     elif sort == "created_at":
         if order_desc:
             query = query.order_by(models.Gallery.created_at.desc())
@@ -261,9 +257,8 @@ def read_galleries(
             setattr(gallery, 'liked_by_current_user', False)
             setattr(gallery, 'bookmarked_by_current_user', False)
     
-    # 为所有图集的图片添加image_url字段
-    for gallery in galleries:
-        _add_image_urls_to_gallery(gallery)
+    # 为封面添加image_url字段
+    _prepare_gallery_list(db, galleries)
     
     return galleries
 
@@ -282,7 +277,7 @@ def create_gallery(
     )
     return gallery
 
-@router.get("/recent", response_model=List[schemas.GalleryWithImages])
+@router.get("/recent", response_model=List[schemas.Gallery])
 def read_recent_galleries(
     db: Session = Depends(dependencies.get_db),
     skip: int = 0,
@@ -290,7 +285,7 @@ def read_recent_galleries(
     current_user: models.User = Depends(dependencies.get_current_user_optional),
 ):
     """
-    获取最新图集（包含图片信息）
+    获取最新图集（含封面）
     """
     galleries = crud.gallery.get_multi_with_images(db, skip=skip, limit=limit)
     
@@ -300,13 +295,12 @@ def read_recent_galleries(
             setattr(gallery, 'liked_by_current_user', False)
             setattr(gallery, 'bookmarked_by_current_user', False)
     
-    # 为所有图集的图片添加image_url字段
-    for gallery in galleries:
-        _add_image_urls_to_gallery(gallery)
+    # 为封面添加image_url字段
+    _prepare_gallery_list(db, galleries)
     
     return galleries
 
-@router.get("/popular", response_model=List[schemas.GalleryWithImages])
+@router.get("/popular", response_model=List[schemas.Gallery])
 def read_popular_galleries(
     db: Session = Depends(dependencies.get_db),
     skip: int = 0,
@@ -314,7 +308,7 @@ def read_popular_galleries(
     current_user: models.User = Depends(dependencies.get_current_user_optional),
 ):
     """
-    获取热门图集（包含图片信息）
+    获取热门图集（含封面）
     """
     galleries = crud.gallery.get_popular(db, skip=skip, limit=limit)
     
@@ -324,13 +318,12 @@ def read_popular_galleries(
             setattr(gallery, 'liked_by_current_user', False)
             setattr(gallery, 'bookmarked_by_current_user', False)
     
-    # 为所有图集的图片添加image_url字段
-    for gallery in galleries:
-        _add_image_urls_to_gallery(gallery)
+    # 为封面添加image_url字段
+    _prepare_gallery_list(db, galleries)
     
     return galleries
 
-@router.get("/search", response_model=List[schemas.GalleryWithImages])
+@router.get("/search", response_model=List[schemas.Gallery])
 def search_galleries(
     q: str,
     db: Session = Depends(dependencies.get_db),
@@ -339,7 +332,7 @@ def search_galleries(
     current_user: models.User = Depends(dependencies.get_current_user_optional),
 ):
     """
-    搜索图集（包含图片信息）
+    搜索图集（含封面）
     """
     galleries = crud.gallery.search_with_images(db, query=q, skip=skip, limit=limit)
     
@@ -349,9 +342,8 @@ def search_galleries(
             setattr(gallery, 'liked_by_current_user', False)
             setattr(gallery, 'bookmarked_by_current_user', False)
     
-    # 为所有图集的图片添加image_url字段
-    for gallery in galleries:
-        _add_image_urls_to_gallery(gallery)
+    # 为封面添加image_url字段
+    _prepare_gallery_list(db, galleries)
     
     return galleries
 
@@ -388,6 +380,76 @@ def read_gallery(
     user_id = current_user.id if current_user else None
     return _map_gallery_to_schema(db, gallery, user_id)
 
+def _archive_entry_name(index: int, width: int, image: models.Image) -> str:
+    """ZIP中的文件名：序号（保持图集顺序、避免重名）加图片标题，去掉文件名中不允许的字符"""
+    title = re.sub(r'[\\/:*?"<>|\x00-\x1f]+', "_", image.title or "").strip(" ._")[:100]
+    return f"{index:0{width}d}_{title or f'image_{image.id}'}.jpg"
+
+
+def _increment_gallery_downloads(gallery_id: int) -> None:
+    """下载次数在响应结束后累加（使用独立会话，请求的会话此时已关闭）"""
+    db = SessionLocal()
+    try:
+        db.query(models.Gallery).filter(models.Gallery.id == gallery_id).update(
+            {models.Gallery.downloads_count: func.coalesce(models.Gallery.downloads_count, 0) + 1},
+            synchronize_session=False,
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+@router.get("/{gallery_id}/download")
+def download_gallery(
+    *,
+    db: Session = Depends(dependencies.get_db),
+    gallery_id: int,
+    background_tasks: BackgroundTasks,
+):
+    """
+    下载整个图集（ZIP，存储模式，图片不再重新压缩）。
+    边读取边输出，不生成临时文件，服务器内存占用与图集大小无关；
+    文件大小事先已知，响应带 Content-Length，客户端可以显示进度。
+    """
+    gallery = crud.gallery.get(db=db, id=gallery_id)
+    if not gallery:
+        raise HTTPException(status_code=404, detail="Gallery not found")
+
+    images = (
+        db.query(models.Image)
+        .filter(models.Image.gallery_id == gallery_id)
+        .order_by(models.Image.id)
+        .all()
+    )
+    storage = get_storage()
+    width = max(3, len(str(len(images))))
+    entries = []
+    for index, image in enumerate(images, start=1):
+        stored = storage.stat(storage_key(image.filepath)) if image.filepath else None
+        if stored is None:
+            logger.warning(f"Skipping image {image.id} of gallery {gallery_id} in download: file not found")
+            continue
+        entries.append(ZipEntry(
+            name=_archive_entry_name(index, width, image),
+            size=stored.size,
+            modified=image.created_at.timestamp() if image.created_at else stored.modified,
+            open=lambda key=stored.key: storage.iter_bytes(key),
+        ))
+    if not entries:
+        raise HTTPException(status_code=404, detail="Gallery has no images to download")
+
+    archive = ZipStream(entries)
+    background_tasks.add_task(_increment_gallery_downloads, gallery_id)
+    filename = f"{gallery.title or f'gallery_{gallery_id}'}.zip"
+    return StreamingResponse(
+        iter(archive),
+        media_type="application/zip",
+        headers={
+            "Content-Length": str(len(archive)),
+            "Content-Disposition": f"attachment; filename=\"gallery_{gallery_id}.zip\"; filename*=UTF-8''{quote(filename)}",
+        },
+    )
+
 @router.put("/{gallery_id}", response_model=schemas.Gallery)
 def update_gallery(
     *,
@@ -420,7 +482,11 @@ def update_gallery(
     
     # 创建一个新的更新对象，排除tags字段以避免类型冲突
     update_data = gallery_in.model_dump(exclude={'tags'}, exclude_unset=True)
+    cover_changed = 'cover_image_id' in update_data and update_data['cover_image_id'] != gallery.cover_image_id
     gallery = crud.gallery.update(db=db, db_obj=gallery, obj_in=update_data)
+    if cover_changed:
+        # 封面是拼图的第一格
+        contact_sheet_refresher.schedule(gallery.id)
     return gallery
 
 @router.delete("/{gallery_id}", response_model=schemas.Gallery)
@@ -440,8 +506,8 @@ def delete_gallery(
         raise HTTPException(status_code=403, detail="Not enough permissions")
 
     # 为返回做准备（加载必要字段）
-    # 补充图片 URL 字段，保持与其他接口一致
-    _add_image_urls_to_gallery(gallery)
+    # 补充封面 URL 字段，保持与其他接口一致
+    _add_image_url_to_image(gallery.cover_image)
     gallery_data = schemas.Gallery.model_validate(gallery)
 
     # 真正执行删除（内部会安全删除图片文件）
@@ -1,10 +1,15 @@
-import shutil
 import uuid
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime
 from pathlib import Path
-from typing import List, Any, Optional
+from types import SimpleNamespace
+from typing import List, Any, Optional, Tuple
 
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, status, BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Query, Request, status
+from fastapi.responses import RedirectResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session, selectinload
 from sqlalchemy import or_
 
@@ -12,48 +17,70 @@ from app import crud, models, schemas
 from app.api.v1 import dependencies
 from app.db.session import get_db
 from app.core.config import settings
-from app.core.image_utils import compress_image, add_watermark, generate_image_url
+from app.core.image_utils import (
+    process_image, generate_image_url, generate_rendition_url, generate_rendition_urls,
+    save_upload_with_hash, is_sha256_hex, render_variant, estimate_processing_bytes, get_blob_path,
+    publish_image, content_hash, RENDER_FITS, RENDER_FORMATS, FILE_INFO_FIELDS
+)
+from app.core.http_cache import (
+    IMMUTABLE_CACHE_CONTROL, blob_etag, cache_headers, conditional_file_response, is_not_modified,
+    is_versioned, make_etag, not_modified_response, redirect_cache_control,
+)
+from app.core.storage import get_storage, storage_key, StoredObject
 from app.models.content_interactions import content_tags
 from app.crud.crud_gallery import gallery as crud_gallery
-from app.services.background_tasks import background_task_manager
+from app.services.ai_service import enqueue_ai_analysis
+from app.services.image_worker import image_worker, ImageWorkerBusy
+from app.services.upload_admission import upload_admission, AdmissionTimeout
+from app.services.render_cache import render_cache, normalize_dimensions
+from app.services.phash_index import phash_index, MAX_SEARCH_DISTANCE
 from pydantic import BaseModel
 from app.models import Gallery
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
-def trigger_ai_analysis_background(image_id: int):
+async def run_image_task(fn, *args, **kwargs):
     """
-    后台任务，用于触发对新上传图片的AI分析。
+    在图片处理进程池中执行Pillow任务并等待结果（等待期间不占用线程）。
+    队列已满或等待超时时返回503，并通过Retry-After提示客户端稍后重试。
     """
-    from app.db.session import SessionLocal
-    from app.services.ai_service import aianalysis
-    from app.services.background_tasks import background_task_manager
-    from app.core.config import settings
-    import logging
-
-    logger = logging.getLogger(__name__)
+    try:
+        return await image_worker.run(fn, *args, **kwargs)
+    except (ImageWorkerBusy, asyncio.TimeoutError):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Image processing is busy, please retry later.",
+            headers={"Retry-After": str(settings.IMAGE_WORKER_RETRY_AFTER)},
+        )
 
-    # 使用后台任务管理器来执行
-    @background_task_manager.task
-    def task():
-        db = SessionLocal()
-        try:
-            logger.info(f"Starting AI analysis for image {image_id}")
-            aianalysis.start_image_analysis(
-                db=db, 
-                image_id=image_id, 
-                confidence_threshold=settings.AI_CONFIDENCE_THRESHOLD
-            )
-            logger.info(f"AI analysis task for image {image_id} completed.")
-        except Exception as e:
-            logger.error(f"Error during AI analysis for image {image_id}: {e}")
-        finally:
-            db.close()
+@asynccontextmanager
+async def admit_image_processing(user_id: int, cost: int):
+    """
+    图片处理阶段的准入控制：按估算的解码内存和用户并发数在事件循环中排队（不占用线程），等待超时返回503。
+    """
+    try:
+        async with upload_admission.admit(user_id, cost):
+            yield
+    except AdmissionTimeout:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Image processing is busy, please retry later.",
+            headers={"Retry-After": str(settings.IMAGE_WORKER_RETRY_AFTER)},
+        )
 
+def find_possible_duplicates(db: Session, phash: Optional[str], exclude_id: Optional[int] = None) -> List[int]:
+    """按感知哈希查找可能重复的图片ID（距离从近到远），索引异常时返回空列表而不影响上传"""
+    if not phash:
+        return []
     try:
-        task()
+        phash_index.ensure_loaded(db)
+        matches = phash_index.search(phash, settings.PHASH_DUPLICATE_DISTANCE, exclude_id=exclude_id)
     except Exception as e:
-        logger.error(f"Failed to add AI analysis task for image {image_id}: {e}")
+        logger.exception(f"Perceptual hash lookup failed: {e}")
+        return []
+    return [image_id for image_id, _ in matches[:10]]
 
 def _map_image_to_schema(db: Session, image: models.Image, user_id: Optional[int]) -> schemas.Image:
     """
@@ -66,34 +93,16 @@ def _map_image_to_schema(db: Session, image: models.Image, user_id: Optional[int
     # 创建基础 schema 对象
     image_schema = schemas.Image.model_validate(image)
 
-    # 1. 添加图片URL
-    # 安全获取filepath字符串
-    filepath_str = ""
-    if hasattr(image, 'filepath') and image.filepath is not None:
-        filepath_str = str(image.filepath).strip()
-    
-    if filepath_str:
-        file_path = Path(filepath_str)
-        upload_dir = Path(settings.UPLOAD_DIRECTORY)
-        try:
-            relative_path = file_path.relative_to(upload_dir)
-            image_schema.image_url = f"/uploads/{relative_path}".replace("\\", "/")
-        except ValueError:
-            # 如果relative_to失败，尝试从filepath中手动提取相对路径
-            normalized_filepath = filepath_str.replace("\\", "/")
-            uploads_str = "uploads/"
-            
-            # 查找uploads/在路径中的位置
-            uploads_index = normalized_filepath.find(uploads_str)
-            if uploads_index != -1:
-                # 提取从uploads/之后的部分作为相对路径
-                relative_part = normalized_filepath[uploads_index + len(uploads_str):]
-                image_schema.image_url = f"/uploads/{relative_part}"
-            else:
-                # 如果filepath中没有uploads，使用filename
-                image_schema.image_url = f"/uploads/{image.filename}"
-    else:
-        image_schema.image_url = f"/uploads/{image.filename}"
+    # 1. 添加图片URL（由存储后端决定）
+    image_schema.image_url = generate_image_url(image)
+
+    # 衍生图URL（缩略图/中图/大图）
+    for field, url in generate_rendition_urls(image).items():
+        setattr(image_schema, field, url)
+
+    # GPS位置只返回给图片所有者
+    if image_schema.exif and "gps" in image_schema.exif and user_id != image.owner_id:
+        image_schema.exif = {key: value for key, value in image_schema.exif.items() if key != "gps"}
 
     # 2. 添加用户交互信息
     if user_id:
@@ -120,14 +129,249 @@ def _map_image_to_schema(db: Session, image: models.Image, user_id: Optional[int
             image_count=image.gallery.image_count or 0,
             views_count=image.gallery.views_count or 0,
             likes_count=image.gallery.likes_count or 0,
-            bookmarks_count=image.gallery.bookmarks_count or 0
+            bookmarks_count=image.gallery.bookmarks_count or 0,
+            downloads_count=image.gallery.downloads_count or 0
         )
         image_schema.gallery = gallery_simple
 
     return image_schema
 
+def get_upload_temp_path() -> Path:
+    """原始上传内容的临时文件路径，处理结果再写入内容寻址存储"""
+    upload_dir = Path(settings.UPLOAD_DIRECTORY)
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    return upload_dir / f".{uuid.uuid4()}.upload"
+
+def _reusable_blob(db: Session, file_hash: str) -> Optional[models.Image]:
+    """
+    文件已在内容寻址存储中（例如原图已删除、秒传副本仍在）时，返回任一引用它的图片记录，
+    以复用文件和元数据而不重新处理；文件不存在时返回None。
+    """
+    blob = crud.blob.get_by_hash(db, file_hash=file_hash)
+    if not blob or not get_storage().exists(storage_key(blob.path)):
+        return None
+    return crud.image.get_by_blob_hash(db, blob_hash=file_hash)
+
+def _ingest_existing(
+    db: Session,
+    *,
+    file_hash: str,
+    title: str,
+    description: Optional[str],
+    tags: Optional[str],
+    category_id: Optional[int],
+    topic_id: Optional[int],
+    gallery_id: Optional[int],
+    current_user: models.User,
+) -> Optional[schemas.Image]:
+    """
+    秒传：内容已存在时不再处理文件。关联图集时为当前用户创建复用文件的新记录，否则返回现有记录；
+    内容不存在时返回None。
+    """
+    # Final check for duplicates before processing the file (秒传功能)
+    existing_image = crud.image.get_by_hash(db, file_hash=file_hash)
+    if not existing_image:
+        return None
+
+    # 秒传逻辑：不修改原有图片，而是创建新的数据库记录
+    if gallery_id:
+        # 为新记录生成唯一的文件名，避免数据库约束冲突
+        new_filename = f"{uuid.uuid4()}.jpg"
+        
+        # 创建新的图片记录，复用文件路径但有独立的文件名和空的file_hash
+        tag_list = [tag.strip() for tag in tags.split(",")] if tags else []
+        image_in = schemas.ImageCreate(
+            title=title, 
+            description=description, 
+            topic_id=topic_id,
+            file_hash=None  # 秒传记录不保存file_hash，避免唯一约束冲突
+        )
+        new_image = crud.image.create(
+            db=db, 
+            obj_in=image_in, 
+            owner_id=current_user.id, 
+            filename=new_filename,  # 使用新的唯一文件名
+            filepath=str(existing_image.filepath),  # 复用文件路径
+            tags=tag_list,
+            category_id=category_id,
+            gallery_id=gallery_id,
+            file_info={field: getattr(existing_image, field) for field in FILE_INFO_FIELDS},
+            blob_hash=existing_image.blob_hash
+        )
+        
+        # 复用原图片的AI分析结果（避免重复分析，节省算力）
+        ai_status = getattr(existing_image, 'ai_status', None)
+        ai_description = getattr(existing_image, 'ai_description', None)
+        ai_tags = getattr(existing_image, 'ai_tags', None)
+        
+        if ai_status == 'completed' and ai_description:
+            update_data = {
+                'ai_status': ai_status,
+                'ai_description': ai_description,
+                'ai_tags': ai_tags
+            }
+            crud.image.update(db, db_obj=new_image, obj_in=update_data)
+            # 如果原图有AI标签，也复制过来
+            if ai_tags and isinstance(ai_tags, list):
+                from app.crud.crud_tag import get_or_create_tags
+                try:
+                    tag_objects = get_or_create_tags(db, tags=ai_tags)
+                    existing_tags = list(new_image.tags)
+                    for tag in tag_objects:
+                        if tag not in existing_tags:
+                            existing_tags.append(tag)
+                    new_image.tags = existing_tags
+                    db.commit()
+                    db.refresh(new_image)
+                except Exception as e:
+                    logger.warning(f"Failed to copy AI tags: {e}")
+        else:
+            # 原图没有AI分析结果，或分析未完成，则进行新的AI分析
+            enqueue_ai_analysis(db, new_image.id)
+        
+        # 更新图集统计信息
+        crud_gallery.update_image_count(db, gallery_id=gallery_id)
+        phash_index.add(new_image.id, new_image.phash)
+        
+        return _map_image_to_schema(db, new_image, current_user.id)
+    else:
+        # 不关联图集时，直接返回现有图片
+        return _map_image_to_schema(db, existing_image, current_user.id)
+
+def _create_ingested_image(
+    db: Session,
+    *,
+    file_path: Path,
+    processed: dict,
+    file_hash: str,
+    title: str,
+    description: Optional[str],
+    tags: Optional[str],
+    category_id: Optional[int],
+    topic_id: Optional[int],
+    gallery_id: Optional[int],
+    current_user: models.User,
+) -> schemas.Image:
+    """为处理完成（或复用已有文件）的上传创建图片记录，并触发AI分析和相似图检测"""
+    # Force .jpg extension as we convert to JPEG
+    unique_filename = f"{uuid.uuid4()}.jpg"
+
+    tag_list = [tag.strip() for tag in tags.split(",")] if tags else []
+    image_in = schemas.ImageCreate(
+        title=title, 
+        description=description, 
+        topic_id=topic_id,
+        file_hash=file_hash
+    )
+    image = crud.image.create(
+        db=db, 
+        obj_in=image_in, 
+        owner_id=current_user.id, 
+        filename=unique_filename,
+        filepath=str(file_path),
+        tags=tag_list,
+        category_id=category_id,
+        gallery_id=gallery_id,
+        file_info={field: processed[field] for field in FILE_INFO_FIELDS},
+        blob_hash=file_hash
+    )
+
+    # 如果关联了图集，更新图集统计信息
+    if gallery_id:
+        crud_gallery.update_image_count(db, gallery_id=gallery_id)
+
+    # 添加AI分析任务（持久化任务队列，由任务进程异步执行）
+    enqueue_ai_analysis(db, image.id)
+
+    # 感知哈希相近的已有图片（重新保存、轻微裁剪的副本）作为“可能重复”提示返回
+    possible_duplicate_ids = find_possible_duplicates(db, image.phash, exclude_id=image.id)
+    phash_index.add(image.id, image.phash)
+
+    image_schema = _map_image_to_schema(db, image, current_user.id)
+    image_schema.possible_duplicate_ids = possible_duplicate_ids
+    return image_schema
+
+async def ingest_upload(
+    db: Session,
+    *,
+    upload_path: Path,
+    file_hash: str,
+    title: str,
+    description: Optional[str],
+    tags: Optional[str],
+    category_id: Optional[int],
+    topic_id: Optional[int],
+    gallery_id: Optional[int],
+    current_user: models.User,
+) -> schemas.Image:
+    """
+    已接收文件的入库流程（普通上传与分片上传共用）：秒传检查 -> 图片处理 -> 创建记录 -> 触发AI分析。
+    upload_path 是已由服务端计算出 file_hash 的原始上传文件，由调用方负责清理
+    （分片上传在处理繁忙返回503时需要保留它，以便客户端重试）。
+    处理结果按 file_hash 存入内容寻址存储，相同内容只保存一份，由 blob 表的引用计数管理。
+    数据库和存储操作在线程池中执行，图片处理在进程池中执行，等待期间都不阻塞事件循环。
+    """
+    existing = await run_in_threadpool(
+        _ingest_existing,
+        db,
+        file_hash=file_hash,
+        title=title,
+        description=description,
+        tags=tags,
+        category_id=category_id,
+        topic_id=topic_id,
+        gallery_id=gallery_id,
+        current_user=current_user,
+    )
+    if existing is not None:
+        return existing
+
+    file_path = get_blob_path(file_hash)
+    blob_source = await run_in_threadpool(_reusable_blob, db, file_hash)
+    if blob_source:
+        # 文件仍被其他记录引用，直接复用，不再处理和写入
+        file_path = Path(blob_source.filepath)
+        processed = {field: getattr(blob_source, field) for field in FILE_INFO_FIELDS}
+    else:
+        # Process the image: decode once, resize, watermark, encode once
+        try:
+            cost = await run_in_threadpool(estimate_processing_bytes, upload_path)
+            async with admit_image_processing(current_user.id, cost):
+                processed = await run_image_task(process_image, upload_path, file_path)
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.exception(f"Error processing image {upload_path}: {e}")
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="The uploaded file could not be processed as an image.",
+            )
+        try:
+            await run_in_threadpool(publish_image, file_path, processed["renditions"])
+        except Exception as e:
+            logger.exception(f"Error storing image {file_path}: {e}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="There was an error storing the file.",
+            )
+
+    return await run_in_threadpool(
+        _create_ingested_image,
+        db,
+        file_path=file_path,
+        processed=processed,
+        file_hash=file_hash,
+        title=title,
+        description=description,
+        tags=tags,
+        category_id=category_id,
+        topic_id=topic_id,
+        gallery_id=gallery_id,
+        current_user=current_user,
+    )
+
 @router.post("/", response_model=schemas.Image)
-def upload_image(
+async def upload_image(
     *,
     db: Session = Depends(get_db),
     title: str = Form(...),
@@ -137,137 +381,327 @@ def upload_image(
     topic_id: Optional[int] = Form(None),
     gallery_id: Optional[int] = Form(None),
     gallery_folder: Optional[str] = Form(None),
-    file_hash: str = Form(...),
+    file_hash: Optional[str] = Form(None),
     file: UploadFile = File(...),
     current_user: models.User = Depends(dependencies.get_current_user),
-    background_tasks: BackgroundTasks,
 ):
     """
     Upload an image for the current user after checking its hash.
     Supports gallery folder organization and duplicate file detection (fast upload).
+    The SHA-256 is computed on the server while the upload is written to disk; a
+    client-supplied file_hash that does not match it is rejected.
     """
-    # Final check for duplicates before saving the file (秒传功能)
-    existing_image = crud.image.get_by_hash(db, file_hash=file_hash)
-    if existing_image:
-        # 秒传逻辑：不修改原有图片，而是创建新的数据库记录
-        if gallery_id:
-            # 为新记录生成唯一的文件名，避免数据库约束冲突
-            new_filename = f"{uuid.uuid4()}.jpg"
-            
-            # 创建新的图片记录，复用文件路径但有独立的文件名和空的file_hash
-            tag_list = [tag.strip() for tag in tags.split(",")] if tags else []
-            image_in = schemas.ImageCreate(
-                title=title, 
-                description=description, 
-                topic_id=topic_id,
-                file_hash=None  # 秒传记录不保存file_hash，避免唯一约束冲突
-            )
-            new_image = crud.image.create(
-                db=db, 
-                obj_in=image_in, 
-                owner_id=current_user.id, 
-                filename=new_filename,  # 使用新的唯一文件名
-                filepath=str(existing_image.filepath),  # 复用文件路径
-                tags=tag_list,
-                category_id=category_id,
-                gallery_id=gallery_id
-            )
-            
-            # 复用原图片的AI分析结果（避免重复分析，节省算力）
-            ai_status = getattr(existing_image, 'ai_status', None)
-            ai_description = getattr(existing_image, 'ai_description', None)
-            ai_tags = getattr(existing_image, 'ai_tags', None)
-            
-            if ai_status == 'completed' and ai_description:
-                update_data = {
-                    'ai_status': ai_status,
-                    'ai_description': ai_description,
-                    'ai_tags': ai_tags
-                }
-                crud.image.update(db, db_obj=new_image, obj_in=update_data)
-                # 如果原图有AI标签，也复制过来
-                if ai_tags and isinstance(ai_tags, list):
-                    from app.crud.crud_tag import get_or_create_tags
-                    try:
-                        tag_objects = get_or_create_tags(db, tags=ai_tags)
-                        existing_tags = list(new_image.tags)
-                        for tag in tag_objects:
-                            if tag not in existing_tags:
-                                existing_tags.append(tag)
-                        new_image.tags = existing_tags
-                        db.commit()
-                        db.refresh(new_image)
-                    except Exception as e:
-                        print(f"Failed to copy AI tags: {e}")
-            else:
-                # 原图没有AI分析结果，或分析未完成，则进行新的AI分析
-                background_tasks.add_task(trigger_ai_analysis_background, new_image.id)
-            
-            # 更新图集统计信息
-            crud_gallery.update_image_count(db, gallery_id=gallery_id)
-            
-            return _map_image_to_schema(db, new_image, current_user.id)
-        else:
-            # 不关联图集时，直接返回现有图片
-            return _map_image_to_schema(db, existing_image, current_user.id)
-
-    # Ensure the upload directory exists
-    upload_dir = Path(settings.UPLOAD_DIRECTORY)
-    
-    # 如果指定了图集文件夹，创建对应目录
-    if gallery_folder:
-        gallery_dir = upload_dir / gallery_folder
-        gallery_dir.mkdir(parents=True, exist_ok=True)
-        target_dir = gallery_dir
-    else:
-        upload_dir.mkdir(parents=True, exist_ok=True)
-        target_dir = upload_dir
-
-    # Force .jpg extension as we convert to JPEG
-    unique_filename = f"{uuid.uuid4()}.jpg"
-    file_path = target_dir / unique_filename
+    # 原始上传内容先落到临时文件，处理结果再原子写入最终路径
+    # （文件按内容哈希存储，gallery_folder 不再影响存储位置，保留参数以兼容现有客户端）
+    upload_path = get_upload_temp_path()
 
     try:
-        with file_path.open("wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        file_hash_server, _ = await run_in_threadpool(save_upload_with_hash, file.file, upload_path)
     except Exception:
+        upload_path.unlink(missing_ok=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="There was an error uploading the file.",
         )
     finally:
         file.file.close()
-    
-    # Process the image
-    compress_image(file_path)
-    add_watermark(file_path)
 
+    # 校验客户端提供的哈希（非SHA-256格式的备用哈希不参与校验，以服务端结果为准）
+    if file_hash and is_sha256_hex(file_hash) and file_hash.lower() != file_hash_server:
+        upload_path.unlink(missing_ok=True)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="File hash mismatch: the uploaded content does not match file_hash.",
+        )
+    file_hash = file_hash_server
+
+    try:
+        return await ingest_upload(
+            db,
+            upload_path=upload_path,
+            file_hash=file_hash,
+            title=title,
+            description=description,
+            tags=tags,
+            category_id=category_id,
+            topic_id=topic_id,
+            gallery_id=gallery_id,
+            current_user=current_user,
+        )
+    finally:
+        upload_path.unlink(missing_ok=True)
+
+def _prepare_batch(
+    db: Session, files: List[UploadFile], titles: Optional[List[str]], file_hashes: Optional[List[str]]
+) -> Tuple[List[schemas.ImageBatchItem], List[dict], List[dict]]:
+    """
+    批量上传的第1、2步（在线程池中执行）：写入临时文件并计算哈希，找出秒传文件和需要处理的文件。
+    返回 (每个文件的结果, 每个文件的处理上下文, 需要处理的文件)。
+    """
+    items: List[schemas.ImageBatchItem] = []
+    # 每个文件的处理上下文：上传临时文件、存储路径、标题
+    entries: List[dict] = []
+
+    # 1. 流式写入临时文件并计算哈希
+    for index, file in enumerate(files):
+        item = schemas.ImageBatchItem(filename=file.filename or f"file_{index}", status="failed")
+        items.append(item)
+        unique_filename = f"{uuid.uuid4()}.jpg"
+        entry = {
+            "item": item,
+            "title": (titles[index] if titles and index < len(titles) and titles[index] else None)
+                     or Path(item.filename).stem or unique_filename,
+            "filename": unique_filename,
+            "upload_path": get_upload_temp_path(),
+        }
+        try:
+            item.file_hash, _ = save_upload_with_hash(file.file, entry["upload_path"])
+        except Exception as e:
+            logger.exception(f"Error saving batch upload {item.filename}: {e}")
+            entry["upload_path"].unlink(missing_ok=True)
+            item.error = "There was an error uploading the file."
+            continue
+        finally:
+            file.file.close()
+
+        client_hash = file_hashes[index] if file_hashes and index < len(file_hashes) else None
+        if client_hash and is_sha256_hex(client_hash) and client_hash.lower() != item.file_hash:
+            entry["upload_path"].unlink(missing_ok=True)
+            item.error = "File hash mismatch: the uploaded content does not match file_hash."
+            continue
+        entry["file_path"] = get_blob_path(item.file_hash)
+        entries.append(entry)
+
+    # 2. 一次查询找出已存在的文件（秒传），同一批次内的重复文件只处理第一份
+    existing = crud.image.get_by_hashes(db, hashes=[entry["item"].file_hash for entry in entries])
+    first_by_hash: dict = {}
+    to_process: List[dict] = []
+    for entry in entries:
+        file_hash = entry["item"].file_hash
+        if file_hash in existing or file_hash in first_by_hash:
+            entry["upload_path"].unlink(missing_ok=True)
+            entry["duplicate_of"] = existing.get(file_hash) or first_by_hash[file_hash]
+            continue
+        first_by_hash[file_hash] = entry
+        blob_source = _reusable_blob(db, file_hash)
+        if blob_source:
+            # 文件仍被其他记录引用，直接复用
+            entry["upload_path"].unlink(missing_ok=True)
+            entry["file_path"] = Path(blob_source.filepath)
+            entry["file_info"] = {field: getattr(blob_source, field) for field in FILE_INFO_FIELDS}
+        else:
+            entry["cost"] = estimate_processing_bytes(entry["upload_path"])
+            to_process.append(entry)
+
+    return items, entries, to_process
+
+def _finish_batch(
+    db: Session,
+    items: List[schemas.ImageBatchItem],
+    entries: List[dict],
+    to_process: List[dict],
+    results: List[Any],
+    *,
+    description: Optional[str],
+    tags: Optional[str],
+    category_id: Optional[int],
+    topic_id: Optional[int],
+    gallery_id: Optional[int],
+    current_user: models.User,
+) -> schemas.ImageBatchResult:
+    """批量上传处理完成后的存储与入库（在线程池中执行）"""
     tag_list = [tag.strip() for tag in tags.split(",")] if tags else []
-    image_in = schemas.ImageCreate(
-        title=title, 
-        description=description, 
-        topic_id=topic_id,
-        file_hash=file_hash
+
+    for entry, result in zip(to_process, results):
+        entry["upload_path"].unlink(missing_ok=True)
+        if isinstance(result, Exception):
+            logger.error(f"Error processing batch upload {entry['item'].filename}: {result}", exc_info=result)
+            entry["failed"] = True
+            if isinstance(result, (ImageWorkerBusy, AdmissionTimeout, TimeoutError, asyncio.TimeoutError)):
+                entry["item"].error = "Image processing is busy, please retry later."
+            else:
+                entry["item"].error = "The uploaded file could not be processed as an image."
+        else:
+            try:
+                publish_image(entry["file_path"], result["renditions"])
+            except Exception as e:
+                logger.exception(f"Error storing batch upload {entry['item'].filename}: {e}")
+                entry["failed"] = True
+                entry["item"].error = "There was an error storing the file."
+                continue
+            entry["file_info"] = {field: result[field] for field in FILE_INFO_FIELDS}
+
+    # 4. 组装记录，同一事务批量插入
+    rows: List[dict] = []
+    row_entries: List[dict] = []
+    for entry in entries:
+        item = entry["item"]
+        duplicate_of = entry.get("duplicate_of")
+        if entry.get("failed"):
+            continue
+        if duplicate_of is None:
+            rows.append({
+                "title": entry["title"], "description": description, "topic_id": topic_id,
+                "filename": entry["filename"], "filepath": str(entry["file_path"]), "file_hash": item.file_hash,
+                "blob_hash": item.file_hash, **entry["file_info"],
+            })
+        elif isinstance(duplicate_of, dict):
+            # 与本批次中较早的文件相同：复用其处理结果
+            if duplicate_of.get("failed"):
+                item.error = duplicate_of["item"].error
+                continue
+            rows.append({
+                "title": entry["title"], "description": description, "topic_id": topic_id,
+                "filename": entry["filename"], "filepath": str(duplicate_of["file_path"]), "file_hash": None,
+                "blob_hash": duplicate_of["item"].file_hash, **duplicate_of["file_info"],
+            })
+        elif gallery_id:
+            # 秒传：复用已有文件和AI分析结果，秒传记录不保存file_hash以避免唯一约束冲突
+            row = {
+                "title": entry["title"], "description": description, "topic_id": topic_id,
+                "filename": entry["filename"], "filepath": str(duplicate_of.filepath), "file_hash": None,
+                "blob_hash": duplicate_of.blob_hash, **{field: getattr(duplicate_of, field) for field in FILE_INFO_FIELDS},
+            }
+            if duplicate_of.ai_status == 'completed' and duplicate_of.ai_description:
+                row.update(
+                    ai_status=duplicate_of.ai_status,
+                    ai_description=duplicate_of.ai_description,
+                    ai_tags=duplicate_of.ai_tags,
+                    extra_tags=duplicate_of.ai_tags if isinstance(duplicate_of.ai_tags, list) else None,
+                )
+            rows.append(row)
+        else:
+            # 不关联图集时，直接返回现有图片
+            item.status = "fast_upload"
+            item.image_id = duplicate_of.id
+            item.image_url = generate_image_url(duplicate_of)
+            item.thumbnail_url = generate_rendition_url(duplicate_of, "thumb")
+            continue
+        row_entries.append(entry)
+
+    if rows:
+        image_ids = crud.image.create_multi(
+            db=db,
+            rows=rows,
+            owner_id=current_user.id,
+            tags=tag_list,
+            category_id=category_id,
+            gallery_id=gallery_id,
+        )
+        for entry, row, image_id in zip(row_entries, rows, image_ids):
+            item = entry["item"]
+            stored = SimpleNamespace(
+                filepath=row["filepath"], filename=row["filename"],
+                file_hash=row["file_hash"], blob_hash=row["blob_hash"], file_size=row.get("file_size"),
+            )
+            item.status = "created" if row["file_hash"] else "fast_upload"
+            item.image_id = image_id
+            item.image_url = generate_image_url(stored)
+            item.thumbnail_url = generate_rendition_url(stored, "thumb")
+            if row.get("ai_status") != 'completed':
+                enqueue_ai_analysis(db, image_id, commit=False)
+            if row["file_hash"]:
+                item.possible_duplicate_ids = find_possible_duplicates(db, row.get("phash"), exclude_id=image_id)
+            phash_index.add(image_id, row.get("phash"))
+        # 整批的AI分析任务一次提交
+        db.commit()
+
+        # 整批只重新统计一次图集图片数量
+        if gallery_id:
+            crud_gallery.update_image_count(db, gallery_id=gallery_id)
+
+    return schemas.ImageBatchResult(
+        gallery_id=gallery_id,
+        created=sum(1 for item in items if item.status == "created"),
+        fast_uploaded=sum(1 for item in items if item.status == "fast_upload"),
+        failed=sum(1 for item in items if item.status == "failed"),
+        items=items,
     )
-    image = crud.image.create(
-        db=db, 
-        obj_in=image_in, 
-        owner_id=current_user.id, 
-        filename=unique_filename,
-        filepath=str(file_path),
-        tags=tag_list,
+
+@router.post("/batch", response_model=schemas.ImageBatchResult)
+async def upload_images_batch(
+    *,
+    db: Session = Depends(get_db),
+    files: List[UploadFile] = File(...),
+    titles: Optional[List[str]] = Form(None),
+    file_hashes: Optional[List[str]] = Form(None),
+    description: Optional[str] = Form(None),
+    tags: Optional[str] = Form(None),
+    category_id: Optional[int] = Form(None),
+    topic_id: Optional[int] = Form(None),
+    gallery_id: Optional[int] = Form(None),
+    gallery_folder: Optional[str] = Form(None),
+    current_user: models.User = Depends(dependencies.get_current_user),
+):
+    """
+    Upload many images in one multipart request.
+    Files are hashed while streamed to disk, processed concurrently in the image
+    worker pool, inserted in a single transaction and the gallery is recounted once.
+    titles / file_hashes are optional and matched to files by position; missing
+    titles default to the file name. Returns one result per file, in upload order.
+    """
+    if len(files) > settings.UPLOAD_BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many files, at most {settings.UPLOAD_BATCH_MAX_FILES} per batch.",
+        )
+
+    items, entries, to_process = await run_in_threadpool(_prepare_batch, db, files, titles, file_hashes)
+
+    # 3. 并发处理新文件。整批作为一个请求申请准入额度：同时解码的文件数不超过工作进程数，
+    #    额度按最大的几个文件估算
+    results: List[Any] = []
+    if to_process:
+        costs = sorted((entry["cost"] for entry in to_process), reverse=True)
+        batch_cost = sum(costs[:max(1, image_worker.max_workers)])
+        try:
+            async with upload_admission.admit(current_user.id, batch_cost):
+                results = await image_worker.run_many(
+                    process_image, [(entry["upload_path"], entry["file_path"]) for entry in to_process]
+                )
+        except AdmissionTimeout as e:
+            results = [e] * len(to_process)
+
+    return await run_in_threadpool(
+        _finish_batch,
+        db,
+        items,
+        entries,
+        to_process,
+        results,
+        description=description,
+        tags=tags,
         category_id=category_id,
-        gallery_id=gallery_id
+        topic_id=topic_id,
+        gallery_id=gallery_id,
+        current_user=current_user,
     )
 
-    # 如果关联了图集，更新图集统计信息
-    if gallery_id:
-        crud_gallery.update_image_count(db, gallery_id=gallery_id)
-
-    # 将AI分析任务添加到后台任务（上传成功后异步执行）
-    background_tasks.add_task(trigger_ai_analysis_background, image.id)
+@router.post("/hashes/check", response_model=schemas.ImageHashCheckResult)
+def check_image_hashes(
+    *,
+    db: Session = Depends(get_db),
+    hash_check: schemas.ImageHashCheck,
+    current_user: models.User = Depends(dependencies.get_current_user),
+):
+    """
+    Pre-flight duplicate check for a whole selection of files (秒传预检).
+    Returns which SHA-256 digests already exist (with their image IDs) and which
+    are missing, so clients only transfer the missing files.
+    """
+    if len(hash_check.hashes) > settings.HASH_CHECK_MAX_HASHES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many hashes, at most {settings.HASH_CHECK_MAX_HASHES} per request.",
+        )
 
-    return _map_image_to_schema(db, image, current_user.id)
+    # 统一为小写并去重（保持顺序）；非SHA-256格式的备用哈希不可能命中，直接视为缺失
+    hashes = list(dict.fromkeys(h.lower() for h in hash_check.hashes))
+    existing = crud.image.get_existing_hashes(db, hashes=[h for h in hashes if is_sha256_hex(h)])
+    return schemas.ImageHashCheckResult(
+        existing=existing,
+        missing=[h for h in hashes if h not in existing],
+    )
 
 @router.get("/feed", response_model=List[schemas.Image])
 def read_images_feed(
@@ -288,16 +722,28 @@ def read_images(
     skip: int = 0,
     limit: int = 100,
     category_id: Optional[int] = None,
+    camera_model: Optional[str] = Query(None, description="相机型号筛选（EXIF Model）"),
+    taken_after: Optional[datetime] = Query(None, description="拍摄时间不早于"),
+    taken_before: Optional[datetime] = Query(None, description="拍摄时间早于"),
+    sort: str = Query("created_at", description="排序字段：created_at, taken_at"),
+    order: str = Query("desc", description="排序方向：asc, desc"),
     current_user: models.User = Depends(dependencies.get_current_user_optional),
 ):
     """
-    Retrieve all images with optional category filtering.
+    Retrieve all images with optional category, camera and capture time filtering.
     """
-    if category_id:
-        images = crud.image.get_multi(db, skip=skip, limit=limit)  # 简化为基础查询
-    else:
-        images = crud.image.get_multi(db, skip=skip, limit=limit)
-    
+    images = crud.image.get_multi_filtered(
+        db,
+        skip=skip,
+        limit=limit,
+        category_id=category_id,
+        camera_model=camera_model,
+        taken_after=taken_after,
+        taken_before=taken_before,
+        sort=sort,
+        order=order,
+    )
+
     user_id = current_user.id if current_user else None
     return [_map_image_to_schema(db, image, user_id) for image in images]
 
@@ -379,6 +825,7 @@ def delete_image(
     image_to_return = _map_image_to_schema(db, image, current_user.id)
     
     crud.image.remove(db=db, id=image_id)
+    phash_index.remove(image_id)
     
     return image_to_return
 
@@ -438,21 +885,136 @@ def toggle_image_bookmark(
     
     return {"bookmarked": bookmarked, "bookmarks_count": bookmarks_count}
 
-@router.get("/{image_id}/file")
-def get_image_file(
+@router.get("/{image_id}/near-duplicates", response_model=List[schemas.ImageNearDuplicate])
+def read_near_duplicates(
     *,
     image_id: int,
+    max_distance: Optional[int] = Query(None, ge=0, le=MAX_SEARCH_DISTANCE),
+    limit: int = Query(20, ge=1, le=100),
     db: Session = Depends(get_db),
+    current_user: models.User = Depends(dependencies.get_current_user_optional),
 ):
     """
-    Serve the actual image file.
+    Find visually similar images (re-saved, recompressed or slightly cropped copies)
+    by the Hamming distance of their perceptual hashes, nearest first.
     """
     image = crud.image.get(db=db, id=image_id)
     if not image:
         raise HTTPException(status_code=404, detail="Image not found")
-    
-    file_path = Path(image.filepath)
-    if not file_path.exists():
+    if not image.phash:
+        return []
+
+    phash_index.ensure_loaded(db)
+    matches = phash_index.search(
+        image.phash,
+        settings.PHASH_DUPLICATE_DISTANCE if max_distance is None else max_distance,
+        exclude_id=image.id,
+    )[:limit]
+    if not matches:
+        return []
+
+    # 以数据库为准：其他进程已删除的图片不会出现在结果中
+    images = {
+        found.id: found
+        for found in db.query(models.Image).filter(models.Image.id.in_([match_id for match_id, _ in matches])).all()
+    }
+    user_id = current_user.id if current_user else None
+    return [
+        schemas.ImageNearDuplicate(distance=distance, image=_map_image_to_schema(db, images[match_id], user_id))
+        for match_id, distance in matches
+        if match_id in images
+    ]
+
+def _get_stored_image(db: Session, image_id: int) -> Tuple[models.Image, StoredObject]:
+    image = crud.image.get(db=db, id=image_id)
+    if not image:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    stored = get_storage().stat(storage_key(image.filepath))
+    if stored is None:
         raise HTTPException(status_code=404, detail="Image file not found")
-    
-    return FileResponse(file_path, media_type="image/jpeg")
\ No newline at end of file
+    return image, stored
+
+@router.get("/{image_id}/file")
+def get_image_file(
+    *,
+    request: Request,
+    image_id: int,
+    db: Session = Depends(get_db),
+):
+    """
+    Serve the actual image file. When files live in object storage the client is
+    redirected to a short-lived presigned URL instead of proxying the bytes.
+    Responses carry a strong ETag derived from the file hash; conditional requests
+    are answered with 304, and URLs with a ?v= content version are cached as immutable.
+    With FILE_DELIVERY_MODE=x-accel the bytes are sent by nginx via X-Accel-Redirect.
+    """
+    image, stored = _get_stored_image(db, image_id)
+    file_hash = content_hash(image)
+    etag = make_etag(file_hash, stored.size) if file_hash else (
+        blob_etag(stored.key, stored.size) or make_etag(f"{int(stored.modified):x}", stored.size)
+    )
+    storage = get_storage()
+    if not storage.is_local:
+        headers = cache_headers(etag, stored.modified, redirect_cache_control())
+        if is_not_modified(request.headers, etag, stored.modified):
+            return not_modified_response(headers)
+        return RedirectResponse(storage.presigned_url(stored.key), status_code=status.HTTP_302_FOUND, headers=headers)
+    return conditional_file_response(
+        request, storage.path(stored.key), etag=etag, modified=stored.modified, media_type="image/jpeg",
+        accel_key=stored.key,
+    )
+
+@router.get("/{image_id}/render")
+async def render_image(
+    *,
+    request: Request,
+    image_id: int,
+    w: Optional[int] = Query(None, ge=1, le=10000),
+    h: Optional[int] = Query(None, ge=1, le=10000),
+    fit: str = Query("contain"),
+    fmt: str = Query("jpeg"),
+    db: Session = Depends(get_db),
+):
+    """
+    Serve a resized variant of the image, rendered on first request and cached on disk.
+    The width is rounded up to a fixed bucket (RENDER_WIDTH_BUCKETS) so arbitrary sizes
+    cannot blow up the cache; fit is "contain" or "cover", fmt is "jpeg" or "webp".
+    The ETag is the render cache key, so revalidation is answered without rendering.
+    """
+    if fit not in RENDER_FITS:
+        raise HTTPException(status_code=400, detail=f"fit must be one of: {', '.join(RENDER_FITS)}")
+    if fmt not in RENDER_FORMATS:
+        raise HTTPException(status_code=400, detail=f"fmt must be one of: {', '.join(RENDER_FORMATS)}")
+    if not w and not h:
+        raise HTTPException(status_code=400, detail="At least one of w and h is required")
+
+    _, stored = await run_in_threadpool(_get_stored_image, db, image_id)
+    width, height = normalize_dimensions(w, h)
+    key = render_cache.make_key(stored, width, height, fit, fmt)
+    etag = f'"{key}"'
+    cache_control = IMMUTABLE_CACHE_CONTROL if is_versioned(request.query_params) else "public, max-age=86400"
+    if is_not_modified(request.headers, etag, stored.modified):
+        return not_modified_response(cache_headers(etag, stored.modified, cache_control))
+
+    cached_path = await run_in_threadpool(render_cache.get, key)
+    if cached_path is None:
+        try:
+            # 对象存储中的原图先下载到本地临时文件，渲染结果缓存在本节点
+            source = get_storage().local_file(stored.key)
+            file_path = await run_in_threadpool(source.__enter__)
+            try:
+                await run_image_task(render_variant, file_path, render_cache.path_for(key), width, height, fit, fmt)
+            finally:
+                await run_in_threadpool(source.__exit__, None, None, None)
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.exception(f"Error rendering image {image_id}: {e}")
+            raise HTTPException(status_code=500, detail="The image could not be rendered.")
+        cached_path = await run_in_threadpool(render_cache.add, key)
+
+    return conditional_file_response(
+        request, cached_path, etag=etag, modified=stored.modified,
+        media_type=RENDER_FORMATS[fmt][2], cache_control=cache_control,
+    )
@@ -1,6 +1,7 @@
 from typing import List, Any, Optional
 from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Form
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 import shutil
 import uuid
 import logging
@@ -9,8 +10,10 @@ from pathlib import Path
 from app import crud, models, schemas
 from app.api.v1.dependencies import get_db, get_current_active_user
 from app.schemas.topic import TopicCreate, TopicUpdate, TopicPage
-from app.core.image_utils import generate_image_url, compress_image, add_watermark
-from app.api.v1.endpoints.galleries import _add_image_urls_to_gallery
+from app.core.image_utils import FILE_INFO_FIELDS, generate_image_url, process_image, publish_image
+from app.core.storage import get_storage, storage_key
+from app.api.v1.endpoints.galleries import _prepare_gallery_list
+from app.api.v1.endpoints.images import run_image_task
 from app.core.config import settings
 
 router = APIRouter()
@@ -228,9 +231,8 @@ def read_topic_galleries(
         db=db, topic_id=topic_id, skip=skip, limit=limit, sort=sort, order=order
     )
     
-    # 为图集及其图片动态添加可访问的URL
-    for gallery in galleries:
-        _add_image_urls_to_gallery(gallery)
+    # 为图集封面动态添加可访问的URL
+    _prepare_gallery_list(db, galleries)
         
     return galleries
 
@@ -364,7 +366,7 @@ def delete_topic(
 
 
 @router.post("/{topic_id}/upload-cover", summary="上传专题封面图片")
-def upload_topic_cover(
+async def upload_topic_cover(
     *,
     db: Session = Depends(get_db),
     topic_id: int,
@@ -383,7 +385,7 @@ def upload_topic_cover(
             raise HTTPException(status_code=403, detail="权限不足")
         
         # 检查专题是否存在
-        topic = crud.topic.get(db=db, id=topic_id)
+        topic = await run_in_threadpool(crud.topic.get, db=db, id=topic_id)
         if not topic:
             logger.error(f"专题 {topic_id} 不存在")
             raise HTTPException(status_code=404, detail="专题不存在")
@@ -400,7 +402,7 @@ def upload_topic_cover(
         logger.error(f"上传专题封面过程中发生未知错误: {str(e)}")
         raise HTTPException(status_code=500, detail=f"服务器内部错误: {str(e)}")
     
-    # 创建专题图片目录
+    # 在暂存目录中保存并处理，完成后写入存储后端
     upload_dir = Path(settings.UPLOAD_DIRECTORY) / "topics"
     upload_dir.mkdir(parents=True, exist_ok=True)
     
@@ -411,8 +413,7 @@ def upload_topic_cover(
     
     try:
         # 保存文件
-        with file_path.open("wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        await run_in_threadpool(_save_upload, file, file_path)
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -422,19 +423,51 @@ def upload_topic_cover(
         file.file.close()
     
     try:
-        # 处理图片（压缩和水印）
-        compress_image(file_path)
-        add_watermark(file_path)
+        # 处理图片（单次解码完成压缩和水印）
+        processed = await run_image_task(process_image, file_path)
+    except HTTPException:
+        file_path.unlink(missing_ok=True)
+        raise
     except Exception as e:
         # 如果图片处理失败，删除文件并返回错误
-        if file_path.exists():
-            file_path.unlink()
+        file_path.unlink(missing_ok=True)
         raise HTTPException(
             status_code=400,
             detail=f"图片处理失败: {str(e)}"
         )
+
+    stored_paths = [file_path, *processed["renditions"].values()]
+    try:
+        await run_in_threadpool(publish_image, file_path, processed["renditions"])
+    except Exception as e:
+        for path in stored_paths:
+            path.unlink(missing_ok=True)
+        raise HTTPException(
+            status_code=500,
+            detail=f"文件存储失败: {str(e)}"
+        )
     
     # 创建图片记录
+    return await run_in_threadpool(
+        _create_cover_image, db, topic, current_user, file_path, unique_filename, processed, stored_paths
+    )
+
+
+def _save_upload(file: UploadFile, file_path: Path) -> None:
+    with file_path.open("wb") as buffer:
+        shutil.copyfileobj(file.file, buffer)
+
+
+def _create_cover_image(
+    db: Session,
+    topic: models.Topic,
+    current_user: models.User,
+    file_path: Path,
+    unique_filename: str,
+    processed: dict,
+    stored_paths: List[Path],
+) -> Any:
+    """创建封面图片记录并设置为专题封面，失败时删除已存储的文件"""
     try:
         image_in = schemas.ImageCreate(
             title=f"{topic.name}的封面图片",
@@ -449,7 +482,8 @@ def upload_topic_cover(
             filename=unique_filename,
             filepath=str(file_path),
             tags=["专题封面"],
-            category_id=None
+            category_id=None,
+            file_info={field: processed[field] for field in FILE_INFO_FIELDS},
         )
         
         # 更新专题的封面图片ID
@@ -460,14 +494,15 @@ def upload_topic_cover(
         return {
             "message": "专题封面上传成功",
             "image_id": image.id,
-            "cover_image_url": f"/uploads/topics/{unique_filename}",
+            "cover_image_url": generate_image_url(image),
             "filename": unique_filename
         }
         
     except Exception as e:
-        # 如果数据库操作失败，删除已上传的文件
-        if file_path.exists():
-            file_path.unlink()
+        # 如果数据库操作失败，删除已存储的文件
+        storage = get_storage()
+        for path in stored_paths:
+            storage.delete(storage_key(path))
         raise HTTPException(
             status_code=500,
             detail=f"保存图片记录失败: {str(e)}"
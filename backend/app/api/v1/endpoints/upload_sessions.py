@@ -0,0 +1,268 @@
+import os
+import re
+import time
+import logging
+from typing import BinaryIO, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+
+from app import crud, models, schemas
+from app.api.v1 import dependencies
+from app.api.v1.endpoints.images import ingest_upload
+from app.core.config import settings
+from app.core.image_utils import UPLOAD_CHUNK_SIZE, is_sha256_hex
+from app.db.session import get_db
+from app.services import chunked_upload
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+_CONTENT_RANGE_RE = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+
+# 过期会话的顺带清理间隔（秒）
+_PURGE_INTERVAL = 600
+_last_purge = 0.0
+
+
+def _to_schema(session: models.UploadSession) -> schemas.UploadSession:
+    session_schema = schemas.UploadSession.model_validate(session)
+    session_schema.chunk_size = settings.UPLOAD_SESSION_CHUNK_SIZE
+    session_schema.completed = session.received_size >= session.total_size
+    return session_schema
+
+
+def _get_session_or_404(db: Session, session_id: str, current_user: models.User) -> models.UploadSession:
+    session = crud.upload_session.get_by_owner(db, id=session_id, owner_id=current_user.id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload session not found or expired")
+    return session
+
+
+def _offset_conflict(session: models.UploadSession) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=f"Chunk does not start at the received offset {session.received_size}",
+        headers={"Upload-Offset": str(session.received_size)},
+    )
+
+
+@router.post("/", response_model=schemas.UploadSession, status_code=status.HTTP_201_CREATED)
+def create_upload_session(
+    *,
+    db: Session = Depends(get_db),
+    session_in: schemas.UploadSessionCreate,
+    current_user: models.User = Depends(dependencies.get_current_user),
+):
+    """
+    创建分片上传会话。客户端随后按顺序 PUT 各分片（Content-Range），
+    中断后通过 GET 查询已接收偏移继续上传，全部上传后调用 /complete 入库。
+    """
+    global _last_purge
+    if session_in.total_size > settings.UPLOAD_SESSION_MAX_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File too large, at most {settings.UPLOAD_SESSION_MAX_SIZE} bytes.",
+        )
+
+    # 顺带清理过期会话，避免未完成的分片文件长期占用磁盘
+    if time.monotonic() - _last_purge > _PURGE_INTERVAL:
+        _last_purge = time.monotonic()
+        try:
+            chunked_upload.purge_expired_sessions(db)
+        except Exception as e:
+            logger.error(f"Failed to purge expired upload sessions: {e}")
+
+    session = crud.upload_session.create_with_owner(db, obj_in=session_in, owner_id=current_user.id)
+    chunked_upload.get_part_path(session.id).touch()
+    return _to_schema(session)
+
+
+@router.get("/{session_id}", response_model=schemas.UploadSession)
+def read_upload_session(
+    *,
+    db: Session = Depends(get_db),
+    session_id: str,
+    current_user: models.User = Depends(dependencies.get_current_user),
+):
+    """
+    查询上传会话，received_size 即下一个分片应当开始的偏移。
+    """
+    return _to_schema(_get_session_or_404(db, session_id, current_user))
+
+
+@router.put("/{session_id}", response_model=schemas.UploadSession)
+async def upload_chunk(
+    *,
+    request: Request,
+    db: Session = Depends(get_db),
+    session_id: str,
+    content_range: Optional[str] = Header(None),
+    current_user: models.User = Depends(dependencies.get_current_user),
+):
+    """
+    上传一个分片，请求体为原始字节。Content-Range 形如 "bytes 0-8388607/52428800"，
+    省略时视为从当前已接收偏移追加。分片起点必须等于已接收偏移，否则返回409及 Upload-Offset。
+    连接中途断开时保留已收到的字节，客户端可从新的偏移继续。
+    数据库和文件操作都在线程池中执行，不阻塞事件循环。
+    """
+    session = await run_in_threadpool(_get_session_or_404, db, session_id, current_user)
+    start = session.received_size
+    end = session.total_size - 1
+    if content_range:
+        match = _CONTENT_RANGE_RE.match(content_range.strip())
+        if not match:
+            raise HTTPException(status_code=400, detail="Invalid Content-Range header")
+        start, end, total = (int(value) for value in match.groups())
+        if total != session.total_size or end < start or end >= total:
+            raise HTTPException(status_code=400, detail="Content-Range does not match the upload session")
+    if start != session.received_size:
+        raise _offset_conflict(session)
+
+    # 同一会话同时只允许一个请求写入（跨进程的文件锁），其余直接返回409，由客户端查询偏移后重试
+    try:
+        part = await run_in_threadpool(chunked_upload.acquire_part, session_id)
+    except chunked_upload.PartFileBusy:
+        raise _offset_conflict(session)
+    try:
+        # 持锁后重新读取偏移：检查之后、加锁之前其他请求可能已推进偏移
+        await run_in_threadpool(db.refresh, session)
+        if start != session.received_size:
+            raise _offset_conflict(session)
+
+        hasher = await run_in_threadpool(chunked_upload.get_hasher, session_id, start)
+        written = await _receive_chunk(request, part, hasher, session_id, start, end - start + 1)
+
+        new_offset = start + written
+        advanced = await run_in_threadpool(
+            crud.upload_session.advance, db, id=session_id, expected_offset=start, new_offset=new_offset
+        )
+        if not advanced:
+            await run_in_threadpool(db.refresh, session)
+            raise _offset_conflict(session)
+        chunked_upload.store_hasher(session_id, new_offset, hasher)
+    finally:
+        await run_in_threadpool(chunked_upload.release_part, session_id, part)
+
+    await run_in_threadpool(db.refresh, session)
+    return _to_schema(session)
+
+
+async def _receive_chunk(request: Request, part: BinaryIO, hasher, session_id: str, start: int, limit: int) -> int:
+    """
+    把请求体从 start 处写入分片文件并更新哈希，返回写入的字节数。
+    请求体按 UPLOAD_CHUNK_SIZE 攒批后在线程池中写入，返回前 fsync 落盘；超出 limit 时回滚到 start 并返回400。
+    """
+
+    def write(data: bytes) -> None:
+        part.write(data)
+        hasher.update(data)
+
+    def truncate(offset: int) -> None:
+        part.seek(offset)
+        part.truncate()
+
+    def sync() -> None:
+        part.flush()
+        os.fsync(part.fileno())
+
+    # 丢弃之前中断请求可能残留的、未被记录的字节
+    await run_in_threadpool(truncate, start)
+    written = 0
+    buffer = bytearray()
+    try:
+        async for chunk in request.stream():
+            if written + len(buffer) + len(chunk) > limit:
+                await run_in_threadpool(truncate, start)
+                raise HTTPException(status_code=400, detail="Chunk body is larger than its Content-Range")
+            buffer += chunk
+            if len(buffer) >= UPLOAD_CHUNK_SIZE:
+                await run_in_threadpool(write, bytes(buffer))
+                written += len(buffer)
+                buffer.clear()
+    except ClientDisconnect:
+        logger.info(
+            f"Client disconnected during chunk of upload session {session_id} after {written + len(buffer)} bytes"
+        )
+    if buffer:
+        await run_in_threadpool(write, bytes(buffer))
+        written += len(buffer)
+    # 落盘后才能推进数据库中的偏移，否则崩溃后偏移会指向未持久化的字节
+    await run_in_threadpool(sync)
+    return written
+
+
+@router.post("/{session_id}/complete", response_model=schemas.Image)
+async def complete_upload_session(
+    *,
+    db: Session = Depends(get_db),
+    session_id: str,
+    current_user: models.User = Depends(dependencies.get_current_user),
+):
+    """
+    完成分片上传：校验文件哈希后走与普通上传相同的入库流程（秒传检查、图片处理、创建记录）。
+    图片处理繁忙（503）时保留会话，客户端可稍后重试完成操作。
+    """
+    session = await run_in_threadpool(_get_session_or_404, db, session_id, current_user)
+    if session.received_size != session.total_size:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Upload incomplete: {session.received_size} of {session.total_size} bytes received",
+            headers={"Upload-Offset": str(session.received_size)},
+        )
+
+    hasher = await run_in_threadpool(chunked_upload.get_hasher, session_id, session.total_size)
+    file_hash = hasher.hexdigest()
+    if session.file_hash and is_sha256_hex(session.file_hash) and session.file_hash.lower() != file_hash:
+        await run_in_threadpool(_discard_session, db, session)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="File hash mismatch: the uploaded content does not match file_hash.",
+        )
+
+    form_data = session.form_data or {}
+    try:
+        image = await ingest_upload(
+            db,
+            upload_path=chunked_upload.get_part_path(session_id),
+            file_hash=file_hash,
+            title=form_data.get("title") or session.filename,
+            description=form_data.get("description"),
+            tags=form_data.get("tags"),
+            category_id=form_data.get("category_id"),
+            topic_id=form_data.get("topic_id"),
+            gallery_id=form_data.get("gallery_id"),
+            current_user=current_user,
+        )
+    except HTTPException as e:
+        if e.status_code == status.HTTP_503_SERVICE_UNAVAILABLE:
+            raise
+        await run_in_threadpool(_discard_session, db, session)
+        raise
+
+    await run_in_threadpool(_discard_session, db, session)
+    return image
+
+
+def _discard_session(db: Session, session: models.UploadSession) -> None:
+    """删除会话记录及其分片文件"""
+    chunked_upload.discard(session.id)
+    db.delete(session)
+    db.commit()
+
+
+@router.delete("/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
+def abort_upload_session(
+    *,
+    db: Session = Depends(get_db),
+    session_id: str,
+    current_user: models.User = Depends(dependencies.get_current_user),
+):
+    """
+    放弃上传会话并删除已接收的分片。
+    """
+    session = _get_session_or_404(db, session_id, current_user)
+    _discard_session(db, session)
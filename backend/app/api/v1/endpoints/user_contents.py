@@ -187,7 +187,11 @@ def delete_my_content(
     if content.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
-    crud.content.remove(db, id=content_id)
+    if content.content_type == ContentType.IMAGE:
+        # 图片需要同时释放文件引用，走图片的删除流程
+        crud.image.remove(db, id=content_id)
+    else:
+        crud.content.remove(db, id=content_id)
     return {"message": "Content deleted successfully"}
 
 @router.put("/me/contents/{content_id}")
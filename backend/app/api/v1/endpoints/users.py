@@ -7,6 +7,7 @@ import string
 from app import crud, models, schemas
 from app.api.v1 import dependencies
 from app.db.session import get_db
+from app.api.v1.endpoints.galleries import _prepare_gallery_list
 from app.api.v1.endpoints.images import _map_image_to_schema
 from app.schemas.user import UserSimple
 from app.core.security import verify_password
@@ -549,7 +550,7 @@ def read_user_me_likes(
         # 如果查询失败，返回空列表
         return []
 
-@router.get("/{username}/galleries", response_model=List[schemas.GalleryWithImages])
+@router.get("/{username}/galleries", response_model=List[schemas.Gallery])
 def read_galleries_by_user(
     username: str,
     db: Session = Depends(get_db),
@@ -573,12 +574,8 @@ def read_galleries_by_user(
             setattr(gallery, 'liked_by_current_user', False)
             setattr(gallery, 'bookmarked_by_current_user', False)
     
-    # 为所有图集的图片添加image_url字段
-    for gallery in galleries:
-        if hasattr(gallery, 'images') and gallery.images:
-            for image in gallery.images:
-                from app.core.image_utils import generate_image_url
-                setattr(image, 'image_url', generate_image_url(image))
+    # 为封面添加image_url字段（列表不返回图片列表）
+    _prepare_gallery_list(db, galleries)
     
     return galleries
 
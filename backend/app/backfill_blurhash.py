@@ -0,0 +1,104 @@
+"""
+为历史图片回填 BlurHash 加载占位图。
+
+优先使用已有的最小衍生图（缩略图只有几十KB，解码很快）；没有衍生图时才打开原图，
+并借助 JPEG draft 模式在解码阶段直接缩小。按ID分批（keyset分页）处理，每批提交一次，
+秒传记录与原图共用文件，同一文件只计算一次。
+
+用法:
+    python app/backfill_blurhash.py              # 只处理没有占位图的记录
+    python app/backfill_blurhash.py --all        # 重新计算所有记录
+    python app/backfill_blurhash.py --batch-size 1000
+"""
+import argparse
+import logging
+import os
+import sys
+from pathlib import Path
+from typing import Dict, Optional
+
+# Add the project root directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from PIL import Image as PILImage
+
+from app.core.blurhash import BLURHASH_SAMPLE_SIZE
+from app.core.config import settings
+from app.core.image_utils import compute_blurhash, get_rendition_path
+from app.core.storage import get_storage, storage_key
+from app.db.session import SessionLocal
+import app.models  # noqa: F401  确保所有模型已注册（关系映射需要）
+from app.models.image import Image
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def placeholder_source(filepath: str) -> Optional[str]:
+    """返回计算占位图使用的文件（存储key）：最小的已有衍生图，否则原图"""
+    storage = get_storage()
+    image_path = Path(filepath)
+    for name, _ in sorted(settings.RENDITION_SIZES.items(), key=lambda item: item[1]):
+        rendition_key = storage_key(get_rendition_path(image_path, name))
+        if storage.exists(rendition_key):
+            return rendition_key
+    image_key = storage_key(image_path)
+    return image_key if storage.exists(image_key) else None
+
+
+def blurhash_for_file(filepath: str) -> Optional[str]:
+    source = placeholder_source(filepath) if filepath else None
+    if source is None:
+        logger.warning(f"Image file not found: {filepath}")
+        return None
+    try:
+        with get_storage().local_file(source) as source_path, PILImage.open(source_path) as img:
+            # JPEG 在解码时按 1/2、1/4、1/8 缩小，避免为一个占位图解码整张原图
+            img.draft("RGB", (BLURHASH_SAMPLE_SIZE, BLURHASH_SAMPLE_SIZE))
+            img.load()
+            return compute_blurhash(img)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read image {source}: {e}")
+        return None
+
+
+def backfill(batch_size: int = 500, recompute: bool = False) -> None:
+    db = SessionLocal()
+    updated = skipped = 0
+    last_id = 0
+    try:
+        while True:
+            query = db.query(Image.id, Image.filepath).filter(Image.id > last_id)
+            if not recompute:
+                query = query.filter(Image.blurhash.is_(None))
+            rows = query.order_by(Image.id).limit(batch_size).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            hashes: Dict[str, Optional[str]] = {}
+            mappings = []
+            for image_id, filepath in rows:
+                if filepath not in hashes:
+                    hashes[filepath] = blurhash_for_file(filepath)
+                if hashes[filepath] is None:
+                    skipped += 1
+                    continue
+                mappings.append({"id": image_id, "blurhash": hashes[filepath]})
+
+            if mappings:
+                db.bulk_update_mappings(Image, mappings)
+                db.commit()
+            updated += len(mappings)
+            logger.info(f"Processed up to image {last_id}: {updated} updated, {skipped} skipped")
+    finally:
+        db.close()
+    logger.info(f"Backfill finished: {updated} updated, {skipped} skipped (missing or unreadable files)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--all", action="store_true", help="重新计算所有记录，而不只是没有占位图的记录")
+    args = parser.parse_args()
+    backfill(batch_size=args.batch_size, recompute=args.all)
@@ -0,0 +1,66 @@
+"""
+为已有图集生成拼图（列表页卡片使用的前几张图片合成图）。
+
+图集成员或封面变化时API会在后台自动刷新拼图，此脚本用于升级后补齐历史图集，
+或修改 CONTACT_SHEET_* 配置、重新处理图片后全部重新生成。按ID分批（keyset分页）处理，
+拼图没有变化的图集直接跳过。
+
+用法:
+    python app/backfill_contact_sheets.py              # 只处理没有拼图或拼图已过期的图集
+    python app/backfill_contact_sheets.py --all        # 不复用旧拼图，全部重新生成
+    python app/backfill_contact_sheets.py --batch-size 200
+"""
+import argparse
+import logging
+import os
+import sys
+
+# Add the project root directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.db.session import SessionLocal
+import app.models  # noqa: F401  确保所有模型已注册（关系映射需要）
+from app.models.gallery import Gallery
+from app.services.contact_sheet import refresh_contact_sheet
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def backfill(batch_size: int = 500, regenerate: bool = False) -> None:
+    db = SessionLocal()
+    updated = unchanged = failed = 0
+    last_id = 0
+    try:
+        while True:
+            gallery_ids = [
+                gallery_id for (gallery_id,) in
+                db.query(Gallery.id).filter(Gallery.id > last_id).order_by(Gallery.id).limit(batch_size)
+            ]
+            if not gallery_ids:
+                break
+            last_id = gallery_ids[-1]
+            for gallery_id in gallery_ids:
+                try:
+                    if refresh_contact_sheet(db, gallery_id, force=regenerate):
+                        updated += 1
+                    else:
+                        unchanged += 1
+                except Exception as e:
+                    db.rollback()
+                    logger.warning(f"Could not build contact sheet of gallery {gallery_id}: {e}")
+                    failed += 1
+            # 每批结束后清空会话中已加载的图集和图片
+            db.expunge_all()
+            logger.info(f"Processed up to gallery {last_id}: {updated} updated, {unchanged} unchanged, {failed} failed")
+    finally:
+        db.close()
+    logger.info(f"Backfill finished: {updated} updated, {unchanged} unchanged, {failed} failed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--all", action="store_true", help="不复用旧拼图的格子，全部重新生成")
+    args = parser.parse_args()
+    backfill(batch_size=args.batch_size, regenerate=args.all)
@@ -0,0 +1,94 @@
+"""
+为历史图片回填 width、height、file_size、file_type。
+
+只读取图片文件头（Pillow 打开文件时仅解析头部，不解码像素），按ID分批（keyset分页）处理，
+每批提交一次。秒传记录与原图共用文件，同一文件只读取一次。
+
+用法:
+    python app/backfill_image_metadata.py              # 只处理缺少尺寸信息的记录
+    python app/backfill_image_metadata.py --all        # 重新计算所有记录
+    python app/backfill_image_metadata.py --batch-size 1000
+"""
+import argparse
+import logging
+import os
+import sys
+from typing import Dict, Optional
+
+# Add the project root directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from PIL import Image as PILImage
+from sqlalchemy import or_
+
+from app.core.storage import get_storage, storage_key
+from app.db.session import SessionLocal
+import app.models  # noqa: F401  确保所有模型已注册（关系映射需要）
+from app.models.image import Image
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def read_file_info(filepath: str) -> Optional[Dict[str, object]]:
+    """读取图片文件头得到尺寸和格式，文件缺失或无法识别时返回None"""
+    try:
+        with get_storage().local_file(storage_key(filepath)) as local_path, PILImage.open(local_path) as img:
+            width, height = img.size
+            file_type = PILImage.MIME.get(img.format, f"image/{(img.format or 'unknown').lower()}")
+            file_size = os.path.getsize(local_path)
+        return {
+            "width": width,
+            "height": height,
+            "file_size": file_size,
+            "file_type": file_type,
+        }
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read image header {filepath}: {e}")
+        return None
+
+
+def backfill(batch_size: int = 500, recompute: bool = False) -> None:
+    db = SessionLocal()
+    updated = skipped = 0
+    last_id = 0
+    try:
+        while True:
+            query = db.query(Image.id, Image.filepath).filter(Image.id > last_id)
+            if not recompute:
+                query = query.filter(or_(
+                    Image.width.is_(None), Image.height.is_(None),
+                    Image.file_size.is_(None), Image.file_type.is_(None),
+                ))
+            rows = query.order_by(Image.id).limit(batch_size).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            infos: Dict[str, Optional[Dict[str, object]]] = {}
+            mappings = []
+            for image_id, filepath in rows:
+                if filepath not in infos:
+                    infos[filepath] = read_file_info(filepath) if filepath else None
+                info = infos[filepath]
+                if info is None:
+                    skipped += 1
+                    continue
+                mappings.append({"id": image_id, **info})
+
+            if mappings:
+                db.bulk_update_mappings(Image, mappings)
+                db.commit()
+            updated += len(mappings)
+            logger.info(f"Processed up to image {last_id}: {updated} updated, {skipped} skipped")
+    finally:
+        db.close()
+    logger.info(f"Backfill finished: {updated} updated, {skipped} skipped (missing or unreadable files)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--all", action="store_true", help="重新计算所有记录，而不只是缺少信息的记录")
+    args = parser.parse_args()
+    backfill(batch_size=args.batch_size, recompute=args.all)
@@ -0,0 +1,102 @@
+"""
+为历史图片回填感知哈希（dHash），并重建近似重复索引快照。
+
+与占位图回填相同，优先使用已有的最小衍生图，没有衍生图时才以 draft 模式打开原图。
+按ID分批（keyset分页）处理，每批提交一次，同一文件只计算一次。
+
+用法:
+    python app/backfill_phash.py              # 只处理没有感知哈希的记录
+    python app/backfill_phash.py --all        # 重新计算所有记录
+    python app/backfill_phash.py --index-only # 只从数据库重建索引快照
+"""
+import argparse
+import logging
+import os
+import sys
+from typing import Dict, Optional
+
+# Add the project root directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from PIL import Image as PILImage
+
+from app.backfill_blurhash import placeholder_source
+from app.core.image_utils import compute_dhash
+from app.core.storage import get_storage
+from app.db.session import SessionLocal
+import app.models  # noqa: F401  确保所有模型已注册（关系映射需要）
+from app.models.image import Image
+from app.services.phash_index import phash_index, touch_phash
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def phash_for_file(filepath: str) -> Optional[str]:
+    source = placeholder_source(filepath) if filepath else None
+    if source is None:
+        logger.warning(f"Image file not found: {filepath}")
+        return None
+    try:
+        with get_storage().local_file(source) as source_path, PILImage.open(source_path) as img:
+            img.draft("RGB", (64, 64))
+            return compute_dhash(img)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read image {source}: {e}")
+        return None
+
+
+def backfill(batch_size: int = 500, recompute: bool = False) -> None:
+    db = SessionLocal()
+    updated = skipped = 0
+    last_id = 0
+    try:
+        while True:
+            query = db.query(Image.id, Image.filepath).filter(Image.id > last_id)
+            if not recompute:
+                query = query.filter(Image.phash.is_(None))
+            rows = query.order_by(Image.id).limit(batch_size).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            hashes: Dict[str, Optional[str]] = {}
+            mappings = []
+            for image_id, filepath in rows:
+                if filepath not in hashes:
+                    hashes[filepath] = phash_for_file(filepath)
+                if hashes[filepath] is None:
+                    skipped += 1
+                    continue
+                mappings.append({"id": image_id, "phash": hashes[filepath]})
+
+            if mappings:
+                db.bulk_update_mappings(Image, mappings)
+                touch_phash(db, (mapping["id"] for mapping in mappings))
+                db.commit()
+            updated += len(mappings)
+            logger.info(f"Processed up to image {last_id}: {updated} updated, {skipped} skipped")
+    finally:
+        db.close()
+    logger.info(f"Backfill finished: {updated} updated, {skipped} skipped (missing or unreadable files)")
+
+
+def rebuild_index() -> None:
+    db = SessionLocal()
+    try:
+        phash_index.rebuild(db)
+        phash_index.save()
+        logger.info(f"Perceptual hash index rebuilt with {len(phash_index)} images")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--all", action="store_true", help="重新计算所有记录，而不只是没有感知哈希的记录")
+    parser.add_argument("--index-only", action="store_true", help="跳过回填，只重建索引快照")
+    args = parser.parse_args()
+    if not args.index_only:
+        backfill(batch_size=args.batch_size, recompute=args.all)
+    rebuild_index()
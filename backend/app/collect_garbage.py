@@ -0,0 +1,54 @@
+"""
+回收上传目录中不再被引用的文件。
+
+删除图片时只减少文件引用计数，不在请求中删除文件；本脚本（或API进程内按 GC_INTERVAL 运行的后台任务）
+把引用计数归零的文件和数据库中已没有记录的孤儿文件移入隔离目录，超过保留期后再永久删除。
+适合在关闭了进程内回收（GC_INTERVAL=0）的部署中由 cron 定时执行。
+
+用法:
+    python app/collect_garbage.py                  # 隔离孤儿文件并清理过期的隔离文件
+    python app/collect_garbage.py --dry-run        # 只统计，不移动或删除文件
+    python app/collect_garbage.py --no-purge       # 只隔离，不清理隔离目录
+    python app/collect_garbage.py --purge-only --retention-hours 0   # 立即清空隔离目录
+"""
+import argparse
+import logging
+import os
+import sys
+
+# Add the project root directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.db.session import SessionLocal
+import app.models  # noqa: F401  确保所有模型已注册（关系映射需要）
+from app.services import file_gc
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="只统计孤儿文件，不移动或删除")
+    parser.add_argument("--no-purge", action="store_true", help="不清理过期的隔离文件")
+    parser.add_argument("--purge-only", action="store_true", help="只清理过期的隔离文件，不扫描上传目录")
+    parser.add_argument("--retention-hours", type=int, default=None, help="覆盖 GC_QUARANTINE_RETENTION_HOURS")
+    args = parser.parse_args()
+
+    if args.purge_only:
+        db = SessionLocal()
+        try:
+            stats = file_gc.purge_quarantine(db, retention_hours=args.retention_hours)
+        finally:
+            db.close()
+        logger.info(f"Purged {stats['purged']} files, {stats['reclaimed_bytes']} bytes reclaimed "
+                    f"({stats['restored']} restored)")
+        return
+
+    stats = file_gc.run_exclusive(dry_run=args.dry_run, purge=not args.no_purge, retention_hours=args.retention_hours)
+    if stats is None:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+BlurHash 编码（https://blurha.sh），用于图片加载前显示的模糊占位图。
+
+在已缩小的图片上用 NumPy 一次性计算所有DCT分量，32px 以内的输入耗时远低于1毫秒。
+"""
+import math
+
+import numpy as np
+from PIL import Image
+
+_BASE83_CHARS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+# 计算分量前先把图片缩小到的最长边像素，BlurHash 只保留极低频信息，更大的输入没有意义
+BLURHASH_SAMPLE_SIZE = 32
+
+# sRGB(0-255) -> 线性光 查找表
+_SRGB_TO_LINEAR = np.array(
+    [v / 12.92 if v <= 0.04045 else ((v + 0.055) / 1.055) ** 2.4 for v in (i / 255 for i in range(256))],
+    dtype=np.float64,
+)
+
+
+def _base83(value: int, length: int) -> str:
+    return "".join(_BASE83_CHARS[(value // 83 ** (length - i - 1)) % 83] for i in range(length))
+
+
+def _linear_to_srgb(value: float) -> int:
+    value = min(1.0, max(0.0, value))
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def _sign_pow(value: float, exponent: float) -> float:
+    return math.copysign(abs(value) ** exponent, value)
+
+
+def encode_blurhash(img: Image.Image, x_components: int = 4, y_components: int = 3) -> str:
+    """
+    计算图片的 BlurHash 字符串。
+
+    Args:
+        img: 已解码的图片（通常是缩略图），大于 BLURHASH_SAMPLE_SIZE 时先缩小
+        x_components / y_components: 水平/垂直方向的分量数（1-9）
+    """
+    if not (1 <= x_components <= 9 and 1 <= y_components <= 9):
+        raise ValueError("BlurHash components must be between 1 and 9")
+
+    if img.width > BLURHASH_SAMPLE_SIZE or img.height > BLURHASH_SAMPLE_SIZE:
+        img = img.copy()
+        img.thumbnail((BLURHASH_SAMPLE_SIZE, BLURHASH_SAMPLE_SIZE), Image.Resampling.BOX)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+
+    linear = _SRGB_TO_LINEAR[np.asarray(img, dtype=np.uint8)]  # (h, w, 3)
+    height, width = linear.shape[:2]
+
+    # 余弦基函数：cos(pi * i * x / w)、cos(pi * j * y / h)
+    basis_x = np.cos(np.pi * np.outer(np.arange(x_components), np.arange(width)) / width)
+    basis_y = np.cos(np.pi * np.outer(np.arange(y_components), np.arange(height)) / height)
+    factors = np.einsum("jy,ix,yxc->jic", basis_y, basis_x, linear) / (width * height)
+    factors[1:, :] *= 2
+    factors[0, 1:] *= 2
+    factors = factors.reshape(-1, 3)  # 按 y 外层、x 内层的顺序排列，与参考实现一致
+
+    dc, ac = factors[0], factors[1:]
+    parts = [_base83((x_components - 1) + (y_components - 1) * 9, 1)]
+
+    if len(ac):
+        quantised_max = int(max(0, min(82, math.floor(float(np.abs(ac).max()) * 166 - 0.5))))
+        max_value = (quantised_max + 1) / 166
+    else:
+        quantised_max = 0
+        max_value = 1.0
+    parts.append(_base83(quantised_max, 1))
+
+    parts.append(_base83(
+        (_linear_to_srgb(dc[0]) << 16) + (_linear_to_srgb(dc[1]) << 8) + _linear_to_srgb(dc[2]), 4
+    ))
+    for r, g, b in ac:
+        quant_r, quant_g, quant_b = (
+            int(max(0, min(18, math.floor(_sign_pow(v / max_value, 0.5) * 9 + 9.5)))) for v in (r, g, b)
+        )
+        parts.append(_base83(quant_r * 19 * 19 + quant_g * 19 + quant_b, 2))
+
+    return "".join(parts)
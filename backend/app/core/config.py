@@ -41,12 +41,136 @@ class Settings(BaseSettings):
 
     # --- File Storage ---
     UPLOAD_DIRECTORY: str = "uploads"
+    # 内容寻址存储目录（UPLOAD_DIRECTORY 下的子目录），文件按SHA-256前缀分两级目录存放
+    BLOB_DIRECTORY: str = "blobs"
+
+    # --- Storage Backend ---
+    # 文件存储后端：local（UPLOAD_DIRECTORY，由 /uploads 静态目录提供访问）或 s3（S3协议对象存储，例如 MinIO）。
+    # 图片处理始终在本地完成：s3 模式下 UPLOAD_DIRECTORY 只作暂存，写入存储桶后删除本地副本，多个API节点可共用一个存储桶
+    STORAGE_BACKEND: str = "local"
+    S3_BUCKET: str = "gallery"
+    # 兼容服务（MinIO 等）的地址，为空时使用 AWS S3
+    S3_ENDPOINT_URL: str = ""
+    S3_REGION: str = ""
+    S3_ACCESS_KEY: str = ""
+    S3_SECRET_KEY: str = ""
+    # 对象键前缀（多个环境共用一个存储桶时区分）
+    S3_PREFIX: str = ""
+    # 公开访问地址（公共读存储桶或CDN），为空时 /uploads/<key> 由API重定向到预签名URL
+    S3_PUBLIC_URL: str = ""
+    S3_PRESIGNED_URL_EXPIRES: int = 3600
+    # 超过此大小的文件分片上传及分片大小
+    S3_MULTIPART_THRESHOLD: int = 16 * 1024 * 1024
+    S3_MULTIPART_CHUNK_SIZE: int = 8 * 1024 * 1024
+
+    # --- HTTP Caching & File Serving ---
+    # 图片URL带内容版本参数（?v=<哈希前缀>），内容变化时URL随之变化，带版本参数的请求按此时长（秒）永久缓存
+    IMAGE_CACHE_MAX_AGE: int = 365 * 24 * 3600
+    # 文件响应的读取块大小（ASGI服务器不支持零拷贝发送时使用），每块一次线程切换和一次发送
+    FILE_RESPONSE_CHUNK_SIZE: int = 1024 * 1024
+    # 本地文件的发送方式：direct（由API进程发送）或 x-accel（API只查库，返回 X-Accel-Redirect 由 nginx 发送）。
+    # x-accel 模式只对带 "X-Sendfile-Type: X-Accel-Redirect" 请求头（由 nginx 添加）的请求生效，
+    # 直接访问API端口的请求仍由API发送。nginx 配置见 frontend/nginx.conf 中的 /protected_uploads/
+    FILE_DELIVERY_MODE: str = "direct"
+    # nginx 中映射到 UPLOAD_DIRECTORY 的内部 location
+    X_ACCEL_REDIRECT_PREFIX: str = "/protected_uploads/"
+
+    # --- Orphan File Garbage Collection ---
+    # 删除图片只减少引用计数，由后台回收任务统一清理不再被引用的文件：
+    # 先移入隔离区（本地为独立目录，s3 模式为存储桶中的同名前缀），保留期过后再永久删除，期间被重新引用的文件会被恢复
+    GC_QUARANTINE_DIRECTORY: str = "gc_quarantine"
+    GC_QUARANTINE_RETENTION_HOURS: int = 72
+    # 修改时间在此秒数内的文件不回收（上传中的文件可能尚未提交数据库记录）
+    GC_MIN_FILE_AGE: int = 3600
+    # 每批从数据库读取的记录数
+    GC_BATCH_SIZE: int = 1000
+    # API进程内的回收间隔（秒），0表示不在进程内运行（改用 app/collect_garbage.py 定时执行）
+    GC_INTERVAL: int = 6 * 3600
+    # UPLOAD_DIRECTORY 下不属于图片记录的子目录（专题封面、站点Logo等），回收时跳过
+    GC_EXCLUDED_DIRECTORIES: list[str] = ["topics", "logos"]
+    # UPLOAD_DIRECTORY 下由应用直接引用的静态文件（存储key），回收时跳过；非图片文件（如 .gitkeep）本身不会被回收
+    GC_EXCLUDED_FILES: list[str] = ["default_topic_cover.jpg"]
+
+    # --- Image Processing ---
+    IMAGE_MAX_WIDTH: int = 1920
+    IMAGE_MAX_HEIGHT: int = 1080
+    IMAGE_QUALITY: int = 85
+    # 图片处理进程池：工作进程数（0表示在请求线程内同步处理）、排队上限、单任务超时（秒）
+    IMAGE_WORKER_COUNT: int = 2
+    IMAGE_WORKER_QUEUE_SIZE: int = 8
+    IMAGE_WORKER_TIMEOUT: int = 120
+    # 队列已满返回503时建议客户端的重试间隔（秒）
+    IMAGE_WORKER_RETRY_AFTER: int = 5
+    # 批量上传接口单次请求的最大文件数
+    UPLOAD_BATCH_MAX_FILES: int = 200
+    # 上传前哈希预检接口单次请求的最大哈希数
+    HASH_CHECK_MAX_HASHES: int = 5000
+    # 图片处理准入控制（每个API进程）：同时处理的图片解码内存预算（按文件头估算）、
+    # 每个用户同时处理的上传请求数、排队等待的最长秒数（超时返回503）
+    UPLOAD_ADMISSION_MAX_BYTES: int = 768 * 1024 * 1024
+    UPLOAD_ADMISSION_PER_USER: int = 2
+    UPLOAD_ADMISSION_TIMEOUT: int = 30
+
+    # --- Chunked (resumable) Upload ---
+    # 未完成分片文件的存放目录（不在静态文件目录下，避免被直接访问）
+    UPLOAD_SESSION_DIRECTORY: str = "upload_sessions"
+    UPLOAD_SESSION_TTL_HOURS: int = 24
+    UPLOAD_SESSION_MAX_SIZE: int = 500 * 1024 * 1024
+    UPLOAD_SESSION_CHUNK_SIZE: int = 8 * 1024 * 1024
 
     # --- Watermark Settings ---
     WATERMARK_TEXT: str = "Image Gallery"
     WATERMARK_FONT_PATH: str = "/app/fonts/default.ttf"
     WATERMARK_FONT_SIZE: int = 36
 
+    # --- Image Renditions ---
+    # 上传时生成的衍生图规格：名称 -> 最长边像素，与原图存放在同一目录
+    RENDITION_SIZES: dict[str, int] = {"thumb": 256, "medium": 640, "large": 1280}
+    RENDITION_QUALITY: int = 80
+    # 加载占位图 BlurHash 的水平/垂直分量数（1-9），越大细节越多、字符串越长
+    BLURHASH_X_COMPONENTS: int = 4
+    BLURHASH_Y_COMPONENTS: int = 3
+
+    # --- Near-duplicate Detection ---
+    # 感知哈希（dHash）索引快照文件，启动时加载以避免全表扫描
+    PHASH_INDEX_PATH: str = "phash_index.npz"
+    # 汉明距离不超过此值视为可能重复（上传时提示，也是近似重复查询的默认阈值）
+    PHASH_DUPLICATE_DISTANCE: int = 6
+    # 从数据库拉取其他进程新增图片的间隔（秒）
+    PHASH_REFRESH_INTERVAL: int = 30
+
+    # --- On-demand Render Cache ---
+    # GET /images/{id}/render 按需生成的缩放图缓存目录及总容量上限（超出时按最近最少使用淘汰）
+    RENDER_CACHE_DIRECTORY: str = "render_cache"
+    RENDER_CACHE_MAX_BYTES: int = 1024 * 1024 * 1024
+    # 请求宽度向上取整到这些档位，避免任意尺寸撑爆缓存
+    RENDER_WIDTH_BUCKETS: list[int] = [160, 320, 480, 640, 800, 960, 1280, 1600, 1920]
+    RENDER_QUALITY: int = 80
+
+    # --- Gallery Contact Sheets ---
+    # 图集拼图：图集的前 CONTACT_SHEET_TILES 张图片（封面在前）裁切为正方形格子合成一张JPEG，
+    # 列表页每个图集卡片只请求这一张图片，按响应中的格子坐标显示各张预览。0表示不生成
+    CONTACT_SHEET_DIRECTORY: str = "contact_sheets"
+    CONTACT_SHEET_TILES: int = 3
+    CONTACT_SHEET_COLUMNS: int = 3
+    CONTACT_SHEET_TILE_SIZE: int = 320
+    CONTACT_SHEET_QUALITY: int = 80
+
+    # --- Background Jobs ---
+    # 持久化任务队列（job 表，AI分析等）：每个API进程内并发执行的任务数，
+    # 0表示API进程不执行任务（改用 app/run_jobs.py 独立运行，可按需要启动多个）
+    JOB_WORKER_CONCURRENCY: int = 2
+    # 没有可执行任务时的轮询间隔（秒）
+    JOB_POLL_INTERVAL: float = 2.0
+    # 租约（可见性超时，秒）：执行期间按1/3间隔续租；进程崩溃后租约到期，任务被其他进程重新领取
+    JOB_VISIBILITY_TIMEOUT: int = 300
+    # 最多执行次数，失败后按 JOB_RETRY_BASE_DELAY * 2^(n-1) 秒（不超过 JOB_RETRY_MAX_DELAY）重试，用尽后进入死信
+    JOB_MAX_ATTEMPTS: int = 5
+    JOB_RETRY_BASE_DELAY: int = 30
+    JOB_RETRY_MAX_DELAY: int = 3600
+    # 已成功的任务记录保留天数（死信一直保留，直到手动重试）
+    JOB_RETENTION_DAYS: int = 7
+
 
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -0,0 +1,368 @@
+import os
+import secrets
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, Dict, List, Mapping, Optional, Tuple
+from urllib.parse import quote
+
+import anyio
+from fastapi import Request
+from fastapi.responses import FileResponse, RedirectResponse, Response
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers, MutableHeaders, QueryParams
+from starlette.exceptions import HTTPException
+from starlette.types import Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.image_utils import find_rendition_original
+
+# 带内容版本参数（?v=）的URL：内容变化时URL随之变化，响应可被浏览器和CDN永久缓存
+IMMUTABLE_CACHE_CONTROL = f"public, max-age={settings.IMAGE_CACHE_MAX_AGE}, immutable"
+# 不带版本参数的URL：可以缓存，但每次使用前用 ETag / Last-Modified 向服务器确认（未变化时返回304）
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+# 转发到 304 响应的头（RFC 9110 15.4.5）
+_NOT_MODIFIED_HEADERS = ("cache-control", "etag", "expires", "last-modified", "vary")
+# Range 请求合并后的区间数上限，超过时忽略 Range 返回完整文件（避免用大量小区间放大开销）
+MAX_RANGES = 100
+
+
+def is_versioned(query_params: QueryParams) -> bool:
+    """请求URL是否带内容版本参数"""
+    return bool(query_params.get("v"))
+
+
+def redirect_cache_control() -> str:
+    """
+    重定向到预签名URL的响应：每次签名的URL都不同，缓存重定向（不超过签名有效期的一半）
+    使浏览器在此期间复用同一个URL及其缓存的内容。
+    """
+    return f"private, max-age={settings.S3_PRESIGNED_URL_EXPIRES // 2}"
+
+
+def make_etag(token: str, size: int) -> str:
+    """强ETag：内容标识（文件哈希）加文件大小（重新处理后文件大小随之变化）"""
+    return f'"{token}-{size:x}"'
+
+
+def blob_etag(key: str, size: int) -> Optional[str]:
+    """内容寻址文件（blobs/ab/cd/<hash>[_规格].jpg）的ETag直接取自文件名中的哈希，其他文件返回None"""
+    path = PurePosixPath(key)
+    if not path.parts or path.parts[0] != settings.BLOB_DIRECTORY:
+        return None
+    return make_etag(path.stem, size)
+
+
+def is_not_modified(request_headers: Mapping[str, str], etag: str, modified: Optional[float]) -> bool:
+    """
+    条件请求判断：If-None-Match 优先（GET请求按弱比较，忽略 W/ 前缀），
+    没有 If-None-Match 时才比较 If-Modified-Since（精确到秒）。
+    """
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match:
+        if if_none_match.strip() == "*":
+            return True
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        return etag in [tag[2:] if tag.startswith("W/") else tag for tag in candidates]
+
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since and modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(modified) <= since
+    return False
+
+
+def cache_headers(etag: str, modified: Optional[float], cache_control: str) -> Dict[str, str]:
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if modified is not None:
+        headers["Last-Modified"] = formatdate(modified, usegmt=True)
+    return headers
+
+
+def not_modified_response(headers: Mapping[str, str]) -> Response:
+    return Response(
+        status_code=304,
+        headers={name: value for name, value in headers.items() if name.lower() in _NOT_MODIFIED_HEADERS},
+    )
+
+
+def parse_range_header(value: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """
+    解析 Range 请求头，返回按起始位置排序、合并了重叠和相邻部分的 [start, end) 区间列表。
+    格式不正确、不是 bytes 单位或区间过多时返回 None（按 RFC 9110 忽略 Range，返回完整文件）；
+    所有区间都超出文件范围时返回空列表（应返回416）。
+    """
+    unit, _, spec = value.partition("=")
+    if unit.strip().lower() != "bytes":
+        return None
+    ranges = []
+    for part in spec.split(","):
+        first, separator, last = (item.strip() for item in part.partition("-"))
+        if not separator or not (first or last) or not (first or "0").isdigit() or not (last or "0").isdigit():
+            return None
+        if first:
+            start = int(first)
+            if last and int(last) < start:
+                return None
+            end = int(last) + 1 if last else size
+        else:
+            # 后缀区间：-500 表示最后500字节
+            start, end = max(size - int(last), 0), size
+            if int(last) == 0:
+                continue
+        if start < size:
+            ranges.append((start, min(end, size)))
+    if len(ranges) > MAX_RANGES:
+        return None
+
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _read_at(file: BinaryIO, offset: int, size: int) -> bytes:
+    """按位置读取（pread 不移动文件指针；没有 pread 的平台退回 seek + read）"""
+    if hasattr(os, "pread"):
+        return os.pread(file.fileno(), size, offset)
+    file.seek(offset)
+    return file.read(size)
+
+
+class RangeFileResponse(FileResponse):
+    """
+    支持 Range 请求的文件响应：单个区间返回206，多个区间返回 multipart/byteranges，
+    请求带 If-Range 时只有它与 ETag（强比较）或 Last-Modified 一致才按区间返回，否则返回完整文件。
+
+    ASGI服务器支持零拷贝扩展时由服务器直接发送文件内容：http.response.zerocopysend（sendfile，
+    支持区间）或 http.response.pathsend（完整文件）。否则按 FILE_RESPONSE_CHUNK_SIZE 大块读取，
+    每块一次线程切换和一次发送，比默认的64KB分块少得多。
+    """
+
+    chunk_size = settings.FILE_RESPONSE_CHUNK_SIZE
+
+    def _if_range_matches(self, if_range: str) -> bool:
+        if_range = if_range.strip()
+        if if_range.startswith("W/"):
+            return False
+        if if_range.startswith('"'):
+            return if_range == self.headers.get("etag")
+        return if_range == self.headers.get("last-modified")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if self.stat_result is None:
+            try:
+                self.stat_result = await anyio.to_thread.run_sync(os.stat, self.path)
+            except FileNotFoundError:
+                raise RuntimeError(f"File at path {self.path} does not exist.")
+            self.set_stat_headers(self.stat_result)
+        size = self.stat_result.st_size
+        request_headers = Headers(scope=scope)
+
+        ranges = None
+        range_header = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+        if self.status_code == 200 and range_header and (if_range is None or self._if_range_matches(if_range)):
+            ranges = parse_range_header(range_header, size)
+            if ranges == []:
+                response = Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+                return await response(scope, receive, send)
+
+        headers = MutableHeaders(raw=list(self.raw_headers))
+        headers.setdefault("accept-ranges", "bytes")
+        status_code = self.status_code
+        # 每段为（分段头, start, end, 分段尾）
+        parts = [(b"", 0, size, b"")]
+        trailer = b""
+        if ranges:
+            status_code = 206
+            if len(ranges) == 1:
+                start, end = ranges[0]
+                parts = [(b"", start, end, b"")]
+                headers["content-range"] = f"bytes {start}-{end - 1}/{size}"
+                headers["content-length"] = str(end - start)
+            else:
+                boundary = secrets.token_hex(13)
+                content_type = headers.get("content-type", "application/octet-stream")
+                parts = [
+                    (
+                        f"--{boundary}\r\nContent-Type: {content_type}\r\n"
+                        f"Content-Range: bytes {start}-{end - 1}/{size}\r\n\r\n".encode("latin-1"),
+                        start, end, b"\r\n",
+                    )
+                    for start, end in ranges
+                ]
+                trailer = f"--{boundary}--\r\n".encode("latin-1")
+                headers["content-type"] = f"multipart/byteranges; boundary={boundary}"
+                headers["content-length"] = str(
+                    sum(len(head) + end - start + len(tail) for head, start, end, tail in parts) + len(trailer)
+                )
+
+        await send({"type": "http.response.start", "status": status_code, "headers": headers.raw})
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        else:
+            spec_version = tuple(map(int, scope.get("asgi", {}).get("spec_version", "2.0").split(".")))
+            extensions = scope.get("extensions", {})
+            if spec_version >= (2, 4):
+                # 客户端断开后 send 抛出 OSError，不需要单独监听断开
+                await self._send_body(send, extensions, parts, trailer, whole_file=not ranges)
+            else:
+                async with anyio.create_task_group() as task_group:
+
+                    async def send_body() -> None:
+                        await self._send_body(send, extensions, parts, trailer, whole_file=not ranges)
+                        task_group.cancel_scope.cancel()
+
+                    task_group.start_soon(send_body)
+                    while (await receive())["type"] != "http.disconnect":
+                        pass
+                    task_group.cancel_scope.cancel()
+
+        if self.background is not None:
+            await self.background()
+
+    async def _send_body(
+        self, send: Send, extensions: dict, parts: List[Tuple[bytes, int, int, bytes]], trailer: bytes, whole_file: bool
+    ) -> None:
+        if whole_file and "http.response.pathsend" in extensions:
+            await send({"type": "http.response.pathsend", "path": str(self.path)})
+            return
+
+        zerocopy = "http.response.zerocopysend" in extensions
+        file = await anyio.to_thread.run_sync(open, self.path, "rb")
+        try:
+            for head, start, end, tail in parts:
+                if head:
+                    await send({"type": "http.response.body", "body": head, "more_body": True})
+                if zerocopy:
+                    await send({
+                        "type": "http.response.zerocopysend", "file": file,
+                        "offset": start, "count": end - start, "more_body": True,
+                    })
+                else:
+                    offset = start
+                    while offset < end:
+                        chunk = await anyio.to_thread.run_sync(
+                            _read_at, file, offset, min(self.chunk_size, end - offset)
+                        )
+                        if not chunk:
+                            raise RuntimeError(f"File at path {self.path} is shorter than expected.")
+                        offset += len(chunk)
+                        await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                if tail:
+                    await send({"type": "http.response.body", "body": tail, "more_body": True})
+            await send({"type": "http.response.body", "body": trailer, "more_body": False})
+        finally:
+            with anyio.CancelScope(shield=True):
+                await anyio.to_thread.run_sync(file.close)
+
+
+def accel_redirect_uri(request_headers: Mapping[str, str], key: Optional[str]) -> Optional[str]:
+    """
+    X-Accel-Redirect 模式下 UPLOAD_DIRECTORY 中的文件交给 nginx 发送时的内部URI。
+    只对经过 nginx（请求头 X-Sendfile-Type: X-Accel-Redirect）的请求生效，其他情况返回None，由API直接发送。
+    """
+    if (
+        key is None
+        or settings.FILE_DELIVERY_MODE != "x-accel"
+        or request_headers.get("x-sendfile-type", "").lower() != "x-accel-redirect"
+    ):
+        return None
+    return settings.X_ACCEL_REDIRECT_PREFIX.rstrip("/") + "/" + quote(key, safe="/")
+
+
+def accel_redirect_response(uri: str, headers: Mapping[str, str], media_type: str) -> Response:
+    """
+    只返回响应头，文件内容由 nginx 从内部 location 发送（sendfile，Range 也由 nginx 处理）。
+    nginx 不转发上游的 ETag，内部 location 用 $upstream_http_etag 补回。
+    """
+    return Response(headers={**headers, "X-Accel-Redirect": uri}, media_type=media_type)
+
+
+def conditional_file_response(
+    request: Request,
+    path: os.PathLike,
+    *,
+    etag: str,
+    modified: Optional[float],
+    media_type: str,
+    cache_control: Optional[str] = None,
+    accel_key: Optional[str] = None,
+) -> Response:
+    """
+    带 ETag / Last-Modified 的文件响应，条件请求命中时返回304。
+    cache_control 为空时按URL是否带版本参数选择永久缓存或每次确认。
+    accel_key 为文件的存储key（UPLOAD_DIRECTORY 中的文件），X-Accel-Redirect 模式下交给 nginx 发送。
+    """
+    if cache_control is None:
+        cache_control = IMMUTABLE_CACHE_CONTROL if is_versioned(request.query_params) else REVALIDATE_CACHE_CONTROL
+    headers = cache_headers(etag, modified, cache_control)
+    if is_not_modified(request.headers, etag, modified):
+        return not_modified_response(headers)
+    accel_uri = accel_redirect_uri(request.headers, accel_key)
+    if accel_uri:
+        return accel_redirect_response(accel_uri, headers, media_type)
+    return RangeFileResponse(path, media_type=media_type, headers=headers)
+
+
+class CachedStaticFiles(StaticFiles):
+    """
+    /uploads 静态目录：文件由 RangeFileResponse 发送（支持 Range 请求，X-Accel-Redirect 模式下交给 nginx）；
+    带版本参数的请求返回永久缓存头；内容寻址文件使用基于文件哈希的强ETag
+    （默认ETag由修改时间和大小计算，文件被复制或恢复后会变化）。
+    请求的衍生图不存在时（尚未生成衍生图的历史图片）重定向到同目录的原图。
+    """
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        try:
+            return await super().get_response(path, scope)
+        except HTTPException as e:
+            if e.status_code != 404:
+                raise
+            original = await anyio.to_thread.run_sync(self._rendition_original, path)
+            if original is None:
+                raise
+        # 相对地址指向同目录的原图；不缓存重定向，补齐衍生图后立即生效
+        return RedirectResponse(quote(original), status_code=302, headers={"Cache-Control": "no-cache"})
+
+    def _rendition_original(self, path: str) -> Optional[str]:
+        """衍生图请求对应的原图文件名，不是衍生图或原图不存在时返回 None"""
+        root = os.path.realpath(self.directory)
+        full_path = os.path.realpath(os.path.join(root, path))
+        if os.path.commonpath([root, full_path]) != root:
+            return None
+        original = find_rendition_original(Path(full_path))
+        return original.name if original else None
+
+    def file_response(
+        self,
+        full_path: os.PathLike,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        key = PurePosixPath(*os.path.normpath(os.path.relpath(full_path, self.directory)).split(os.sep)).as_posix()
+        etag = blob_etag(key, stat_result.st_size)
+        response = RangeFileResponse(
+            full_path, status_code=status_code, stat_result=stat_result, headers={"ETag": etag} if etag else None
+        )
+        versioned = is_versioned(QueryParams(scope.get("query_string", b"")))
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL if versioned else REVALIDATE_CACHE_CONTROL
+        request_headers = Headers(scope=scope)
+        if is_not_modified(request_headers, response.headers["etag"], stat_result.st_mtime):
+            return not_modified_response(response.headers)
+        accel_uri = accel_redirect_uri(request_headers, key) if status_code == 200 else None
+        if accel_uri:
+            return accel_redirect_response(
+                accel_uri,
+                {name: response.headers[name] for name in ("etag", "last-modified", "cache-control")},
+                response.media_type,
+            )
+        return response
@@ -1,172 +1,569 @@
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw, ImageFont, ImageOps, ExifTags
+import glob
+import hashlib
+import logging
+import math
 import os
+import re
+import uuid
+from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
-from sqlalchemy.orm import Session
+from typing import Any, BinaryIO, Dict, Optional, Tuple
+from app.core.blurhash import encode_blurhash
 from app.core.config import settings
+from app.core.storage import get_storage, publish_files, storage_key
 from app.models.image import Image as ImageModel
 
+logger = logging.getLogger(__name__)
+
+# 上传流读写块大小
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+_SHA256_HEX_RE = re.compile(r"^[0-9a-fA-F]{64}$")
+
+def is_sha256_hex(value: str) -> bool:
+    """判断字符串是否为SHA-256十六进制摘要（前端在不支持crypto.subtle时会发送备用哈希）"""
+    return bool(value) and _SHA256_HEX_RE.match(value) is not None
+
+def save_upload_with_hash(source: BinaryIO, target_path: Path) -> Tuple[str, int]:
+    """
+    把上传流写入 target_path，同时增量计算SHA-256，无需再次读取文件。
+
+    Returns:
+        Tuple[str, int]: (十六进制SHA-256摘要, 写入字节数)
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    with target_path.open("wb") as buffer:
+        while True:
+            chunk = source.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            buffer.write(chunk)
+            size += len(chunk)
+    return hasher.hexdigest(), size
+
+def content_hash(image: ImageModel) -> Optional[str]:
+    """
+    图片文件的内容哈希：内容寻址文件的哈希（秒传副本与原图共用同一文件，哈希相同），
+    没有内容寻址文件的历史记录取上传时的文件哈希（秒传副本为空）。
+    """
+    return image.blob_hash or image.file_hash
+
+def image_version(image: ImageModel, rendition: Optional[str] = None) -> str:
+    """
+    URL中的内容版本（哈希前缀）：由内容哈希和文件大小计算（重新处理后文件大小随之变化），
+    相同内容的记录（秒传副本）版本相同；没有哈希的历史记录按文件路径计算。
+    衍生图另外计入规格尺寸和质量，修改 RENDITION_SIZES 重新生成后URL随之变化。
+    """
+    parts = [content_hash(image) or str(image.filepath or image.filename), str(image.file_size or "")]
+    if rendition:
+        parts += [str(settings.RENDITION_SIZES.get(rendition, "")), str(settings.RENDITION_QUALITY)]
+    return hashlib.sha256(":".join(parts).encode()).hexdigest()[:12]
+
+def versioned_url(url: str, version: str) -> str:
+    """URL追加内容版本参数，带版本参数的响应可以被永久缓存"""
+    return f"{url}{'&' if '?' in url else '?'}v={version}"
+
 def generate_image_url(image: ImageModel) -> str:
-    """根据Image模型对象生成可访问的URL"""
+    """
+    根据Image模型对象生成可访问的URL（由存储后端决定：本地为 /uploads/<key>，也可能是对象存储的公开地址），
+    附带内容版本参数 ?v=。
+    """
     if not image:
         return ""
-    
-    # 安全获取filepath字符串
-    filepath_str = ""
-    if hasattr(image, 'filepath') and image.filepath is not None:
-        filepath_str = str(image.filepath).strip()
-    
-    if filepath_str:
-        # 将filepath转换为相对于uploads目录的路径
-        # 例如: "E:/Cursor/Gallery/backend/uploads/gallery_56/filename.jpg" -> "gallery_56/filename.jpg"
-        file_path = Path(filepath_str)
-        upload_dir = Path(settings.UPLOAD_DIRECTORY)
-        try:
-            # 计算相对路径
-            relative_path = file_path.relative_to(upload_dir)
-            return f"/uploads/{relative_path}".replace("\\", "/")
-        except ValueError:
-            # 如果relative_to失败，尝试从filepath中手动提取相对路径
-            normalized_filepath = filepath_str.replace("\\", "/")
-            uploads_str = "uploads/"
-            
-            # 查找uploads/在路径中的位置
-            uploads_index = normalized_filepath.find(uploads_str)
-            if uploads_index != -1:
-                # 提取从uploads/之后的部分作为相对路径
-                relative_part = normalized_filepath[uploads_index + len(uploads_str):]
-                return f"/uploads/{relative_part}"
-            else:
-                # 如果filepath中没有uploads，使用filename
-                return f"/uploads/{image.filename}"
-    else:
-        # 如果没有filepath，使用filename
-        return f"/uploads/{image.filename}"
-
-def compress_image(image_path: Path, quality: int = 85, max_size: tuple = (1920, 1080)):
-    """
-    Compresses an image by reducing its quality and resizing it if it exceeds max_size.
+
+    filepath_str = str(image.filepath).strip() if getattr(image, "filepath", None) is not None else ""
+    # 没有filepath的历史记录使用filename
+    url = get_storage().url(storage_key(filepath_str) if filepath_str else image.filename)
+    return versioned_url(url, image_version(image))
+
+# process_image 返回并写入 Image 记录的文件元数据字段
+# 上传时从原图EXIF中提取的字段（存储的JPEG不保留EXIF，重新处理时无法再次获取）
+EXIF_FIELDS = ("exif", "taken_at", "camera_model")
+FILE_INFO_FIELDS = ("width", "height", "file_size", "file_type", "blurhash", "phash") + EXIF_FIELDS
+
+def get_blob_path(file_hash: str) -> Path:
+    """
+    内容寻址存储路径：<UPLOAD_DIRECTORY>/<BLOB_DIRECTORY>/ab/cd/<hash>.jpg（并确保目录存在）。
+    按哈希前两级分目录，每级256个子目录，单个目录的文件数保持均衡。
     """
+    directory = Path(settings.UPLOAD_DIRECTORY) / settings.BLOB_DIRECTORY / file_hash[:2] / file_hash[2:4]
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory / f"{file_hash}.jpg"
+
+# 衍生图规格名称与响应字段的对应关系
+RENDITION_URL_FIELDS = {
+    "thumb": "thumbnail_url",
+    "medium": "medium_url",
+    "large": "large_url",
+}
+
+def publish_image(image_path: Path, renditions: Dict[str, Path]) -> None:
+    """处理完成的图片及其衍生图写入存储后端（本地存储下已在最终位置）"""
+    publish_files([image_path, *renditions.values()], content_type="image/jpeg")
+
+def get_rendition_path(image_path: Path, name: str) -> Path:
+    """衍生图与原图存放在同一目录，文件名为 <原文件名>_<规格名>.jpg"""
+    return image_path.with_name(f"{image_path.stem}_{name}.jpg")
+
+def find_rendition_original(rendition_path: Path) -> Optional[Path]:
+    """
+    衍生图文件名对应的原图（同目录下的 <原文件名>.*），不是衍生图文件名或原图不存在时返回 None。
+    """
+    for name in settings.RENDITION_SIZES:
+        suffix = f"_{name}.jpg"
+        if rendition_path.name.endswith(suffix):
+            stem = rendition_path.name[:-len(suffix)]
+            for candidate in sorted(rendition_path.parent.glob(f"{glob.escape(stem)}.*")):
+                if not candidate.name.startswith(".") and candidate.is_file():
+                    return candidate
+    return None
+
+def generate_rendition_url(image: ImageModel, name: str) -> str:
+    """
+    生成指定规格衍生图的URL（按 RENDITION_SIZES 的命名规则，不检查文件是否存在）。
+    本地存储下衍生图不存在时（例如历史图片尚未生成衍生图）由 /uploads 静态目录重定向到原图；
+    远程存储没有这一回退，迁移到远程存储前应先用 reprocess_images.py --only-missing 补齐衍生图。
+    """
+    if not image or image.filepath is None or not str(image.filepath).strip():
+        return generate_image_url(image)
+
+    key = storage_key(get_rendition_path(Path(str(image.filepath).strip()), name))
+    return versioned_url(get_storage().url(key), image_version(image, name))
+
+def generate_rendition_urls(image: ImageModel) -> Dict[str, str]:
+    """生成所有衍生图URL，键为响应字段名（thumbnail_url、medium_url、large_url）"""
+    return {
+        field: generate_rendition_url(image, name)
+        for name, field in RENDITION_URL_FIELDS.items()
+    }
+
+def generate_renditions(img: Image.Image, image_path: Path, quality: Optional[int] = None) -> Dict[str, Path]:
+    """
+    根据 settings.RENDITION_SIZES 从已解码的图片生成多规格衍生图。
+    按尺寸从大到小依次缩放，每一级都基于上一级的结果，避免每次都从全尺寸缩放。
+    """
+    renditions, _ = _write_renditions(img, image_path, quality)
+    return renditions
+
+def _write_renditions(img: Image.Image, image_path: Path, quality: Optional[int] = None) -> Tuple[Dict[str, Path], Image.Image]:
+    """generate_renditions 的实现，额外返回最小一级的画面（用于计算占位图，避免再次缩放）"""
+    quality = quality or settings.RENDITION_QUALITY
+    renditions = {}
+    current = img
+    for name, size in sorted(settings.RENDITION_SIZES.items(), key=lambda item: item[1], reverse=True):
+        current = current.copy()
+        if current.size[0] > size or current.size[1] > size:
+            current.thumbnail((size, size), Image.Resampling.LANCZOS)
+        rendition_path = get_rendition_path(image_path, name)
+        _save_jpeg_atomic(current, rendition_path, quality)
+        renditions[name] = rendition_path
+    return renditions, current
+
+def _save_jpeg_atomic(img: Image.Image, target_path: Path, quality: int) -> None:
+    _save_image_atomic(img, target_path, 'JPEG', quality=quality, optimize=True)
+
+def _save_image_atomic(img: Image.Image, target_path: Path, fmt: str, **params) -> None:
+    """先写入同目录下的临时文件，再原子替换到目标路径，避免读到写了一半的文件"""
+    tmp_path = target_path.with_name(f".{target_path.name}.{uuid.uuid4().hex[:8]}.tmp")
     try:
-        with Image.open(image_path) as img:
-            if img.size[0] > max_size[0] or img.size[1] > max_size[1]:
-                img.thumbnail(max_size, Image.Resampling.LANCZOS)
+        img.save(tmp_path, fmt, **params)
+        os.replace(tmp_path, target_path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+# 按需缩放支持的输出格式：请求参数 -> (Pillow格式, 扩展名, MIME类型)
+RENDER_FORMATS = {
+    "jpeg": ("JPEG", "jpg", "image/jpeg"),
+    "webp": ("WEBP", "webp", "image/webp"),
+}
+RENDER_FITS = ("contain", "cover")
 
-            # Convert RGBA to RGB for saving as JPEG
-            if img.mode in ('RGBA', 'P'):
-                img = img.convert('RGB')
-            
-            img.save(image_path, 'JPEG', quality=quality, optimize=True)
-    except Exception as e:
-        # Handle exceptions, e.g., logging
-        print(f"Error compressing image {image_path}: {e}")
 
+def get_render_size(
+    source_size: Tuple[int, int], width: Optional[int], height: Optional[int], fit: str
+) -> Tuple[int, int]:
+    """
+    计算按需缩放的输出尺寸（不放大原图）。
+    contain：等比缩放到 width x height 以内；cover：裁剪填满 width x height（需同时指定宽高）。
+    """
+    src_w, src_h = source_size
+    if fit == "cover" and width and height:
+        scale = min(1.0, src_w / width, src_h / height)
+        return max(1, round(width * scale)), max(1, round(height * scale))
+
+    scale = 1.0
+    if width:
+        scale = min(scale, width / src_w)
+    if height:
+        scale = min(scale, height / src_h)
+    return max(1, round(src_w * scale)), max(1, round(src_h * scale))
+
+
+def render_variant(
+    image_path: Path,
+    target_path: Path,
+    width: Optional[int],
+    height: Optional[int],
+    fit: str = "contain",
+    fmt: str = "jpeg",
+    quality: Optional[int] = None,
+) -> Tuple[int, int]:
+    """
+    生成按需缩放的图片变体并原子写入 target_path，返回输出尺寸。
+    从能满足输出尺寸的最小衍生图开始缩放（都不够大时才解码原图），减少解码和缩放的像素量。
+    """
+    quality = quality or settings.RENDER_QUALITY
+    pil_format = RENDER_FORMATS[fmt][0]
 
-def add_watermark(image_path: Path):
+    with Image.open(image_path) as original:
+        out_size = get_render_size(original.size, width, height, fit)
+
+    source_path = image_path
+    for name, _ in sorted(settings.RENDITION_SIZES.items(), key=lambda item: item[1]):
+        rendition_path = get_rendition_path(image_path, name)
+        if not rendition_path.exists():
+            continue
+        with Image.open(rendition_path) as candidate:
+            if candidate.size[0] >= out_size[0] and candidate.size[1] >= out_size[1]:
+                source_path = rendition_path
+                break
+
+    with Image.open(source_path) as img:
+        # 解码时缩小到仍能覆盖输出尺寸（cover 模式按裁剪前的等比尺寸计算）
+        cover_scale = max(out_size[0] / img.size[0], out_size[1] / img.size[1])
+        draft_for_size(img, (math.ceil(img.size[0] * cover_scale), math.ceil(img.size[1] * cover_scale)))
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        if fit == "cover" and width and height:
+            frame = ImageOps.fit(img, out_size, Image.Resampling.LANCZOS)
+        elif img.size != out_size:
+            frame = img.resize(out_size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+        else:
+            frame = img
+        _save_image_atomic(frame, target_path, pil_format, quality=quality)
+    return out_size
+
+
+def rerender_image(
+    image_path: Path,
+    quality: Optional[int] = None,
+    max_size: Optional[Tuple[int, int]] = None,
+) -> Dict[str, Any]:
     """
-    Adds a text watermark to an image.
+    基于已存储的图片重新生成衍生图、占位图和感知哈希，并返回与 process_image 相同的文件元数据
+    （用于调整 RENDITION_SIZES / RENDITION_QUALITY / IMAGE_MAX_* 之后批量重新处理）。
+
+    原始上传文件不保留，存储的图片已经缩放并叠加了水印：只有超出当前 max_size 时才重新缩小并编码，
+    不会再次叠加水印，也不会以更高的质量重新编码已压缩的图片。
+    """
+    quality = quality or settings.IMAGE_QUALITY
+    max_size = max_size or (settings.IMAGE_MAX_WIDTH, settings.IMAGE_MAX_HEIGHT)
+
+    with Image.open(image_path) as img:
+        resized = img.size[0] > max_size[0] or img.size[1] > max_size[1]
+        if resized:
+            draft_for_size(img, _fit_within(img.size, max_size))
+            img.thumbnail(max_size, Image.Resampling.LANCZOS)
+        frame = img if img.mode == "RGB" else img.convert("RGB")
+        frame.load()
+
+    if resized:
+        _save_jpeg_atomic(frame, image_path, quality)
+    renditions, smallest = _write_renditions(frame, image_path)
+    return {
+        "width": frame.width,
+        "height": frame.height,
+        "file_size": image_path.stat().st_size,
+        "file_type": "image/jpeg",
+        "blurhash": compute_blurhash(smallest),
+        "phash": compute_dhash(smallest),
+        "renditions": renditions,
+    }
+
+
+# 水印距右下角的边距（像素）与文字不透明度（0-255）
+WATERMARK_MARGIN = 10
+WATERMARK_OPACITY = 128
+# 图片过小放不下水印时，字号按此步长逐级缩小（缩放档位），最小不低于 WATERMARK_MIN_SCALE
+WATERMARK_SCALE_STEP = 0.25
+WATERMARK_MIN_SCALE = 0.25
+
+
+@lru_cache(maxsize=8)
+def _load_watermark_font(font_path: str, size: int) -> ImageFont.FreeTypeFont:
+    """加载并缓存水印字体（每个进程、每种字号只读取一次字体文件）"""
+    return ImageFont.truetype(font_path, size)
+
+
+@lru_cache(maxsize=32)
+def _render_watermark_sprite(text: str, font_path: str, size: int, scale: float) -> Tuple[Image.Image, Tuple[int, int, int, int]]:
+    """
+    预渲染水印文字蒙版，按 (文字, 字体, 字号, 缩放档位) 缓存。
+    返回只覆盖文字墨迹区域的L模式蒙版（值为不透明度）及文字的 textbbox。
+    """
+    fnt = _load_watermark_font(font_path, max(1, round(size * scale)))
+    bbox = fnt.getbbox(text)
+    mask = Image.new("L", (max(1, bbox[2] - bbox[0]), max(1, bbox[3] - bbox[1])), 0)
+    ImageDraw.Draw(mask).text((-bbox[0], -bbox[1]), text, font=fnt, fill=WATERMARK_OPACITY)
+    return mask, bbox
+
+
+def apply_watermark(img: Image.Image) -> Image.Image:
+    """
+    在已解码的图片上叠加右下角文字水印，返回RGB图片。
+    未配置水印文字或字体文件不存在时原样返回。
+
+    文字蒙版预渲染并缓存，只在右下角的文字区域内以蒙版混合白色，
+    不再为整张图分配透明图层并做整图 alpha_composite。RGB输入会被直接修改。
     """
     if not settings.WATERMARK_TEXT:
-        return # Skip if no watermark text is set
+        return img
 
-    try:
-        with Image.open(image_path).convert("RGBA") as base:
-            txt = Image.new("RGBA", base.size, (255, 255, 255, 0))
-
-            # Check if font file exists
-            font_path = Path(settings.WATERMARK_FONT_PATH)
-            if not font_path.exists():
-                print(f"Warning: Watermark font not found at {font_path}, skipping watermark.")
-                return
-
-            fnt = ImageFont.truetype(str(font_path), settings.WATERMARK_FONT_SIZE)
-            
-            # Use textbbox to get bounding box of the text
-            text_bbox = ImageDraw.Draw(txt).textbbox((0, 0), settings.WATERMARK_TEXT, font=fnt)
-            text_width = text_bbox[2] - text_bbox[0]
-            text_height = text_bbox[3] - text_bbox[1]
-
-            # Position at the bottom right
-            position = (base.width - text_width - 10, base.height - text_height - 10)
-            
-            # Draw text on transparent layer
-            d = ImageDraw.Draw(txt)
-            d.text(position, settings.WATERMARK_TEXT, font=fnt, fill=(255, 255, 255, 128))
-
-            # Composite the text layer onto the base image
-            out = Image.alpha_composite(base, txt)
-            
-            # Convert back to RGB for saving
-            if out.mode in ('RGBA', 'P'):
-                out = out.convert('RGB')
-
-            out.save(image_path)
+    font_path = Path(settings.WATERMARK_FONT_PATH)
+    if not font_path.exists():
+        logger.warning(f"Watermark font not found at {font_path}, skipping watermark.")
+        return img
+
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+
+    # 选择能放进图片的最大缩放档位；常规尺寸的图片始终使用原始字号
+    scale = 1.0
+    while True:
+        mask, bbox = _render_watermark_sprite(
+            settings.WATERMARK_TEXT, str(font_path), settings.WATERMARK_FONT_SIZE, scale
+        )
+        fits = mask.width + 2 * WATERMARK_MARGIN <= img.width and mask.height + 2 * WATERMARK_MARGIN <= img.height
+        if fits or scale <= WATERMARK_MIN_SCALE:
+            break
+        scale -= WATERMARK_SCALE_STEP
+
+    # Position at the bottom right（与原先整图绘制时的文字位置一致）
+    position = (
+        img.width - mask.width - WATERMARK_MARGIN + bbox[0],
+        img.height - mask.height - WATERMARK_MARGIN + bbox[1],
+    )
+    img.paste((255, 255, 255), position + (position[0] + mask.width, position[1] + mask.height), mask)
+    return img
 
+
+def compute_blurhash(img: Image.Image) -> Optional[str]:
+    """计算占位图 BlurHash，失败时返回None（占位图不影响图片入库）"""
+    try:
+        return encode_blurhash(img, settings.BLURHASH_X_COMPONENTS, settings.BLURHASH_Y_COMPONENTS)
     except Exception as e:
-        print(f"Error adding watermark to image {image_path}: {e}")
+        logger.warning(f"Could not compute blurhash: {e}")
+        return None
+
 
-def safe_delete_image_file(db: Session, filepath: str) -> bool:
+def compute_dhash(img: Image.Image) -> str:
     """
-    安全删除图片文件，只有当文件没有其他引用时才删除
-    
-    Args:
-        db: 数据库会话
-        filepath: 要删除的文件路径
-        
-    Returns:
-        bool: 是否删除了物理文件
+    计算64位差值哈希（dHash），返回16位十六进制字符串。
+    缩小为 9x8 灰度图后比较每行相邻像素的亮度，对重新压缩、缩放和轻微裁剪不敏感。
     """
-    if not filepath or not os.path.exists(filepath):
-        return False
-    
-    # 统计有多少个图片记录引用这个文件路径
-    reference_count = db.query(ImageModel).filter(ImageModel.filepath == filepath).count()
-    
-    # 只有当引用计数为0时才删除物理文件
-    if reference_count == 0:
-        try:
-            os.remove(filepath)
-            print(f"Physical file deleted: {filepath}")
-            return True
-        except OSError as e:
-            print(f"Warning: Could not delete file {filepath}: {e}")
-            return False
-    else:
-        print(f"File {filepath} is referenced by {reference_count} records, skipping physical deletion")
+    pixels = list(img.convert("L").resize((9, 8), Image.Resampling.LANCZOS).getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] < pixels[row * 9 + col + 1])
+    return f"{value:016x}"
+
+
+def draft_for_size(img: Image.Image, min_size: Tuple[int, int]) -> bool:
+    """
+    在解码前请求 JPEG 的DCT域缩小（draft，按 1/2、1/4、1/8），解码后的尺寸在两个方向上都不小于 min_size，
+    解码耗时和内存随之下降。非JPEG格式、或缩小后会小于 min_size 时不做处理，仍完整解码。
+    必须在像素加载前调用，返回是否发生了缩小。
+    """
+    if img.format != "JPEG" or min_size[0] <= 0 or min_size[1] <= 0:
         return False
+    original_size = img.size
+    img.draft(None, min_size)
+    return img.size != original_size
 
+def _fit_within(size: Tuple[int, int], max_size: Tuple[int, int]) -> Tuple[int, int]:
+    """等比缩放到 max_size 以内后的尺寸（向上取整，作为解码阶段缩小的下限）"""
+    scale = min(max_size[0] / size[0], max_size[1] / size[1], 1.0)
+    return math.ceil(size[0] * scale), math.ceil(size[1] * scale)
 
-def safe_delete_gallery_folder(db: Session, gallery_id: int) -> bool:
+# EXIF方向中需要交换宽高的取值（旋转90/270度）
+_TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+def _exif_number(value: Any) -> Optional[float]:
+    """EXIF有理数转为 float，无效值（例如分母为0）返回None"""
+    try:
+        number = float(value)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    return number if math.isfinite(number) else None
+
+def _exif_text(value: Any, max_length: int = 100) -> Optional[str]:
+    if isinstance(value, bytes):
+        value = value.decode("utf-8", errors="ignore")
+    if not isinstance(value, str):
+        return None
+    value = value.replace("\x00", "").strip()
+    return value[:max_length] or None
+
+def _exif_datetime(value: Any) -> Optional[datetime]:
+    """EXIF时间格式为 "YYYY:MM:DD HH:MM:SS"（相机本地时间，不含时区）"""
+    text = _exif_text(value, 32)
+    if not text:
+        return None
+    try:
+        return datetime.strptime(text[:19], "%Y:%m:%d %H:%M:%S")
+    except ValueError:
+        return None
+
+def _gps_coordinate(value: Any, ref: Any) -> Optional[float]:
+    """度/分/秒三元组转为带符号的十进制度数"""
+    try:
+        degrees, minutes, seconds = (_exif_number(part) for part in value)
+    except (TypeError, ValueError):
+        return None
+    if degrees is None or minutes is None or seconds is None:
+        return None
+    coordinate = degrees + minutes / 60 + seconds / 3600
+    if _exif_text(ref, 1) in ("S", "W"):
+        coordinate = -coordinate
+    return round(coordinate, 7)
+
+def extract_exif(img: Image.Image) -> Optional[Dict[str, Any]]:
+    """
+    从已打开（尚未解码像素）的图片中读取拍摄时间、相机、镜头、方向、ISO、曝光参数和GPS，
+    返回可直接存入JSON列的字典（只包含存在的字段），没有EXIF时返回None。
+    """
+    try:
+        exif = img.getexif()
+        if not exif:
+            return None
+        exif_ifd = exif.get_ifd(ExifTags.IFD.Exif)
+        gps_ifd = exif.get_ifd(ExifTags.IFD.GPSInfo)
+    except Exception:
+        # 损坏的EXIF不影响图片处理
+        return None
+
+    taken_at = _exif_datetime(exif_ifd.get(ExifTags.Base.DateTimeOriginal) or exif.get(ExifTags.Base.DateTime))
+    orientation = exif.get(ExifTags.Base.Orientation)
+    iso = exif_ifd.get(ExifTags.Base.ISOSpeedRatings)
+    if isinstance(iso, tuple):
+        iso = iso[0] if iso else None
+    info: Dict[str, Any] = {
+        "taken_at": taken_at.isoformat() if taken_at else None,
+        "make": _exif_text(exif.get(ExifTags.Base.Make)),
+        "model": _exif_text(exif.get(ExifTags.Base.Model)),
+        "lens": _exif_text(exif_ifd.get(ExifTags.Base.LensModel)),
+        "orientation": orientation if orientation in range(1, 9) else None,
+        "iso": iso if isinstance(iso, int) else None,
+        "exposure_time": _exif_number(exif_ifd.get(ExifTags.Base.ExposureTime)),
+        "f_number": _exif_number(exif_ifd.get(ExifTags.Base.FNumber)),
+        "focal_length": _exif_number(exif_ifd.get(ExifTags.Base.FocalLength)),
+    }
+    if gps_ifd:
+        latitude = _gps_coordinate(gps_ifd.get(ExifTags.GPS.GPSLatitude), gps_ifd.get(ExifTags.GPS.GPSLatitudeRef))
+        longitude = _gps_coordinate(gps_ifd.get(ExifTags.GPS.GPSLongitude), gps_ifd.get(ExifTags.GPS.GPSLongitudeRef))
+        if latitude is not None and longitude is not None:
+            gps = {"latitude": latitude, "longitude": longitude}
+            altitude = _exif_number(gps_ifd.get(ExifTags.GPS.GPSAltitude))
+            if altitude is not None:
+                # GPSAltitudeRef 为1表示海平面以下
+                below_sea_level = gps_ifd.get(ExifTags.GPS.GPSAltitudeRef) in (1, b"\x01")
+                gps["altitude"] = -altitude if below_sea_level else altitude
+            info["gps"] = gps
+    info = {key: value for key, value in info.items() if value is not None}
+    return info or None
+
+def exif_columns(exif: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """EXIF字典对应的 Image 列值：exif（JSON）以及建了索引的 taken_at、camera_model"""
+    exif = exif or {}
+    taken_at = exif.get("taken_at")
+    return {
+        "exif": exif or None,
+        "taken_at": datetime.fromisoformat(taken_at) if taken_at else None,
+        "camera_model": exif.get("model"),
+    }
+
+# process_image 的内存峰值约为解码画面的两倍（解码缓冲 + 缩放、水印后的画面及衍生图）
+PROCESSING_MEMORY_FACTOR = 2
+
+def estimate_processing_bytes(source_path: Path, max_size: Optional[Tuple[int, int]] = None) -> int:
+    """
+    只读取文件头，估算 process_image 处理该文件所需的内存：解码尺寸（JPEG 计入 draft 缩小）x 通道数。
+    无法识别的文件返回0（随后的处理会以400失败）。
     """
-    安全删除图集文件夹，只有当文件夹为空时才删除
-    
+    max_size = max_size or (settings.IMAGE_MAX_WIDTH, settings.IMAGE_MAX_HEIGHT)
+    try:
+        with Image.open(source_path) as img:
+            if img.size[0] > max_size[0] or img.size[1] > max_size[1]:
+                draft_for_size(img, _fit_within(img.size, max_size))
+            return img.size[0] * img.size[1] * len(img.getbands()) * PROCESSING_MEMORY_FACTOR
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return 0
+
+def process_image(
+    source_path: Path,
+    target_path: Optional[Path] = None,
+    quality: Optional[int] = None,
+    max_size: Optional[Tuple[int, int]] = None,
+) -> Dict[str, Any]:
+    """
+    单次解码的图片处理流程：解码 -> 缩放 -> 叠加水印 -> 编码一次，原子写入 target_path，
+    并基于最终画面生成各规格衍生图。取代原先 compress_image + add_watermark 的两次解码/编码。
+
     Args:
-        db: 数据库会话
-        gallery_id: 图集ID
-        
+        source_path: 上传的原始文件
+        target_path: 最终存储路径，默认为原地替换 source_path
+        quality: JPEG质量，默认 settings.IMAGE_QUALITY
+        max_size: 最大尺寸，默认 (settings.IMAGE_MAX_WIDTH, settings.IMAGE_MAX_HEIGHT)
+
     Returns:
-        bool: 是否删除了图集文件夹
+        Dict[str, Any]: 最终画面的 width、height、file_size、file_type（取自已解码的画面和写入结果，
+        不再重新打开文件）、基于最小衍生图计算的 blurhash 占位图和 phash 感知哈希，
+        原图EXIF的 exif、taken_at、camera_model（见 extract_exif），以及 renditions（衍生图规格名 -> 路径）
+
+    Raises:
+        处理失败时抛出Pillow/OSError异常，由调用方决定如何响应
     """
-    try:
-        # 构建图集文件夹路径
-        gallery_folder_name = f"gallery_{gallery_id}"
-        gallery_folder_path = Path(settings.UPLOAD_DIRECTORY) / gallery_folder_name
-        
-        if not gallery_folder_path.exists():
-            print(f"Gallery folder {gallery_folder_path} does not exist")
-            return False
-        
-        # 检查文件夹是否为空
-        if not any(gallery_folder_path.iterdir()):
-            # 文件夹为空，可以安全删除
-            gallery_folder_path.rmdir()
-            print(f"Gallery folder deleted: {gallery_folder_path}")
-            return True
-        else:
-            # 文件夹不为空，列出剩余文件
-            remaining_files = list(gallery_folder_path.iterdir())
-            print(f"Gallery folder {gallery_folder_path} is not empty, contains {len(remaining_files)} files: {[f.name for f in remaining_files]}")
-            return False
-            
-    except OSError as e:
-        print(f"Warning: Could not delete gallery folder {gallery_folder_path}: {e}")
-        return False 
\ No newline at end of file
+    target_path = target_path or source_path
+    quality = quality or settings.IMAGE_QUALITY
+    max_size = max_size or (settings.IMAGE_MAX_WIDTH, settings.IMAGE_MAX_HEIGHT)
+
+    with Image.open(source_path) as img:
+        # 存储的JPEG不保留EXIF，在解码前先读取
+        exif = extract_exif(img)
+        orientation = (exif or {}).get("orientation", 1)
+        transposed = orientation in _TRANSPOSED_ORIENTATIONS
+        oriented_size = (img.size[1], img.size[0]) if transposed else img.size
+        if oriented_size[0] > max_size[0] or oriented_size[1] > max_size[1]:
+            # 大尺寸JPEG（相机原图）在解码阶段直接缩小到不小于目标尺寸，避免完整解码数千万像素；
+            # 其他格式完整解码后由 thumbnail 先按整数倍 reduce 再 LANCZOS 缩放
+            min_size = _fit_within(oriented_size, max_size)
+            draft_for_size(img, (min_size[1], min_size[0]) if transposed else min_size)
+        if orientation != 1:
+            # 在缩小后的画面上按EXIF方向旋转/翻转，存储的图片不再依赖方向标记
+            img = ImageOps.exif_transpose(img)
+        if img.size[0] > max_size[0] or img.size[1] > max_size[1]:
+            img.thumbnail(max_size, Image.Resampling.LANCZOS)
+
+        frame = apply_watermark(img)
+        if frame.mode != 'RGB':
+            frame = frame.convert('RGB')
+
+        _save_jpeg_atomic(frame, target_path, quality)
+        renditions, smallest = _write_renditions(frame, target_path)
+        return {
+            "width": frame.width,
+            "height": frame.height,
+            "file_size": target_path.stat().st_size,
+            "file_type": "image/jpeg",
+            "blurhash": compute_blurhash(smallest),
+            "phash": compute_dhash(smallest),
+            **exif_columns(exif),
+            "renditions": renditions,
+        }
@@ -0,0 +1,462 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, ContextManager, Dict, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 流式读取的块大小
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+class StoredObject(NamedTuple):
+    key: str
+    size: int
+    modified: float  # 最后修改时间（Unix时间戳）
+
+
+class StorageBackend(ABC):
+    """
+    文件存储后端。对象以 key（相对 UPLOAD_DIRECTORY 的 POSIX 路径，例如 blobs/ab/cd/<hash>.jpg）寻址，
+    数据库中的 filepath 仍记录为 <UPLOAD_DIRECTORY>/<key>，切换后端不需要改写已有记录。
+
+    图片解码和编码需要本地文件：处理在 UPLOAD_DIRECTORY（本地暂存目录）中完成后调用 publish_files 写入后端，
+    读取已存储的文件用 local_file 取得本地路径（远程后端下载到临时目录）。
+    """
+
+    # 对象是否就是 UPLOAD_DIRECTORY 下的本地文件（由 /uploads 静态目录直接提供访问）
+    is_local = False
+
+    @abstractmethod
+    def put_file(self, key: str, local_path: Path, content_type: Optional[str] = None) -> None:
+        """写入本地文件（大文件分片上传）"""
+
+    @abstractmethod
+    def put_stream(self, key: str, stream: BinaryIO, content_type: Optional[str] = None) -> None:
+        """从文件对象流式写入，不把整个文件读入内存"""
+
+    @abstractmethod
+    def iter_bytes(self, key: str, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+        """流式读取对象内容；对象不存在时抛出 FileNotFoundError"""
+
+    @abstractmethod
+    def stat(self, key: str) -> Optional[StoredObject]:
+        """对象的大小和修改时间，不存在时返回None"""
+
+    def exists(self, key: str) -> bool:
+        return self.stat(key) is not None
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """删除对象，不存在时忽略"""
+
+    @abstractmethod
+    def delete_prefix(self, prefix: str) -> None:
+        """删除 prefix（目录）下的所有对象"""
+
+    def move(self, key: str, target: "StorageBackend", target_key: str) -> Optional[int]:
+        """
+        把对象移动到 target 后端的 target_key，返回对象大小；对象不存在时返回None。
+        不同类型后端之间经由本地临时文件复制。
+        """
+        obj = self.stat(key)
+        if obj is None:
+            return None
+        with self.local_file(key) as local_path:
+            target.put_file(target_key, local_path)
+        self.delete(key)
+        return obj.size
+
+    @abstractmethod
+    def iter_objects(
+        self, prefix: str = "", exclude: Iterable[str] = (), prune_empty_before: Optional[float] = None
+    ) -> Iterator[StoredObject]:
+        """
+        逐个列出 prefix 下的对象（不一次性列出全部），跳过 exclude 中的目录。
+        prune_empty_before 只对有目录的本地存储有效，见 LocalStorage.iter_objects。
+        """
+
+    @abstractmethod
+    def url(self, key: str) -> str:
+        """对象的访问URL（可长期保存，例如写入站点设置）"""
+
+    @abstractmethod
+    def presigned_url(self, key: str, expires: Optional[int] = None, download_name: Optional[str] = None) -> str:
+        """带有效期的直接下载URL，download_name 指定下载时的文件名"""
+
+    @abstractmethod
+    def local_file(self, key: str) -> ContextManager[Path]:
+        """with storage.local_file(key) as path: 以本地文件的形式读取对象（远程后端下载到临时目录）"""
+
+
+class LocalStorage(StorageBackend):
+    """本地文件系统：对象即 root 下的文件"""
+
+    is_local = True
+
+    def __init__(self, root: Path, url_prefix: str = "/uploads"):
+        self.root = Path(root)
+        self.url_prefix = url_prefix
+
+    def path(self, key: str) -> Path:
+        return self.root / key
+
+    def put_file(self, key: str, local_path: Path, content_type: Optional[str] = None) -> None:
+        target = self.path(key)
+        if os.path.abspath(local_path) == os.path.abspath(target):
+            # 在暂存目录中处理的文件已经在最终位置
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = target.with_name(f".{target.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            shutil.copyfile(local_path, tmp_path)
+            os.replace(tmp_path, target)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+    def put_stream(self, key: str, stream: BinaryIO, content_type: Optional[str] = None) -> None:
+        target = self.path(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = target.with_name(f".{target.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            with tmp_path.open("wb") as buffer:
+                shutil.copyfileobj(stream, buffer, STREAM_CHUNK_SIZE)
+            os.replace(tmp_path, target)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+    def iter_bytes(self, key: str, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+        with self.path(key).open("rb") as source:
+            while True:
+                chunk = source.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def stat(self, key: str) -> Optional[StoredObject]:
+        try:
+            stat = self.path(key).stat()
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        return StoredObject(key, stat.st_size, stat.st_mtime)
+
+    def delete(self, key: str) -> None:
+        self.path(key).unlink(missing_ok=True)
+
+    def delete_prefix(self, prefix: str) -> None:
+        shutil.rmtree(self.path(prefix), ignore_errors=True)
+
+    def move(self, key: str, target: StorageBackend, target_key: str) -> Optional[int]:
+        if not isinstance(target, LocalStorage):
+            return super().move(key, target, target_key)
+        source = self.path(key)
+        destination = target.path(target_key)
+        try:
+            size = source.stat().st_size
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            shutil.move(str(source), str(destination))
+        except FileNotFoundError:
+            return None
+        return size
+
+    def iter_objects(
+        self, prefix: str = "", exclude: Iterable[str] = (), prune_empty_before: Optional[float] = None
+    ) -> Iterator[StoredObject]:
+        """
+        用 os.scandir 逐目录遍历。prune_empty_before 不为空时，顺带删除修改时间早于该时间戳的空目录
+        （GC清理历史的图集文件夹；内容寻址目录的层级是固定的，不删除）。
+        """
+        root = os.path.abspath(self.root)
+        excluded = {os.path.abspath(self.path(name)) for name in exclude}
+        blob_root = os.path.abspath(self.path(settings.BLOB_DIRECTORY))
+        start = os.path.abspath(self.path(prefix)) if prefix else root
+        stack = [start]
+        while stack:
+            directory = stack.pop()
+            empty = True
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        empty = False
+                        if entry.is_dir(follow_symlinks=False):
+                            if os.path.abspath(entry.path) not in excluded:
+                                stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            try:
+                                stat = entry.stat(follow_symlinks=False)
+                            except OSError:
+                                continue
+                            key = PurePosixPath(*Path(os.path.relpath(entry.path, root)).parts).as_posix()
+                            yield StoredObject(key, stat.st_size, stat.st_mtime)
+            except OSError as e:
+                if directory != start:
+                    logger.warning(f"Could not scan directory {directory}: {e}")
+                continue
+            if (
+                empty and prune_empty_before is not None
+                and directory not in (root, start) and not directory.startswith(blob_root)
+            ):
+                try:
+                    if os.stat(directory).st_mtime < prune_empty_before:
+                        os.rmdir(directory)
+                except OSError:
+                    pass
+
+    def url(self, key: str) -> str:
+        return f"{self.url_prefix}/{key}"
+
+    def presigned_url(self, key: str, expires: Optional[int] = None, download_name: Optional[str] = None) -> str:
+        # 本地文件由静态目录公开提供，不需要签名
+        return self.url(key)
+
+    @contextmanager
+    def local_file(self, key: str) -> Iterator[Path]:
+        yield self.path(key)
+
+
+class S3Storage(StorageBackend):
+    """
+    S3协议对象存储（AWS S3、MinIO等）。依赖 boto3（可选依赖，只在启用时导入）。
+    超过 S3_MULTIPART_THRESHOLD 的文件由 boto3 的传输管理器分片并发上传。
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        *,
+        prefix: str = "",
+        endpoint_url: str = "",
+        region: str = "",
+        access_key: str = "",
+        secret_key: str = "",
+        public_url: str = "",
+        presigned_expires: int = 3600,
+    ):
+        try:
+            import boto3
+            from boto3.s3.transfer import TransferConfig
+            from botocore.config import Config
+            from botocore.exceptions import ClientError
+        except ImportError as e:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires boto3 (pip install boto3)") from e
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.public_url = public_url.rstrip("/")
+        self.presigned_expires = presigned_expires
+        self._client_error = ClientError
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url or None,
+            region_name=region or None,
+            aws_access_key_id=access_key or None,
+            aws_secret_access_key=secret_key or None,
+            # 自建服务（MinIO）通常没有按存储桶划分的域名，使用路径形式寻址
+            config=Config(signature_version="s3v4", s3={"addressing_style": "path" if endpoint_url else "auto"}),
+        )
+        self.transfer_config = TransferConfig(
+            multipart_threshold=settings.S3_MULTIPART_THRESHOLD,
+            multipart_chunksize=settings.S3_MULTIPART_CHUNK_SIZE,
+        )
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def _is_missing(self, error: Exception) -> bool:
+        return error.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
+
+    def _extra_args(self, content_type: Optional[str]) -> dict:
+        # 对象的URL都带内容版本参数（或每次签名都不同），内容变化时URL随之变化，可以永久缓存
+        extra_args = {"CacheControl": f"public, max-age={settings.IMAGE_CACHE_MAX_AGE}, immutable"}
+        if content_type:
+            extra_args["ContentType"] = content_type
+        return extra_args
+
+    def put_file(self, key: str, local_path: Path, content_type: Optional[str] = None) -> None:
+        self.client.upload_file(
+            str(local_path), self.bucket, self._key(key),
+            ExtraArgs=self._extra_args(content_type), Config=self.transfer_config,
+        )
+
+    def put_stream(self, key: str, stream: BinaryIO, content_type: Optional[str] = None) -> None:
+        self.client.upload_fileobj(
+            stream, self.bucket, self._key(key),
+            ExtraArgs=self._extra_args(content_type), Config=self.transfer_config,
+        )
+
+    def iter_bytes(self, key: str, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+        try:
+            body = self.client.get_object(Bucket=self.bucket, Key=self._key(key))["Body"]
+        except self._client_error as e:
+            if self._is_missing(e):
+                raise FileNotFoundError(key) from e
+            raise
+        try:
+            yield from body.iter_chunks(chunk_size)
+        finally:
+            body.close()
+
+    def stat(self, key: str) -> Optional[StoredObject]:
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except self._client_error as e:
+            if self._is_missing(e):
+                return None
+            raise
+        return StoredObject(key, head["ContentLength"], head["LastModified"].timestamp())
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def delete_prefix(self, prefix: str) -> None:
+        batch = []
+        for obj in self.iter_objects(prefix.rstrip("/") + "/"):
+            batch.append({"Key": self._key(obj.key)})
+            if len(batch) == 1000:
+                self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": batch, "Quiet": True})
+                batch = []
+        if batch:
+            self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": batch, "Quiet": True})
+
+    def move(self, key: str, target: StorageBackend, target_key: str) -> Optional[int]:
+        if not isinstance(target, S3Storage):
+            return super().move(key, target, target_key)
+        obj = self.stat(key)
+        if obj is None:
+            return None
+        # 服务端复制（大对象由传输管理器分片复制），不经过本地
+        target.client.copy(
+            {"Bucket": self.bucket, "Key": self._key(key)}, target.bucket, target._key(target_key),
+            Config=target.transfer_config,
+        )
+        self.delete(key)
+        return obj.size
+
+    def iter_objects(
+        self, prefix: str = "", exclude: Iterable[str] = (), prune_empty_before: Optional[float] = None
+    ) -> Iterator[StoredObject]:
+        excluded = tuple(f"{name.strip('/')}/" for name in exclude)
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._key(prefix)):
+            for item in page.get("Contents", []):
+                key = item["Key"][len(self.prefix):]
+                if excluded and key.startswith(excluded):
+                    continue
+                yield StoredObject(key, item["Size"], item["LastModified"].timestamp())
+
+    def url(self, key: str) -> str:
+        if self.public_url:
+            return f"{self.public_url}/{self._key(key)}"
+        # 私有存储桶：/uploads/<key> 由API重定向到预签名URL，URL本身不会过期
+        return f"/uploads/{key}"
+
+    def presigned_url(self, key: str, expires: Optional[int] = None, download_name: Optional[str] = None) -> str:
+        params = {"Bucket": self.bucket, "Key": self._key(key)}
+        if download_name:
+            params["ResponseContentDisposition"] = f'attachment; filename="{download_name}"'
+        return self.client.generate_presigned_url(
+            "get_object", Params=params, ExpiresIn=expires or self.presigned_expires
+        )
+
+    @contextmanager
+    def local_file(self, key: str) -> Iterator[Path]:
+        with tempfile.TemporaryDirectory(prefix="storage-") as tmp:
+            # 保留原文件名：衍生图按原文件名生成在同一目录
+            path = Path(tmp) / PurePosixPath(key).name
+            try:
+                self.client.download_file(self.bucket, self._key(key), str(path), Config=self.transfer_config)
+            except self._client_error as e:
+                if self._is_missing(e):
+                    raise FileNotFoundError(key) from e
+                raise
+            yield path
+
+
+def storage_key(path) -> str:
+    """
+    数据库中记录的文件路径（相对或绝对形式的 <UPLOAD_DIRECTORY>/<key>）转换为存储key。
+    不在 UPLOAD_DIRECTORY 下的历史路径（例如修改过部署目录）取 "uploads/" 之后的部分。
+    """
+    path_str = str(path).strip()
+    relative = os.path.relpath(os.path.abspath(path_str), os.path.abspath(settings.UPLOAD_DIRECTORY))
+    if not relative.startswith(os.pardir):
+        return PurePosixPath(*Path(relative).parts).as_posix()
+    normalized = path_str.replace("\\", "/")
+    uploads_index = normalized.find("uploads/")
+    if uploads_index != -1:
+        return normalized[uploads_index + len("uploads/"):]
+    return PurePosixPath(normalized).name
+
+
+def storage_path(key: str) -> Path:
+    """存储key对应的暂存路径（也是写入数据库的 filepath 形式）"""
+    return Path(settings.UPLOAD_DIRECTORY) / key
+
+
+def _create_storage(quarantine: bool) -> StorageBackend:
+    if settings.STORAGE_BACKEND == "s3":
+        prefix = settings.S3_PREFIX
+        if quarantine:
+            prefix += settings.GC_QUARANTINE_DIRECTORY.strip("/") + "/"
+        return S3Storage(
+            settings.S3_BUCKET,
+            prefix=prefix,
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            region=settings.S3_REGION,
+            access_key=settings.S3_ACCESS_KEY,
+            secret_key=settings.S3_SECRET_KEY,
+            public_url=settings.S3_PUBLIC_URL,
+            presigned_expires=settings.S3_PRESIGNED_URL_EXPIRES,
+        )
+    if settings.STORAGE_BACKEND != "local":
+        raise RuntimeError(f"Unknown STORAGE_BACKEND: {settings.STORAGE_BACKEND}")
+    return LocalStorage(Path(settings.GC_QUARANTINE_DIRECTORY if quarantine else settings.UPLOAD_DIRECTORY))
+
+
+_lock = threading.Lock()
+_instances: Dict[Tuple[bool, int], StorageBackend] = {}
+
+
+def _get_instance(quarantine: bool) -> StorageBackend:
+    # 按进程缓存：进程池的工作进程（fork）不能复用父进程的连接
+    instance_key = (quarantine, os.getpid())
+    with _lock:
+        if instance_key not in _instances:
+            _instances[instance_key] = _create_storage(quarantine)
+        return _instances[instance_key]
+
+
+def get_storage() -> StorageBackend:
+    """按 STORAGE_BACKEND 配置的存储后端（每个进程一个实例）"""
+    return _get_instance(quarantine=False)
+
+
+def get_quarantine_storage() -> StorageBackend:
+    """
+    文件回收的隔离区：本地后端为 GC_QUARANTINE_DIRECTORY 目录（不在静态文件目录下），
+    S3后端为同一存储桶中的 <GC_QUARANTINE_DIRECTORY>/ 前缀（存储桶策略中不应公开）。
+    """
+    return _get_instance(quarantine=True)
+
+
+def publish_files(paths: Iterable[Path], content_type: Optional[str] = None) -> None:
+    """
+    把暂存目录中处理完成的文件写入存储后端。
+    本地后端下文件已在最终位置，不做任何操作；远程后端全部写入后删除本地副本。
+    """
+    storage = get_storage()
+    if storage.is_local:
+        return
+    paths = list(paths)
+    for path in paths:
+        storage.put_file(storage_key(path), path, content_type=content_type)
+    for path in paths:
+        path.unlink(missing_ok=True)
@@ -0,0 +1,156 @@
+import struct
+import time
+import zlib
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Tuple
+
+_UINT32_MAX = 0xFFFFFFFF
+_UINT16_MAX = 0xFFFF
+# 达到此值的大小、偏移量或文件数需要 ZIP64 扩展（原字段写为全1，实际值写在扩展字段中）
+_ZIP64_LIMIT = _UINT32_MAX
+_ZIP64_COUNT_LIMIT = _UINT16_MAX
+
+# 通用标志位：bit 3 表示CRC和大小写在文件数据之后的数据描述符中（边读边写时才能算出CRC），bit 11 表示文件名为UTF-8
+_FLAGS = 0x0008 | 0x0800
+# 解压所需版本：2.0（普通），4.5（ZIP64）
+_VERSION = 20
+_VERSION_ZIP64 = 45
+# 中央目录中的创建系统为Unix（高字节3），外部属性为普通文件 rw-r--r--
+_MADE_BY_UNIX = 3 << 8
+_EXTERNAL_ATTRIBUTES = 0o100644 << 16
+
+_LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+_CENTRAL_HEADER = struct.Struct("<IHHHHHHIIIHHHHHII")
+_DESCRIPTOR = struct.Struct("<IIII")
+_DESCRIPTOR_ZIP64 = struct.Struct("<IIQQ")
+_ZIP64_END = struct.Struct("<IQHHIIQQQQ")
+_ZIP64_LOCATOR = struct.Struct("<IIQI")
+_END = struct.Struct("<IHHHHIIH")
+
+
+class ZipEntry(NamedTuple):
+    name: str
+    size: int
+    modified: float  # Unix时间戳，写为本地时间的DOS日期时间
+    open: Callable[[], Iterable[bytes]]  # 轮到该文件时才调用，逐块返回文件内容
+
+
+class _Layout(NamedTuple):
+    entry: ZipEntry
+    name: bytes
+    offset: int
+    zip64: bool
+    dos_time: int
+    dos_date: int
+
+
+def _dos_datetime(timestamp: float) -> Tuple[int, int]:
+    """DOS日期时间（精确到2秒，最早1980-01-01）"""
+    t = time.localtime(timestamp)
+    if t.tm_year < 1980:
+        return 0, (1 << 5) | 1
+    return (
+        (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+        ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday,
+    )
+
+
+class ZipStream:
+    """
+    流式生成存储模式（不压缩）的ZIP文件：边读取边输出，每个文件的CRC在读取时计算，写在文件数据之后的数据描述符中，
+    内存占用与文件数量和大小无关（只保留中央目录所需的少量元数据），不需要临时文件。
+
+    文件大小需要事先给出，因此整个ZIP的大小（len）可以在输出前算出，用作 Content-Length；
+    读取到的字节数与给出的大小不一致时抛出 RuntimeError（响应已无法修正，只能中断）。
+    单个文件或总大小超过4GB、文件数超过65535时使用 ZIP64 扩展。
+    """
+
+    def __init__(self, entries: List[ZipEntry]):
+        self._layout: List[_Layout] = []
+        offset = 0
+        for entry in entries:
+            name = entry.name.encode("utf-8")
+            dos_time, dos_date = _dos_datetime(entry.modified)
+            layout = _Layout(entry, name, offset, entry.size >= _ZIP64_LIMIT, dos_time, dos_date)
+            self._layout.append(layout)
+            offset += len(self._local_header(layout)) + entry.size + self._descriptor_size(layout)
+        self._central_directory_offset = offset
+        self._central_directory_size = sum(len(self._central_header(layout, 0)) for layout in self._layout)
+        self._size = offset + self._central_directory_size + len(self._end_records())
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def _descriptor_size(layout: _Layout) -> int:
+        return (_DESCRIPTOR_ZIP64 if layout.zip64 else _DESCRIPTOR).size
+
+    @staticmethod
+    def _local_header(layout: _Layout) -> bytes:
+        # CRC和大小在数据描述符中给出，这里为0；ZIP64条目的大小字段为0xFFFFFFFF，实际值同样在数据描述符中
+        extra = struct.pack("<HHQQ", 0x0001, 16, 0, 0) if layout.zip64 else b""
+        size_field = _UINT32_MAX if layout.zip64 else 0
+        return _LOCAL_HEADER.pack(
+            0x04034B50, _VERSION_ZIP64 if layout.zip64 else _VERSION, _FLAGS, 0,
+            layout.dos_time, layout.dos_date, 0, size_field, size_field, len(layout.name), len(extra),
+        ) + layout.name + extra
+
+    @staticmethod
+    def _descriptor(layout: _Layout, crc: int) -> bytes:
+        size = layout.entry.size
+        if layout.zip64:
+            return _DESCRIPTOR_ZIP64.pack(0x08074B50, crc, size, size)
+        return _DESCRIPTOR.pack(0x08074B50, crc, size, size)
+
+    @staticmethod
+    def _central_header(layout: _Layout, crc: int) -> bytes:
+        size = layout.entry.size
+        zip64_fields = []
+        if layout.zip64:
+            zip64_fields += [size, size]
+        if layout.offset >= _ZIP64_LIMIT:
+            zip64_fields.append(layout.offset)
+        extra = struct.pack(f"<HH{len(zip64_fields)}Q", 0x0001, 8 * len(zip64_fields), *zip64_fields) if zip64_fields else b""
+        version = _VERSION_ZIP64 if zip64_fields else _VERSION
+        return _CENTRAL_HEADER.pack(
+            0x02014B50, _MADE_BY_UNIX | version, version, _FLAGS, 0, layout.dos_time, layout.dos_date, crc,
+            _UINT32_MAX if layout.zip64 else size, _UINT32_MAX if layout.zip64 else size,
+            len(layout.name), len(extra), 0, 0, 0, _EXTERNAL_ATTRIBUTES,
+            _UINT32_MAX if layout.offset >= _ZIP64_LIMIT else layout.offset,
+        ) + layout.name + extra
+
+    def _end_records(self) -> bytes:
+        count = len(self._layout)
+        cd_size, cd_offset = self._central_directory_size, self._central_directory_offset
+        records = b""
+        zip64 = count >= _ZIP64_COUNT_LIMIT or cd_size >= _ZIP64_LIMIT or cd_offset >= _ZIP64_LIMIT
+        if zip64:
+            zip64_end_offset = cd_offset + cd_size
+            records += _ZIP64_END.pack(
+                0x06064B50, _ZIP64_END.size - 12, _VERSION_ZIP64, _VERSION_ZIP64, 0, 0, count, count, cd_size, cd_offset,
+            )
+            records += _ZIP64_LOCATOR.pack(0x07064B50, 0, zip64_end_offset, 1)
+        return records + _END.pack(
+            0x06054B50, 0, 0, _UINT16_MAX if zip64 else count, _UINT16_MAX if zip64 else count,
+            _UINT32_MAX if zip64 else cd_size, _UINT32_MAX if zip64 else cd_offset, 0,
+        )
+
+    def __iter__(self) -> Iterator[bytes]:
+        crcs = []
+        for layout in self._layout:
+            yield self._local_header(layout)
+            crc = 0
+            written = 0
+            for chunk in layout.entry.open():
+                crc = zlib.crc32(chunk, crc)
+                written += len(chunk)
+                if written > layout.entry.size:
+                    break
+                yield chunk
+            if written != layout.entry.size:
+                raise RuntimeError(
+                    f"{layout.entry.name}: expected {layout.entry.size} bytes, read {written} (file changed while streaming)"
+                )
+            yield self._descriptor(layout, crc)
+            crcs.append(crc)
+        yield b"".join(self._central_header(layout, crc) for layout, crc in zip(self._layout, crcs))
+        yield self._end_records()
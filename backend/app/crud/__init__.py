@@ -8,4 +8,6 @@ from .crud_department import department
 from .crud_gallery import gallery
 from .crud_content import content
 from .crud_link import link
-from .crud_topic import topic 
\ No newline at end of file
+from .crud_topic import topic 
+from .crud_upload_session import upload_session
+from .crud_blob import blob
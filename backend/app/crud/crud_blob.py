@@ -0,0 +1,73 @@
+from typing import Dict, List, Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.crud.base import CRUDBase
+from app.models.blob import Blob
+
+
+class CRUDBlob(CRUDBase[Blob, None, None]):
+    def get_by_hash(self, db: Session, *, file_hash: str) -> Optional[Blob]:
+        return db.query(Blob).filter(Blob.hash == file_hash).first()
+
+    def get_by_hashes(self, db: Session, *, hashes: List[str]) -> Dict[str, Blob]:
+        if not hashes:
+            return {}
+        return {blob.hash: blob for blob in db.query(Blob).filter(Blob.hash.in_(hashes)).all()}
+
+    def acquire(self, db: Session, *, file_hash: str, path: str, size: Optional[int] = None, count: int = 1) -> None:
+        """
+        引用计数 +count，文件首次入库时创建记录。
+        不提交事务，由调用方与图片记录一起提交，保证计数与图片记录一致。
+        """
+        if self._increment(db, file_hash, count):
+            return
+        try:
+            # 并发上传同一内容时可能同时插入，冲突后改为累加
+            with db.begin_nested():
+                db.add(Blob(hash=file_hash, path=path, size=size, refcount=count))
+        except IntegrityError:
+            self._increment(db, file_hash, count)
+
+    def release(self, db: Session, *, file_hash: str, count: int = 1) -> None:
+        """引用计数 -count，不提交事务"""
+        self._increment(db, file_hash, -count)
+
+    def get_unreferenced(self, db: Session, *, after_hash: str = "", limit: int = 1000) -> List[Blob]:
+        """按哈希分页（keyset）列出引用计数已归零、等待回收的文件"""
+        return (
+            db.query(Blob)
+            .filter(Blob.refcount <= 0, Blob.hash > after_hash)
+            .order_by(Blob.hash)
+            .limit(limit)
+            .all()
+        )
+
+    def delete_unreferenced(self, db: Session, *, file_hash: str) -> Optional[str]:
+        """
+        引用计数已归零时删除记录并返回文件路径（由调用方删除物理文件），否则返回None。
+        删除条件包含 refcount <= 0，并发的新引用会让删除落空，文件得以保留。
+        """
+        blob = self.get_by_hash(db, file_hash=file_hash)
+        if not blob or blob.refcount > 0:
+            return None
+        path = blob.path
+        deleted = (
+            db.query(Blob)
+            .filter(Blob.hash == file_hash, Blob.refcount <= 0)
+            .delete(synchronize_session=False)
+        )
+        db.commit()
+        return path if deleted else None
+
+    def _increment(self, db: Session, file_hash: str, count: int) -> bool:
+        updated = (
+            db.query(Blob)
+            .filter(Blob.hash == file_hash)
+            .update({Blob.refcount: Blob.refcount + count}, synchronize_session=False)
+        )
+        return updated > 0
+
+
+blob = CRUDBlob(Blob)
@@ -1,16 +1,18 @@
 from typing import List, Optional
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func, or_
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy import func, or_, select
 import os
 
 from app import crud
 from app.crud.base import CRUDBase
+from app.crud.crud_blob import blob as crud_blob
 from app.models.gallery import Gallery
 from app.models.image import Image
 from app.models.tag import Tag
 from app.models.comment import Comment
 from app.schemas.gallery import GalleryCreate, GalleryUpdate
-from app.core.image_utils import safe_delete_image_file, safe_delete_gallery_folder
+from app.services.contact_sheet import contact_sheet_refresher
 
 
 class CRUDGallery(CRUDBase[Gallery, GalleryCreate, GalleryUpdate]):
@@ -31,7 +33,6 @@ class CRUDGallery(CRUDBase[Gallery, GalleryCreate, GalleryUpdate]):
             .options(
                 joinedload(Gallery.owner), 
                 joinedload(Gallery.category),
-                joinedload(Gallery.images),
                 joinedload(Gallery.cover_image)
             )
             .order_by(Gallery.created_at.desc())
@@ -48,7 +49,7 @@ class CRUDGallery(CRUDBase[Gallery, GalleryCreate, GalleryUpdate]):
             .options(
                 joinedload(Gallery.owner),
                 joinedload(Gallery.category),
-                joinedload(Gallery.images)
+                joinedload(Gallery.cover_image)
             )
             .order_by(Gallery.created_at.desc())
             .offset(skip)
@@ -66,7 +67,7 @@ class CRUDGallery(CRUDBase[Gallery, GalleryCreate, GalleryUpdate]):
             .options(
                 joinedload(Gallery.owner),
                 joinedload(Gallery.category),
-                joinedload(Gallery.images)
+                joinedload(Gallery.cover_image)
             )
             .order_by(Gallery.created_at.desc())
             .offset(skip)
@@ -76,6 +77,20 @@ class CRUDGallery(CRUDBase[Gallery, GalleryCreate, GalleryUpdate]):
         # 手动筛选部门
         return [g for g in galleries if g.owner and g.owner.department_id == department_id]
     
+    def fill_default_covers(self, db: Session, galleries: List[Gallery]) -> None:
+        """
+        没有设置封面的图集以第一张图片作为封面（列表接口不返回图片列表）。
+        一次查询取出这些图集的第一张图片，只填充到已加载的对象上，不修改 cover_image_id。
+        """
+        missing = {gallery.id: gallery for gallery in galleries if gallery.cover_image_id is None}
+        if not missing:
+            return
+        first_image_ids = (
+            select(func.min(Image.id)).where(Image.gallery_id.in_(list(missing))).group_by(Image.gallery_id)
+        )
+        for image in db.query(Image).filter(Image.id.in_(first_image_ids)):
+            set_committed_value(missing[image.gallery_id], "cover_image", image)
+
     def get_with_images(self, db: Session, id: int) -> Optional[Gallery]:
         """获取图集及其包含的所有图片"""
         return (
@@ -93,13 +108,13 @@ class CRUDGallery(CRUDBase[Gallery, GalleryCreate, GalleryUpdate]):
         )
     
     def get_multi_with_images(self, db: Session, *, skip: int = 0, limit: int = 100) -> List[Gallery]:
-        """获取多个图集，每个图集包含第一张图片（用作封面）"""
+        """获取多个图集（含封面，不含图片列表）"""
         return (
             db.query(self.model)
             .options(
                 joinedload(Gallery.owner),
                 joinedload(Gallery.category),
-                joinedload(Gallery.images)
+                joinedload(Gallery.cover_image)
             )
             .offset(skip)
             .limit(limit)
@@ -107,13 +122,13 @@ class CRUDGallery(CRUDBase[Gallery, GalleryCreate, GalleryUpdate]):
         )
     
     def get_multi_with_images_sorted(self, db: Session, *, skip: int = 0, limit: int = 100, sort_field: Optional[str] = None, sort_order: str = "desc") -> List[Gallery]:
-        """获取多个图集（包含图片信息），支持排序"""
+        """获取多个图集（含封面，不含图片列表），支持排序"""
         query = (
             db.query(self.model)
             .options(
                 joinedload(Gallery.owner),
                 joinedload(Gallery.category),
-                joinedload(Gallery.images)
+                joinedload(Gallery.cover_image)
             )
         )
         
@@ -124,8 +139,7 @@ class CRUDGallery(CRUDBase[Gallery, GalleryCreate, GalleryUpdate]):
             elif sort_field == "bookmarks_count":
                 order_field = Gallery.bookmarks_count
             elif sort_field == "downloads_count":
-                # 使用views_count作为下载量的替代指标
-                order_field = Gallery.views_count
+                order_field = Gallery.downloads_count
             elif sort_field == "views_count":
                 order_field = Gallery.views_count
             elif sort_field == "created_at":
@@ -148,15 +162,17 @@ class CRUDGallery(CRUDBase[Gallery, GalleryCreate, GalleryUpdate]):
         count = db.query(func.count(Image.id)).filter(Image.gallery_id == gallery_id).scalar()
         db.query(Gallery).filter(Gallery.id == gallery_id).update({"image_count": count})
         db.commit()
+        # 图集成员变化，后台刷新拼图（前几张图片未变时不会重新生成）
+        contact_sheet_refresher.schedule(gallery_id)
     
     def get_popular(self, db: Session, *, skip: int = 0, limit: int = 100) -> List[Gallery]:
-        """获取热门图集（按点赞数排序），包含图片信息"""
+        """获取热门图集（按点赞数排序，含封面）"""
         return (
             db.query(self.model)
             .options(
                 joinedload(Gallery.owner), 
                 joinedload(Gallery.category),
-                joinedload(Gallery.images)
+                joinedload(Gallery.cover_image)
             )
             .order_by(Gallery.likes_count.desc(), Gallery.views_count.desc())
             .offset(skip)
@@ -192,13 +208,13 @@ class CRUDGallery(CRUDBase[Gallery, GalleryCreate, GalleryUpdate]):
         )
     
     def search_with_images(self, db: Session, *, query: str, skip: int = 0, limit: int = 100) -> List[Gallery]:
-        """搜索图集（包含图片信息），支持标题、描述和标签搜索"""
+        """搜索图集（含封面），支持标题、描述和标签搜索"""
         return (
             db.query(self.model)
             .options(
                 joinedload(Gallery.owner),
                 joinedload(Gallery.category),
-                joinedload(Gallery.images),
+                joinedload(Gallery.cover_image),
                 joinedload(Gallery.tags)
             )
             .filter(
@@ -311,66 +327,57 @@ class CRUDGallery(CRUDBase[Gallery, GalleryCreate, GalleryUpdate]):
 
     def remove(self, db: Session, *, id: int) -> Gallery:
         """
-        删除一个图集，并安全地删除其所有关联的图片记录和物理文件，最后删除图集文件夹。
+        删除一个图集及其所有关联的图片记录，在同一事务中完成。
+        图片按文件批量减少引用计数，不逐张重新统计图集数量或刷新拼图（图集本身即将删除）。
+        物理文件和空的图集文件夹由后台回收任务（app.services.file_gc）清理。
         """
         gallery = db.query(self.model).options(joinedload(self.model.images)).get(id)
         if not gallery:
             return None
 
-        # 复制图片列表，因为在迭代过程中会修改原始关系
         images_to_delete = list(gallery.images)
+        image_ids = [image.id for image in images_to_delete]
 
-        # 关键步骤：首先解除当前图集的封面图片外键约束
-        if gallery.cover_image_id is not None:
-            gallery.cover_image_id = None
-            db.commit()
+        # 首先解除当前图集的封面图片，以及其他表对这些图片的外键引用
+        gallery.cover_image_id = None
+        self._clear_image_foreign_key_references(db, image_ids=image_ids)
+        db.flush()
 
-        # 为每个要删除的图片清理外键引用（包括可能被其他表引用的情况）
-        for image in images_to_delete:
-            # 清理所有外键引用，包括Topic表可能引用的图片
-            self._clear_image_foreign_key_references(db, image_id=image.id)
-        
-        # 现在可以安全地逐个删除图片
+        blob_refs = (
+            db.query(Image.blob_hash, func.count(Image.id))
+            .filter(Image.gallery_id == id, Image.blob_hash.isnot(None))
+            .group_by(Image.blob_hash)
+            .all()
+        )
+        for blob_hash, count in blob_refs:
+            crud_blob.release(db, file_hash=blob_hash, count=count)
         for image in images_to_delete:
-            crud.image.remove(db=db, id=image.id)
-
-        # 在所有图片处理完毕后，重新获取并删除图集记录
-        # 因为中间有多次commit，原始的gallery对象可能已经过期
-        gallery_to_delete = db.query(self.model).get(id)
-        if gallery_to_delete:
-            db.delete(gallery_to_delete)
-            db.commit()
-
-        # 删除图集文件夹（如果为空）
-        try:
-            safe_delete_gallery_folder(db, gallery_id=id)
-        except Exception as e:
-            # 记录错误但不影响图集删除的成功
-            print(f"Warning: Could not delete gallery folder for gallery {id}: {e}")
+            db.delete(image)
+        db.delete(gallery)
+        db.commit()
 
         return gallery
 
-    def _clear_image_foreign_key_references(self, db: Session, *, image_id: int) -> None:
+    def _clear_image_foreign_key_references(self, db: Session, *, image_ids: List[int]) -> None:
         """
-        清理所有引用指定图片的外键关系，防止删除时出现约束错误
+        批量清理引用指定图片的外键关系，防止删除时出现约束错误（不提交事务）
         这个方法主要用于图集删除时批量清理外键引用
         """
+        if not image_ids:
+            return
         # 1. 清理 Gallery 表的 cover_image_id 外键
-        db.query(self.model).filter(self.model.cover_image_id == image_id).update({
-            self.model.cover_image_id: None
-        })
-        
+        db.query(self.model).filter(self.model.cover_image_id.in_(image_ids)).update(
+            {self.model.cover_image_id: None}, synchronize_session=False
+        )
+
         # 2. 清理 Topic 表的 cover_image_id 外键
         from app.models.topic import Topic
-        db.query(Topic).filter(Topic.cover_image_id == image_id).update({
-            Topic.cover_image_id: None
-        })
-        
+        db.query(Topic).filter(Topic.cover_image_id.in_(image_ids)).update(
+            {Topic.cover_image_id: None}, synchronize_session=False
+        )
+
         # 3. 如果以后还有其他表引用Image，也在这里添加清理逻辑
         # 例如：用户头像、分类封面等
-        
-        # 提交这些更改
-        db.commit()
 
 
 gallery = CRUDGallery(Gallery) 
\ No newline at end of file
@@ -1,6 +1,7 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import func, text
 from typing import List, Union, Dict, Any, Optional
+from datetime import datetime
 import os
 
 from app import crud
@@ -10,7 +11,7 @@ from app.schemas.image import ImageCreate, ImageUpdate
 from app.crud.base import CRUDBase
 from app.models.user import User
 from app.models.tag import Tag
-from app.core.image_utils import safe_delete_image_file
+from app.crud.crud_blob import blob as crud_blob
 from app.models.comment import Comment
 
 class CRUDImage(CRUDBase[Image, ImageCreate, ImageUpdate]):
@@ -24,8 +25,15 @@ class CRUDImage(CRUDBase[Image, ImageCreate, ImageUpdate]):
         filepath: str,
         tags: Optional[List[str]] = None,
         category_id: Optional[int] = None,
-        gallery_id: Optional[int] = None
+        gallery_id: Optional[int] = None,
+        file_info: Optional[Dict[str, Any]] = None,
+        blob_hash: Optional[str] = None
     ) -> Image:
+        """
+        file_info 为处理阶段得到的 width、height、file_size、file_type、blurhash、phash 以及 exif、taken_at、camera_model；
+        blob_hash 为内容寻址存储的文件，其引用计数与图片记录在同一事务中增加。
+        """
+        file_info = file_info or {}
         db_obj = Image(
             title=obj_in.title,
             description=obj_in.description,
@@ -33,7 +41,17 @@ class CRUDImage(CRUDBase[Image, ImageCreate, ImageUpdate]):
             filepath=filepath,
             file_hash=obj_in.file_hash,
             owner_id=owner_id,
-            topic_id=obj_in.topic_id
+            topic_id=obj_in.topic_id,
+            width=file_info.get("width"),
+            height=file_info.get("height"),
+            file_size=file_info.get("file_size"),
+            file_type=file_info.get("file_type"),
+            blurhash=file_info.get("blurhash"),
+            phash=file_info.get("phash"),
+            exif=file_info.get("exif"),
+            taken_at=file_info.get("taken_at"),
+            camera_model=file_info.get("camera_model"),
+            blob_hash=blob_hash
         )
         
         # Handle tags
@@ -54,24 +72,108 @@ class CRUDImage(CRUDBase[Image, ImageCreate, ImageUpdate]):
         # Handle gallery
         if gallery_id:
             db_obj.gallery_id = gallery_id
+
+        if blob_hash:
+            crud_blob.acquire(db, file_hash=blob_hash, path=filepath, size=file_info.get("file_size"))
             
         db.add(db_obj)
         db.commit()
         db.refresh(db_obj)
         return db_obj
     
+    def create_multi(
+        self,
+        db: Session,
+        *,
+        rows: List[Dict[str, Any]],
+        owner_id: int,
+        tags: Optional[List[str]] = None,
+        category_id: Optional[int] = None,
+        gallery_id: Optional[int] = None
+    ) -> List[int]:
+        """
+        批量创建图片记录：所有标签一次查询解析，所有记录在同一事务中插入并只提交一次。
+        rows 中每项包含 Image 的列值（title、description、topic_id、filename、filepath、file_hash、
+        width、height、file_size、file_type、blurhash、phash、exif、taken_at、camera_model、blob_hash、ai_status 等），可选的 extra_tags 为该记录额外的标签。
+        blob_hash 对应文件的引用计数按记录数累加，与图片记录在同一事务中提交。
+
+        Returns:
+            List[int]: 新记录ID，与 rows 顺序一致（提交前获取，避免提交后逐条刷新）
+        """
+        common_tags = [t.strip() for t in (tags or []) if t and t.strip()]
+        tag_names = set(common_tags)
+        for row in rows:
+            tag_names.update(t.strip() for t in row.get("extra_tags") or [] if t and t.strip())
+
+        tag_map = {}
+        if tag_names:
+            tag_map = {t.name: t for t in db.query(Tag).filter(Tag.name.in_(tag_names)).all()}
+            for tag_name in tag_names - tag_map.keys():
+                tag = Tag(name=tag_name)
+                db.add(tag)
+                tag_map[tag_name] = tag
+
+        db_objs = []
+        for row in rows:
+            columns = {k: v for k, v in row.items() if k != "extra_tags"}
+            db_obj = Image(owner_id=owner_id, category_id=category_id, gallery_id=gallery_id, **columns)
+            row_tags = common_tags + [t.strip() for t in row.get("extra_tags") or [] if t and t.strip()]
+            db_obj.tags = [tag_map[name] for name in dict.fromkeys(row_tags)]
+            db_objs.append(db_obj)
+
+        # 同一文件的多条记录合并为一次计数更新
+        blob_refs: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            if row.get("blob_hash"):
+                blob_refs.setdefault(row["blob_hash"], []).append(row)
+        for blob_hash, blob_rows in blob_refs.items():
+            crud_blob.acquire(
+                db,
+                file_hash=blob_hash,
+                path=blob_rows[0]["filepath"],
+                size=blob_rows[0].get("file_size"),
+                count=len(blob_rows),
+            )
+
+        db.add_all(db_objs)
+        db.flush()
+        ids = [db_obj.id for db_obj in db_objs]
+        db.commit()
+        return ids
+
+    def get_by_blob_hash(self, db: Session, *, blob_hash: str) -> Optional[Image]:
+        """任取一条引用该文件的图片记录（用于复用文件的尺寸等元数据）"""
+        return db.query(Image).filter(Image.blob_hash == blob_hash).first()
+
     def get_by_hash(self, db: Session, *, file_hash: str) -> Image:
         return db.query(Image).filter(Image.file_hash == file_hash).first()
 
+    def get_by_hashes(self, db: Session, *, hashes: List[str]) -> Dict[str, Image]:
+        """一次 IN 查询取回多个哈希对应的图片，返回 哈希 -> 图片"""
+        if not hashes:
+            return {}
+        images = db.query(Image).filter(Image.file_hash.in_(hashes)).all()
+        return {image.file_hash: image for image in images}
+
     def count_filepath_references(self, db: Session, *, filepath: str) -> int:
         """统计指定文件路径被多少个图片记录引用"""
         return db.query(Image).filter(Image.filepath == filepath).count()
 
-    def get_existing_hashes(self, db: Session, *, hashes: List[str]) -> List[str]:
-        if not hashes:
-            return []
-        existing_hashes = db.query(Image.file_hash).filter(Image.file_hash.in_(hashes)).all()
-        return [h for h, in existing_hashes]
+    def get_existing_hashes(self, db: Session, *, hashes: List[str], batch_size: int = 1000) -> Dict[str, int]:
+        """
+        查询哪些哈希已存在，返回 哈希 -> 图片ID。
+        只取 file_hash 和 id 两列（走 file_hash 唯一索引），大批量哈希按 batch_size 分批 IN 查询，
+        避免单条SQL的参数过多。
+        """
+        existing: Dict[str, int] = {}
+        for start in range(0, len(hashes), batch_size):
+            rows = (
+                db.query(Image.file_hash, Image.id)
+                .filter(Image.file_hash.in_(hashes[start:start + batch_size]))
+                .all()
+            )
+            existing.update({file_hash: image_id for file_hash, image_id in rows})
+        return existing
 
     def get_multi_by_owner(self, db: Session, *, owner_id: int, skip: int = 0, limit: int = 100) -> List[Image]:
         """
@@ -86,6 +188,40 @@ class CRUDImage(CRUDBase[Image, ImageCreate, ImageUpdate]):
             .all()
         )
 
+    def get_multi_filtered(
+        self,
+        db: Session,
+        *,
+        skip: int = 0,
+        limit: int = 100,
+        category_id: Optional[int] = None,
+        camera_model: Optional[str] = None,
+        taken_after: Optional[datetime] = None,
+        taken_before: Optional[datetime] = None,
+        sort: str = "created_at",
+        order: str = "desc"
+    ) -> List[Image]:
+        """
+        按分类、相机型号、拍摄时间范围筛选图片，按上传时间或拍摄时间排序（均有索引）。
+        按拍摄时间排序时没有拍摄时间的图片排在最后，相同时间按ID排序以保证分页稳定。
+        """
+        query = db.query(self.model)
+        if category_id:
+            query = query.filter(self.model.category_id == category_id)
+        if camera_model:
+            query = query.filter(self.model.camera_model == camera_model)
+        if taken_after:
+            query = query.filter(self.model.taken_at >= taken_after)
+        if taken_before:
+            query = query.filter(self.model.taken_at < taken_before)
+
+        sort_field = self.model.taken_at if sort == "taken_at" else self.model.created_at
+        if order == "asc":
+            query = query.order_by(sort_field.asc().nulls_last(), self.model.id.asc())
+        else:
+            query = query.order_by(sort_field.desc().nulls_last(), self.model.id.desc())
+        return query.offset(skip).limit(limit).all()
+
     def get_total_count(self, db: Session) -> int:
         return db.query(self.model).count()
 
@@ -155,32 +291,31 @@ class CRUDImage(CRUDBase[Image, ImageCreate, ImageUpdate]):
 
     def remove(self, db: Session, *, id: int) -> Image:
         """
-        删除一个图片记录，并安全地处理关联的物理文件。
-        如果图片属于某个图集，则更新该图集的图片数量。
+        删除一个图片记录。如果图片属于某个图集，则更新该图集的图片数量。
         在删除前先清理所有外键引用。
+        物理文件不在请求中删除：内容寻址文件只减少引用计数，不再被引用的文件
+        由后台回收任务（app.services.file_gc）统一隔离并清理。
         """
         obj = db.query(self.model).get(id)
         if not obj:
             return None
         
-        filepath = obj.filepath
+        blob_hash = obj.blob_hash
         gallery_id = obj.gallery_id
         
         # 关键步骤：在删除图片前，先清理所有外键引用
         self._clear_foreign_key_references(db, image_id=id)
         
-        # 先删除数据库记录
+        # 先删除数据库记录，文件引用计数在同一事务中减少
         db.delete(obj)
+        if blob_hash:
+            crud_blob.release(db, file_hash=blob_hash)
         db.commit()
         
         # 如果图片属于图集，更新图集计数
         if gallery_id:
             crud.gallery.update_image_count(db, gallery_id=gallery_id)
             
-        # 在记录删除后，再检查并安全地删除物理文件
-        if filepath:
-            safe_delete_image_file(db, filepath)
-            
         return obj
     
     def _clear_foreign_key_references(self, db: Session, *, image_id: int) -> None:
@@ -90,7 +90,6 @@ class CRUDTopic(CRUDBase[Topic, TopicCreate, TopicUpdate]):
         query = (
             db.query(Gallery)
             .options(
-                joinedload(Gallery.images),
                 joinedload(Gallery.cover_image),
                 joinedload(Gallery.category),
                 joinedload(Gallery.owner),
@@ -0,0 +1,74 @@
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.crud.base import CRUDBase
+from app.models.upload_session import UploadSession
+from app.schemas.upload_session import UploadSessionCreate
+
+
+class CRUDUploadSession(CRUDBase[UploadSession, UploadSessionCreate, UploadSessionCreate]):
+    def create_with_owner(self, db: Session, *, obj_in: UploadSessionCreate, owner_id: int) -> UploadSession:
+        """创建上传会话，入库参数保存在 form_data 中，完成上传时使用"""
+        form_data = obj_in.model_dump(exclude={"filename", "total_size", "file_hash"})
+        db_obj = UploadSession(
+            id=str(uuid.uuid4()),
+            owner_id=owner_id,
+            filename=obj_in.filename,
+            total_size=obj_in.total_size,
+            received_size=0,
+            file_hash=obj_in.file_hash.lower() if obj_in.file_hash else None,
+            form_data=form_data,
+            expires_at=self._next_expiry(),
+        )
+        db.add(db_obj)
+        db.commit()
+        db.refresh(db_obj)
+        return db_obj
+
+    def get_by_owner(self, db: Session, *, id: str, owner_id: int) -> Optional[UploadSession]:
+        """获取属于指定用户且未过期的上传会话"""
+        return (
+            db.query(self.model)
+            .filter(
+                self.model.id == id,
+                self.model.owner_id == owner_id,
+                self.model.expires_at > datetime.utcnow(),
+            )
+            .first()
+        )
+
+    def advance(self, db: Session, *, id: str, expected_offset: int, new_offset: int) -> bool:
+        """
+        乐观并发地推进已接收偏移：只有当前偏移仍为 expected_offset 时才更新，
+        同一会话的并发分片请求中只有一个能成功，并顺延会话过期时间。
+        """
+        updated = (
+            db.query(self.model)
+            .filter(self.model.id == id, self.model.received_size == expected_offset)
+            .update(
+                {self.model.received_size: new_offset, self.model.expires_at: self._next_expiry()},
+                synchronize_session=False,
+            )
+        )
+        db.commit()
+        return updated == 1
+
+    def get_expired(self, db: Session, *, limit: int = 100) -> List[UploadSession]:
+        return (
+            db.query(self.model)
+            .filter(self.model.expires_at <= datetime.utcnow())
+            .order_by(self.model.expires_at)
+            .limit(limit)
+            .all()
+        )
+
+    @staticmethod
+    def _next_expiry() -> datetime:
+        return datetime.utcnow() + timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS)
+
+
+upload_session = CRUDUploadSession(UploadSession)
@@ -1,11 +1,14 @@
 from typing import List
+from sqlalchemy import func
 from sqlalchemy.orm import Session, selectinload
 from typing import Any, Dict, Optional, Union
 
+from app.models.image import Image
 from app.models.user import User
 from app.schemas import UserCreate, UserUpdateAdmin
 from app.core.security import get_password_hash, verify_password
 from app.crud.base import CRUDBase
+from app.crud.crud_blob import blob as crud_blob
 
 
 class CRUDUser(CRUDBase[User, UserCreate, UserUpdateAdmin]):
@@ -74,6 +77,27 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdateAdmin]):
     def get_total_count(self, db: Session) -> int:
         return db.query(self.model).count()
 
+    def remove(self, db: Session, *, id: int) -> User:
+        """
+        删除用户，其内容（图集、图片等）随之级联删除。
+        级联删除的图片不经过 crud.image.remove，这里按文件批量减少引用计数，与删除在同一事务中提交，
+        不再被引用的文件由后台回收任务清理。
+        """
+        obj = db.query(self.model).get(id)
+        if not obj:
+            return None
+        blob_refs = (
+            db.query(Image.blob_hash, func.count(Image.id))
+            .filter(Image.owner_id == id, Image.blob_hash.isnot(None))
+            .group_by(Image.blob_hash)
+            .all()
+        )
+        for blob_hash, count in blob_refs:
+            crud_blob.release(db, file_hash=blob_hash, count=count)
+        db.delete(obj)
+        db.commit()
+        return obj
+
     def follow(self, db: Session, *, follower: User, followed: User) -> None:
         db_follower = db.merge(follower)
         db_followed = db.merge(followed)
@@ -94,6 +118,4 @@ def get_multi(db: Session, *, skip: int = 0, limit: int = 100) -> List[User]:
     return db.query(User).offset(skip).limit(limit).all()
 
 def remove(db: Session, *, user: User) -> User:
-    db.delete(user)
-    db.commit()
-    return user 
\ No newline at end of file
+    return CRUDUser(User).remove(db, id=user.id) 
\ No newline at end of file
@@ -1,18 +1,56 @@
+import asyncio
+import logging
+import threading
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from app.core.config import settings
+from app.core.http_cache import CachedStaticFiles, redirect_cache_control
+from app.core.storage import get_storage
 from app.api.v1.api import api_router
-from app.services.background_tasks import background_task_manager
+from app.services.job_queue import job_worker
+from app.services.image_worker import image_worker
+from app.services.phash_index import phash_index
+from app.services.file_gc import start_periodic_gc
+from app.db.session import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+def warm_phash_index():
+    """后台加载近似重复索引（快照 + 数据库增量），避免首个上传请求承担加载开销"""
+    db = SessionLocal()
+    try:
+        phash_index.ensure_loaded(db)
+    except Exception as e:
+        logger.error(f"Failed to load perceptual hash index: {e}")
+    finally:
+        db.close()
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # 启动后台任务管理器
-    await background_task_manager.start()
+    # 在本进程中执行持久化任务（AI分析等），JOB_WORKER_CONCURRENCY 为0时由 app/run_jobs.py 独立执行
+    job_worker.start()
+    # 启动图片处理进程池
+    image_worker.start()
+    # 后台加载近似重复索引
+    threading.Thread(target=warm_phash_index, daemon=True).start()
+    # 定期回收不再被引用的文件
+    gc_stop = threading.Event()
+    start_periodic_gc(gc_stop)
     yield
-    # 停止后台任务管理器
-    await background_task_manager.stop()
+    gc_stop.set()
+    # 停止领取任务，执行中的任务继续执行完（任务可能还要用到图片处理进程池，需先于进程池停止）
+    await job_worker.stop()
+    # 停止图片处理进程池（等待进程退出会阻塞，放到线程中执行）
+    await asyncio.to_thread(image_worker.shutdown)
+    # 保存近似重复索引快照，下次启动只需从数据库补齐增量
+    try:
+        await asyncio.to_thread(phash_index.save)
+    except Exception as e:
+        logger.error(f"Failed to save perceptual hash index: {e}")
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -31,8 +69,19 @@ if cors_origins:
         allow_headers=["*"],
     )
 
-# Mount the 'uploads' directory to serve static files
-app.mount("/uploads", StaticFiles(directory=settings.UPLOAD_DIRECTORY), name="uploads")
+storage = get_storage()
+if storage.is_local:
+    # Mount the 'uploads' directory to serve static files
+    # （带 ?v= 内容版本参数的请求返回永久缓存头，内容寻址文件使用基于哈希的ETag）
+    app.mount("/uploads", CachedStaticFiles(directory=settings.UPLOAD_DIRECTORY), name="uploads")
+else:
+    @app.get("/uploads/{key:path}", include_in_schema=False)
+    def redirect_upload(key: str):
+        """对象存储（私有存储桶）中的文件：重定向到预签名URL，/uploads/<key> 形式的URL保持不变"""
+        return RedirectResponse(
+            storage.presigned_url(key), status_code=302,
+            headers={"Cache-Control": redirect_cache_control()},
+        )
 
 @app.get("/")
 async def read_root():
@@ -9,6 +9,9 @@ from .category import Category # noqa
 from .department import Department # noqa
 from .link import Link # noqa
 from .topic import Topic # noqa
+from .upload_session import UploadSession # noqa
+from .blob import Blob # noqa
+from .job import Job # noqa
 
 # 统一的内容交互表
 from .content_interactions import content_likes, content_bookmarks, content_tags, user_follows # noqa
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, func
+
+from app.db.base import Base
+
+
+class Blob(Base):
+    """
+    内容寻址存储的文件：以上传内容的SHA-256为键，按哈希前缀分目录存放。
+    refcount 为引用该文件的图片记录数，随图片记录的创建/删除在同一事务中增减，
+    归零时才删除物理文件，删除图片无需再按 filepath 统计引用。
+    """
+    __tablename__ = 'blob'
+
+    hash = Column(String(64), primary_key=True)  # SHA-256（上传的原始内容）
+    path = Column(String(500), nullable=False)  # 处理后的文件路径，与 Image.filepath 一致
+    size = Column(BigInteger, nullable=True)
+    refcount = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
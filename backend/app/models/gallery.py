@@ -1,5 +1,6 @@
 from sqlalchemy import Column, Integer, ForeignKey
 from sqlalchemy.orm import relationship
+from sqlalchemy.types import JSON
 
 from app.models.content_base import ContentBase, ContentType
 
@@ -14,12 +15,24 @@ class Gallery(ContentBase):
     
     # Gallery特有字段
     image_count = Column(Integer, default=0)
+    downloads_count = Column(Integer, default=0)  # 整个图集的ZIP下载次数
     cover_image_id = Column(Integer, ForeignKey("image.id"), nullable=True)
+    # 图集拼图：存储key、尺寸、格子坐标及生成时的图片版本（见 app.services.contact_sheet）
+    contact_sheet_data = Column("contact_sheet", JSON(none_as_null=True), nullable=True)
 
     # 与图片的关系 - 明确指定foreign_keys
     images = relationship("Image", back_populates="gallery", foreign_keys="Image.gallery_id")
     cover_image = relationship("Image", foreign_keys=[cover_image_id])
 
+    @property
+    def contact_sheet(self):
+        """拼图的访问URL和格子坐标（尚未生成时为None）"""
+        if not self.contact_sheet_data:
+            return None
+        # 在函数内导入：拼图服务依赖模型模块
+        from app.services.contact_sheet import contact_sheet_info
+        return contact_sheet_info(self.contact_sheet_data)
+
     # 多态映射配置
     __mapper_args__ = {
         'polymorphic_identity': ContentType.GALLERY,
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text
+from sqlalchemy import Column, DateTime, Integer, String, ForeignKey, Text, func
 from sqlalchemy.orm import relationship
 from sqlalchemy.types import JSON
 
@@ -12,12 +12,22 @@ class Image(ContentBase):
     
     # 图片特有字段
     filename = Column(String(255), nullable=False, unique=True)
-    filepath = Column(String(500), nullable=False)
+    filepath = Column(String(500), nullable=False, index=True)
     file_hash = Column(String(64), nullable=True, index=True, unique=True)  # SHA-256 hash
+    blob_hash = Column(String(64), ForeignKey("blob.hash"), nullable=True, index=True)  # 内容寻址存储的文件，历史记录为空
     file_size = Column(Integer)
     file_type = Column(String(50))
     width = Column(Integer)
     height = Column(Integer)
+    blurhash = Column(String(64), nullable=True)  # 加载占位图（BlurHash）
+    phash = Column(String(16), nullable=True, index=True)  # 64位感知哈希（dHash，十六进制），用于近似重复检测
+    # 感知哈希的写入时间，各进程的近似重复索引据此增量刷新；批量改写 phash 时需调用 phash_index.touch_phash
+    phash_updated_at = Column(DateTime(timezone=True), default=func.now(), nullable=True, index=True)
+
+    # EXIF元数据（上传时从原图提取，存储的图片不保留EXIF）
+    exif = Column(JSON, nullable=True)  # 拍摄时间、相机、镜头、方向、ISO、曝光参数、GPS
+    taken_at = Column(DateTime, nullable=True, index=True)  # 拍摄时间（相机本地时间）
+    camera_model = Column(String(100), nullable=True, index=True)
     
     # 图集关联
     gallery_id = Column(Integer, ForeignKey("gallery.id"), nullable=True)
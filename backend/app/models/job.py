@@ -0,0 +1,40 @@
+from sqlalchemy import Column, Computed, Integer, String, Text, DateTime, Index, func
+from sqlalchemy.types import JSON
+
+from app.db.base import Base
+
+
+class Job(Base):
+    """
+    持久化后台任务（见 app.services.job_queue）：多个API进程和独立的任务进程共同消费，重启和部署不会丢失。
+    状态流转：queued -> running -> succeeded；执行失败按指数退避回到 queued（run_at 为下次可执行时间），
+    重试次数用尽后为 dead（死信，保留错误信息供排查和手动重试）。
+    running 状态的任务在 locked_until 之前由领取它的进程持有（租约），超过租约未完成（进程崩溃）会被重新领取。
+    """
+    __tablename__ = 'job'
+
+    id = Column(Integer, primary_key=True, index=True)
+    type = Column(String(50), nullable=False)
+    payload = Column(JSON, nullable=True)
+    status = Column(String(20), nullable=False, default='queued')  # queued, running, succeeded, dead
+    # 同一对象的任务排队或执行期间不重复入队，例如 ai_analysis:<image_id>
+    dedupe_key = Column(String(100), nullable=True, index=True)
+    # 排队或执行期间等于 dedupe_key，其余状态为空；其上的唯一索引保证并发入队时不会重复
+    # （MySQL 不支持部分索引，用生成列实现 WHERE status IN ('queued', 'running') 的唯一约束）
+    active_dedupe_key = Column(
+        String(100), Computed("CASE WHEN status IN ('queued', 'running') THEN dedupe_key END", persisted=True)
+    )
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    run_at = Column(DateTime, nullable=False)  # UTC，queued 状态下最早可执行的时间
+    locked_by = Column(String(100), nullable=True)
+    locked_until = Column(DateTime, nullable=True)  # UTC，租约到期时间
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime, nullable=True)  # UTC
+
+    __table_args__ = (
+        # 领取任务的查询条件：按状态过滤、按可执行时间排序
+        Index('ix_job_status_run_at', 'status', 'run_at'),
+        Index('uq_job_active_dedupe_key', 'active_dedupe_key', unique=True),
+    )
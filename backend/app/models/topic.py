@@ -1,6 +1,7 @@
 from sqlalchemy import Column, Integer, String, Text, DateTime, func, Boolean, ForeignKey
 from sqlalchemy.orm import relationship
 
+from app.core.storage import get_storage
 from app.db.base import Base
 
 
@@ -45,9 +46,11 @@ class Topic(Base):
     def cover_image_url(self):
         """获取封面图片URL，兼容前端"""
         if self.cover_image:
-            # 专题封面图片存储在 /uploads/topics/ 目录下
-            return f"/uploads/topics/{self.cover_image.filename}"
-        return "/uploads/default_topic_cover.jpg"  # 返回默认图片
+            # 专题封面图片存储在 topics/ 目录下，URL由存储后端决定并带内容版本参数
+            # （在函数内导入：image_utils 依赖模型模块）
+            from app.core.image_utils import generate_image_url
+            return generate_image_url(self.cover_image)
+        return get_storage().url("default_topic_cover.jpg")  # 返回默认图片
 
     def __repr__(self):
         return f"<Topic(id={self.id}, name='{self.name}', galleries_count={self.galleries_count})>" 
\ No newline at end of file
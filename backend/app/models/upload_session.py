@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, func
+from sqlalchemy.types import JSON
+
+from app.db.base import Base
+
+
+class UploadSession(Base):
+    """
+    分片断点续传会话：记录已接收的字节偏移和上传完成后入库所需的表单信息
+    """
+    __tablename__ = 'upload_session'
+
+    id = Column(String(36), primary_key=True)  # UUID
+    owner_id = Column(Integer, ForeignKey("user.id"), nullable=False, index=True)
+    filename = Column(String(255), nullable=False)  # 客户端原始文件名
+    total_size = Column(BigInteger, nullable=False)
+    received_size = Column(BigInteger, nullable=False, default=0)
+    file_hash = Column(String(64), nullable=True)  # 客户端声明的SHA-256，完成时校验
+    form_data = Column(JSON, nullable=True)  # title、description、tags、category_id等入库参数
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
@@ -0,0 +1,259 @@
+"""
+批量重新处理图库中的图片：按当前配置重新生成衍生图（RENDITION_SIZES / RENDITION_QUALITY）、
+BlurHash 占位图、感知哈希和文件元数据；已存储的图片超出 IMAGE_MAX_WIDTH x IMAGE_MAX_HEIGHT 时重新缩小。
+
+原始上传文件不保留，存储的图片已叠加水印，因此修改水印文字或提高 IMAGE_QUALITY 无法作用于历史图片。
+
+按ID分批（keyset分页）读取图片记录，同一文件（秒传记录共用）只处理一次，分发到进程池并发执行，
+每批提交后把进度写入状态文件；中断后再次运行会从上次的位置继续（--restart 从头开始）。
+结束后重建近似重复索引快照。
+
+用法:
+    python app/reprocess_images.py                           # 处理全部图片（可断点续跑）
+    python app/reprocess_images.py --only-missing            # 只处理缺少衍生图或元数据的图片
+    python app/reprocess_images.py --dry-run                 # 只统计将要处理的文件数
+    python app/reprocess_images.py --workers 8 --rate-limit 200   # 8个进程，每秒最多200个文件
+    python app/reprocess_images.py --restart --state-file /tmp/reprocess.json
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Add the project root directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import or_
+
+from app.core.config import settings
+from app.core.image_utils import EXIF_FIELDS, FILE_INFO_FIELDS, get_rendition_path, rerender_image
+from app.core.storage import get_storage, storage_key
+from app.db.session import SessionLocal
+import app.models  # noqa: F401  确保所有模型已注册（关系映射需要）
+from app.models.blob import Blob
+from app.models.image import Image
+from app.services.phash_index import phash_index, touch_phash
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_STATE_FILE = "reprocess_state.json"
+# EXIF只能在上传时从原图读取（存储的图片不保留EXIF），重新处理不会改变也不会补齐这些字段
+REPROCESS_FIELDS = tuple(field for field in FILE_INFO_FIELDS if field not in EXIF_FIELDS)
+
+
+def _rerender(filepath: str) -> Dict[str, Any]:
+    """
+    工作进程中执行：返回文件元数据（衍生图路径不需要回传）。
+    对象存储中的文件先下载到本地临时目录，处理后写回衍生图（原图只在重新缩小时写回）。
+    """
+    storage = get_storage()
+    key = storage_key(filepath)
+    with storage.local_file(key) as image_path:
+        original_size = image_path.stat().st_size
+        info = rerender_image(image_path)
+        if not storage.is_local:
+            for name, rendition_path in info["renditions"].items():
+                rendition_key = storage_key(get_rendition_path(Path(filepath), name))
+                storage.put_file(rendition_key, rendition_path, content_type="image/jpeg")
+            if info["file_size"] != original_size:
+                storage.put_file(key, image_path, content_type="image/jpeg")
+    return {field: info[field] for field in REPROCESS_FIELDS}
+
+
+def _config_fingerprint() -> Dict[str, Any]:
+    """影响处理结果的配置，记录在状态文件中，续跑时配置不同会给出提示"""
+    return {
+        "rendition_sizes": settings.RENDITION_SIZES,
+        "rendition_quality": settings.RENDITION_QUALITY,
+        "image_max_size": [settings.IMAGE_MAX_WIDTH, settings.IMAGE_MAX_HEIGHT],
+        "image_quality": settings.IMAGE_QUALITY,
+        "blurhash_components": [settings.BLURHASH_X_COMPONENTS, settings.BLURHASH_Y_COMPONENTS],
+    }
+
+
+def load_state(path: Path, restart: bool, only_missing: bool) -> Dict[str, Any]:
+    if path.exists() and not restart:
+        state = json.loads(path.read_text())
+        if state.get("config") != _config_fingerprint():
+            logger.warning("Processing settings changed since the checkpoint was written; "
+                           "use --restart to reprocess images that were already done")
+        if state.get("only_missing") != only_missing:
+            logger.warning("Resuming a run that used a different --only-missing setting")
+        logger.info(f"Resuming after image {state['last_id']} ({state['processed']} files already processed)")
+        return state
+    return {"last_id": 0, "processed": 0, "failed": 0, "skipped": 0, "only_missing": only_missing}
+
+
+def save_state(path: Path, state: Dict[str, Any]) -> None:
+    """原子写入检查点，中断时不会留下写了一半的状态文件"""
+    state["config"] = _config_fingerprint()
+    state["updated_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    tmp_path.write_text(json.dumps(state, indent=2, ensure_ascii=False))
+    os.replace(tmp_path, path)
+
+
+def needs_processing(filepath: str) -> bool:
+    """--only-missing：缺少任一当前规格的衍生图时需要处理"""
+    image_path = Path(filepath)
+    storage = get_storage()
+    return any(
+        not storage.exists(storage_key(get_rendition_path(image_path, name))) for name in settings.RENDITION_SIZES
+    )
+
+
+class RateLimiter:
+    """按固定速率放行（每秒 rate 个），rate 为0时不限速"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = time.monotonic()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if self._next > now:
+            time.sleep(self._next - now)
+        self._next = max(self._next, now) + self.interval
+
+
+def reprocess(
+    *,
+    batch_size: int,
+    workers: int,
+    rate_limit: float,
+    only_missing: bool,
+    dry_run: bool,
+    state_file: Path,
+    restart: bool,
+) -> None:
+    state = load_state(state_file, restart, only_missing)
+    limiter = RateLimiter(rate_limit)
+    db = SessionLocal()
+    executor: Optional[ProcessPoolExecutor] = None if dry_run else ProcessPoolExecutor(max_workers=workers)
+    started = time.monotonic()
+    files_this_run = 0
+    try:
+        # 元数据不完整的记录一定要处理；元数据完整的记录在 --only-missing 时再检查衍生图文件
+        missing_info = or_(*[getattr(Image, field).is_(None) for field in REPROCESS_FIELDS]).label("missing_info")
+        base_query = db.query(Image.id, Image.filepath, missing_info)
+        total = db.query(Image.id).filter(Image.id > state["last_id"]).count()
+        logger.info(f"{total} images to scan with {workers} workers{' (dry run)' if dry_run else ''}")
+        scanned = 0
+
+        while True:
+            rows = (
+                base_query.filter(Image.id > state["last_id"])
+                .order_by(Image.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                break
+            scanned += len(rows)
+
+            # 秒传记录与原图共用文件，同一文件只处理一次
+            rows_by_file: Dict[str, List[int]] = {}
+            files_missing_info = set()
+            for image_id, filepath, row_missing_info in rows:
+                if filepath:
+                    rows_by_file.setdefault(filepath, []).append(image_id)
+                    if row_missing_info:
+                        files_missing_info.add(filepath)
+            files = [
+                filepath for filepath in rows_by_file
+                if get_storage().exists(storage_key(filepath))
+                and (not only_missing or filepath in files_missing_info or needs_processing(filepath))
+            ]
+            state["skipped"] += len(rows_by_file) - len(files)
+
+            if dry_run:
+                state["processed"] += len(files)
+            else:
+                futures = {}
+                for filepath in files:
+                    limiter.wait()
+                    futures[executor.submit(_rerender, filepath)] = filepath
+                mappings = []
+                blob_sizes: Dict[str, int] = {}
+                for future in as_completed(futures):
+                    filepath = futures[future]
+                    try:
+                        info = future.result()
+                    except Exception as e:
+                        logger.warning(f"Could not reprocess {filepath}: {e}")
+                        state["failed"] += 1
+                        continue
+                    mappings.extend({"id": image_id, **info} for image_id in rows_by_file[filepath])
+                    blob_sizes[filepath] = info["file_size"]
+                    state["processed"] += 1
+                if mappings:
+                    db.bulk_update_mappings(Image, mappings)
+                    # 感知哈希可能变化，记录写入时间供运行中的API进程刷新索引
+                    touch_phash(db, (mapping["id"] for mapping in mappings))
+                    # 内容寻址文件的大小随重新编码变化
+                    for filepath, size in blob_sizes.items():
+                        db.query(Blob).filter(Blob.path == filepath).update(
+                            {Blob.size: size}, synchronize_session=False
+                        )
+                    db.commit()
+
+            files_this_run += len(files)
+            state["last_id"] = rows[-1].id
+            if not dry_run:
+                save_state(state_file, state)
+
+            elapsed = time.monotonic() - started
+            rate = files_this_run / elapsed if elapsed else 0.0
+            remaining = (total - scanned) / (scanned / elapsed) if scanned and elapsed else 0.0
+            logger.info(
+                f"Up to image {state['last_id']}: {scanned}/{total} rows scanned, {files_this_run} files "
+                f"({rate:.1f} files/s), {state['failed']} failed, {state['skipped']} skipped, "
+                f"ETA {remaining / 60:.1f} min"
+            )
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        db.close()
+
+    elapsed = time.monotonic() - started
+    logger.info(
+        f"Reprocess finished in {elapsed:.0f}s: {files_this_run} files "
+        f"({files_this_run / elapsed if elapsed else 0.0:.1f} files/s), {state['failed']} failed"
+    )
+    if not dry_run and files_this_run:
+        # 感知哈希可能变化，重建近似重复索引快照
+        db = SessionLocal()
+        try:
+            phash_index.rebuild(db)
+            phash_index.save()
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="工作进程数，默认CPU核数")
+    parser.add_argument("--rate-limit", type=float, default=0, help="每秒最多处理的文件数，0表示不限速")
+    parser.add_argument("--only-missing", action="store_true", help="只处理缺少当前规格衍生图或元数据的文件")
+    parser.add_argument("--dry-run", action="store_true", help="只统计将要处理的文件，不写入任何内容")
+    parser.add_argument("--state-file", type=Path, default=Path(DEFAULT_STATE_FILE), help="断点续跑的状态文件")
+    parser.add_argument("--restart", action="store_true", help="忽略状态文件，从头开始")
+    args = parser.parse_args()
+    reprocess(
+        batch_size=args.batch_size,
+        workers=args.workers,
+        rate_limit=args.rate_limit,
+        only_missing=args.only_missing,
+        dry_run=args.dry_run,
+        state_file=args.state_file,
+        restart=args.restart,
+    )
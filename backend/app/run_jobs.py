@@ -0,0 +1,61 @@
+"""
+独立运行持久化任务队列（job 表）的执行进程，与API进程分开扩展：
+可以同时运行多个（每个领取任务时跳过其他进程已锁定的任务），API进程可设置 JOB_WORKER_CONCURRENCY=0 不再执行任务。
+收到 SIGTERM/SIGINT 时停止领取，等待执行中的任务完成后退出（被强制结束时，任务在租约过期后由其他进程重新执行）。
+
+用法:
+    python app/run_jobs.py                        # 按 JOB_WORKER_CONCURRENCY 并发执行（至少1个）
+    python app/run_jobs.py --concurrency 8
+    python app/run_jobs.py --stats                # 按类型和状态统计任务数
+    python app/run_jobs.py --retry-dead           # 死信重新排队
+    python app/run_jobs.py --retry-dead --type ai_analysis
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import sys
+
+# Add the project root directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+import app.models  # noqa: F401  确保所有模型已注册（关系映射需要）
+import app.services.ai_service  # noqa: F401  注册AI分析任务的处理函数
+from app.services.job_queue import job_worker, queue_stats, requeue_dead
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def run(concurrency: int) -> None:
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, job_worker.request_stop)
+    job_worker.start(concurrency)
+    await job_worker.wait_stopped()
+    await job_worker.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=max(1, settings.JOB_WORKER_CONCURRENCY), help="并发执行的任务数")
+    parser.add_argument("--stats", action="store_true", help="输出任务统计后退出")
+    parser.add_argument("--retry-dead", action="store_true", help="把死信重新排队后退出")
+    parser.add_argument("--type", help="--retry-dead 只处理此类型的任务")
+    args = parser.parse_args()
+
+    if args.stats or args.retry_dead:
+        db = SessionLocal()
+        try:
+            if args.retry_dead:
+                logger.info(f"Requeued {requeue_dead(db, job_type=args.type)} dead jobs")
+            if args.stats:
+                print(json.dumps(queue_stats(db), indent=2, ensure_ascii=False))
+        finally:
+            db.close()
+    else:
+        asyncio.run(run(args.concurrency))
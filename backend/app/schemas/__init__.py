@@ -16,7 +16,7 @@ from .department import (
     DepartmentDeletionCheck,
     UserReference,
 )
-from .image import Image, ImageCreate, ImageUpdate, ImageSimple
+from .image import Image, ImageCreate, ImageUpdate, ImageSimple, ImageBatchItem, ImageBatchResult, ImageHashCheck, ImageHashCheckResult, ImageNearDuplicate
 from .gallery import Gallery, GalleryCreate, GalleryUpdate, GalleryWithImages, GalleryStats, GallerySimple
 from .link import Link, LinkCreate, LinkUpdate
 from .tag import Tag, TagCreate
@@ -25,6 +25,7 @@ from .topic import (
     Topic, TopicCreate, TopicUpdate, TopicDetail, TopicListItem,
     GalleryInTopic
 )
+from .upload_session import UploadSession, UploadSessionCreate
 from .user import (
     NewPassword,
     PasswordUpdate,
@@ -40,6 +41,7 @@ from .user import (
 # Rebuild models to resolve forward references
 Image.model_rebuild()
 ImageSimple.model_rebuild()
+ImageNearDuplicate.model_rebuild()
 Gallery.model_rebuild()
 GalleryWithImages.model_rebuild()
 GallerySimple.model_rebuild()
\ No newline at end of file
@@ -18,6 +18,20 @@ class GalleryStats(BaseModel):
     total_images: int
     top_liked_galleries: List[Dict[str, Any]] = []
 
+# --- 图集拼图：前几张图片合成的一张图片及各格子在其中的像素坐标 ---
+class ContactSheetTile(BaseModel):
+    image_id: int
+    x: int
+    y: int
+    width: int
+    height: int
+
+class ContactSheet(BaseModel):
+    url: str
+    width: int
+    height: int
+    tiles: List[ContactSheetTile] = []
+
 # --- 简化的图集Schema，用于在图片中引用，避免循环引用 ---
 class GallerySimple(BaseModel):
     id: int
@@ -30,6 +44,7 @@ class GallerySimple(BaseModel):
     views_count: int = 0
     likes_count: int = 0
     bookmarks_count: int = 0
+    downloads_count: int = 0
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -52,7 +67,7 @@ class GalleryUpdate(BaseModel):
     cover_image_id: Optional[int] = None
     tags: Optional[str] = None  # 标签字符串（逗号分隔）
 
-# --- Schema for Reading Data (API Response) ---
+# --- Schema for Reading Data (API Response)，列表接口使用：不含图片列表，图片只在详情接口中返回 ---
 class Gallery(GalleryBase):
     id: int
     created_at: datetime
@@ -61,13 +76,14 @@ class Gallery(GalleryBase):
     owner: UserSimple
     category: Optional[Category] = None
     tags: List[Tag] = []
-    images: List["ImageSimple"] = []
     cover_image: Optional["ImageSimple"] = None
     comments: List["Comment"] = []
     image_count: int = 0
     views_count: int = 0
     likes_count: int = 0
     bookmarks_count: int = 0
+    downloads_count: int = 0
+    contact_sheet: Optional[ContactSheet] = None
     liked_by_current_user: bool = False
     bookmarked_by_current_user: bool = False
 
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional, List, Any, TYPE_CHECKING
+from typing import Optional, List, Dict, Any, TYPE_CHECKING
 from datetime import datetime
 from .tag import Tag
 from .category import Category
@@ -18,6 +18,16 @@ class ImageSimple(BaseModel):
     description: Optional[str] = None
     filename: str
     image_url: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+    medium_url: Optional[str] = None
+    large_url: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    file_size: Optional[int] = None
+    file_type: Optional[str] = None
+    blurhash: Optional[str] = None
+    taken_at: Optional[datetime] = None
+    camera_model: Optional[str] = None
     created_at: datetime
     owner_id: int
     owner: UserSimple
@@ -59,6 +69,18 @@ class Image(ImageBase):
     id: int
     filename: str
     image_url: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+    medium_url: Optional[str] = None
+    large_url: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    file_size: Optional[int] = None
+    file_type: Optional[str] = None
+    blurhash: Optional[str] = None
+    # EXIF元数据：拍摄时间、相机型号，以及完整的 exif（GPS仅对图片所有者返回）
+    taken_at: Optional[datetime] = None
+    camera_model: Optional[str] = None
+    exif: Optional[Dict[str, Any]] = None
     created_at: datetime
     owner_id: int
     owner: UserSimple
@@ -75,5 +97,38 @@ class Image(ImageBase):
     bookmarked_by_current_user: bool = False
     is_cover_image: Optional[bool] = False
     comments: List["Comment"] = []
+    # 上传响应中：感知哈希相近的已有图片ID（可能是重复上传）
+    possible_duplicate_ids: List[int] = []
 
-    model_config = ConfigDict(from_attributes=True) 
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True) 
+
+# --- 批量上传结果 ---
+class ImageBatchItem(BaseModel):
+    filename: str  # 客户端上传时的原始文件名
+    status: str  # created, fast_upload, failed
+    image_id: Optional[int] = None
+    file_hash: Optional[str] = None
+    image_url: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+    possible_duplicate_ids: List[int] = []
+    error: Optional[str] = None
+
+class ImageBatchResult(BaseModel):
+    gallery_id: Optional[int] = None
+    created: int = 0
+    fast_uploaded: int = 0
+    failed: int = 0
+    items: List[ImageBatchItem] = []
+
+# --- 近似重复查询结果 ---
+class ImageNearDuplicate(BaseModel):
+    distance: int  # 感知哈希的汉明距离，0 表示几乎相同
+    image: Image
+
+# --- 上传前的哈希预检 ---
+class ImageHashCheck(BaseModel):
+    hashes: List[str]  # 客户端计算的SHA-256（十六进制）
+
+class ImageHashCheckResult(BaseModel):
+    existing: Dict[str, int] = {}  # 已存在的哈希 -> 图片ID，可直接秒传
+    missing: List[str] = []  # 服务端没有的哈希，需要上传文件
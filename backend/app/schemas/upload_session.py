@@ -0,0 +1,28 @@
+from pydantic import BaseModel, Field, ConfigDict
+from typing import Optional
+from datetime import datetime
+
+
+class UploadSessionCreate(BaseModel):
+    filename: str = Field(..., max_length=255)
+    total_size: int = Field(..., gt=0, description="文件总字节数")
+    file_hash: Optional[str] = Field(None, description="文件SHA-256，完成上传时与服务端计算结果比对")
+    title: str
+    description: Optional[str] = None
+    tags: Optional[str] = None  # 标签字符串（逗号分隔）
+    category_id: Optional[int] = None
+    topic_id: Optional[int] = None
+    gallery_id: Optional[int] = None
+    gallery_folder: Optional[str] = None
+
+
+class UploadSession(BaseModel):
+    id: str
+    filename: str
+    total_size: int
+    received_size: int
+    expires_at: datetime
+    chunk_size: int = 0  # 建议的分片大小
+    completed: bool = False
+
+    model_config = ConfigDict(from_attributes=True)
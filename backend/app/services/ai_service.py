@@ -6,10 +6,13 @@ from pathlib import Path
 from typing import Dict, List, Optional, Tuple, Any
 from sqlalchemy.orm import Session
 
+from app.core.storage import get_storage, storage_key
 from app.crud.crud_settings import settings as crud_settings
 from app.crud.crud_image import image as crud_image
 from app.crud.crud_tag import get_or_create_tags
 from app.models.image import Image
+from app.models.job import Job
+from app.services.job_queue import enqueue, job_handler
 
 logger = logging.getLogger(__name__)
 
@@ -252,6 +255,10 @@ class OllamaService:
             'tags': tags[:8]  # 限制标签数量
         }
 
+class AIAnalysisUnavailable(Exception):
+    """模型服务调用失败（超时、服务未启动、返回内容无法解析），可以稍后重试"""
+
+
 class AIAnalysisService:
     """AI分析服务管理器"""
     
@@ -274,8 +281,9 @@ class AIAnalysisService:
                 self._update_ai_status(db, image_id, "failed", "图片文件路径为空")
                 return False
                 
-            image_path = Path(str(filepath))
-            if not image_path.exists():
+            storage = get_storage()
+            key = storage_key(filepath)
+            if not storage.exists(key):
                 logger.error(f"Image file not found: {filepath}")
                 self._update_ai_status(db, image_id, "failed", "图片文件不存在")
                 return False
@@ -284,17 +292,16 @@ class AIAnalysisService:
             self._update_ai_status(db, image_id, "processing")
             logger.info(f"Starting AI analysis for image {image_id}, file: {filepath}")
             
-            # 调用AI分析
+            # 调用AI分析（对象存储中的文件先下载到本地临时文件）
             try:
-                analysis_result = await self.ollama_service.analyze_image(db, image_path)
+                with storage.local_file(key) as image_path:
+                    analysis_result = await self.ollama_service.analyze_image(db, image_path)
                 logger.info(f"AI analysis successful for image {image_id}: {analysis_result}")
             except Exception as ai_error:
+                # 模型服务暂时不可用：恢复为等待状态并抛出，由任务队列按退避间隔重试（次数用尽后标记为失败）
                 logger.error(f"AI analysis failed for image {image_id}: {ai_error}")
-                # 使用默认结果而不是失败
-                analysis_result = {
-                    'description': f"AI分析暂时不可用: {str(ai_error)[:100]}",
-                    'tags': ["待分析"]
-                }
+                self._update_ai_status(db, image_id, "pending")
+                raise AIAnalysisUnavailable(str(ai_error)) from ai_error
             
             # 处理AI标签
             ai_tags = analysis_result.get('tags', [])
@@ -323,6 +330,8 @@ class AIAnalysisService:
             logger.info(f"Successfully completed AI analysis for image {image_id}")
             return True
             
+        except AIAnalysisUnavailable:
+            raise
         except Exception as e:
             logger.error(f"Failed to process image analysis for {image_id}: {e}")
             self._update_ai_status(db, image_id, "failed", str(e))
@@ -342,4 +351,21 @@ class AIAnalysisService:
             logger.error(f"Failed to update AI status for image {image_id}: {e}")
 
 # 全局服务实例
-ai_analysis_service = AIAnalysisService() 
\ No newline at end of file
+ai_analysis_service = AIAnalysisService()
+
+AI_ANALYSIS_JOB = "ai_analysis"
+
+
+def _mark_analysis_failed(db: Session, payload: Dict[str, Any], error: str) -> None:
+    """重试次数用尽（死信）：图片标记为分析失败，可通过 POST /{image_id}/analyze 重新触发"""
+    ai_analysis_service._update_ai_status(db, payload["image_id"], "failed", error[:200])
+
+
+@job_handler(AI_ANALYSIS_JOB, on_dead=_mark_analysis_failed)
+async def run_ai_analysis_job(db: Session, payload: Dict[str, Any]) -> None:
+    await ai_analysis_service.process_image_analysis(db, payload["image_id"])
+
+
+def enqueue_ai_analysis(db: Session, image_id: int, commit: bool = True) -> Job:
+    """添加图片AI分析任务（同一图片的任务排队或执行期间不重复添加）"""
+    return enqueue(db, AI_ANALYSIS_JOB, {"image_id": image_id}, dedupe_key=f"{AI_ANALYSIS_JOB}:{image_id}", commit=commit)
@@ -0,0 +1,135 @@
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.image_utils import UPLOAD_CHUNK_SIZE
+from app.crud.crud_upload_session import upload_session as crud_upload_session
+
+try:
+    import fcntl
+except ImportError:  # Windows 开发环境没有 fcntl，只在进程内互斥
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# 会话ID -> (已计入哈希的字节数, sha256对象)
+# 分片按顺序追加，哈希随之增量更新；进程重启或请求落到其他worker时缓存缺失，按需从分片文件重建
+_hashers: Dict[str, Tuple[int, Any]] = {}
+_hashers_lock = threading.Lock()
+
+# 没有 fcntl 时，进程内正在写入的会话
+_writing: Set[str] = set()
+_writing_lock = threading.Lock()
+
+
+class PartFileBusy(Exception):
+    """分片文件正被其他请求写入"""
+
+
+def get_part_path(session_id: str) -> Path:
+    """返回会话对应的分片临时文件路径（并确保目录存在）"""
+    directory = Path(settings.UPLOAD_SESSION_DIRECTORY)
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory / f"{session_id}.part"
+
+
+def acquire_part(session_id: str) -> BinaryIO:
+    """
+    以独占方式打开会话的分片文件用于写入，已被占用时抛出 PartFileBusy。
+    文件锁（flock）跨进程有效，随文件关闭释放，不需要额外清理。
+    """
+    part = get_part_path(session_id).open("r+b")
+    try:
+        if fcntl is not None:
+            fcntl.flock(part, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            with _writing_lock:
+                if session_id in _writing:
+                    raise PartFileBusy(session_id)
+                _writing.add(session_id)
+    except BlockingIOError:
+        part.close()
+        raise PartFileBusy(session_id)
+    except BaseException:
+        part.close()
+        raise
+    return part
+
+
+def release_part(session_id: str, part: BinaryIO) -> None:
+    part.close()
+    if fcntl is None:
+        with _writing_lock:
+            _writing.discard(session_id)
+
+
+@contextmanager
+def locked_part(session_id: str) -> Iterator[BinaryIO]:
+    part = acquire_part(session_id)
+    try:
+        yield part
+    finally:
+        release_part(session_id, part)
+
+
+def get_hasher(session_id: str, offset: int):
+    """
+    取得与分片文件前 offset 字节对应的SHA-256对象。
+    缓存命中时直接复用；否则读取分片文件的前 offset 字节重建（只在缓存缺失时发生）。
+    """
+    with _hashers_lock:
+        cached = _hashers.get(session_id)
+    if cached and cached[0] == offset:
+        return cached[1].copy()
+
+    hasher = hashlib.sha256()
+    remaining = offset
+    if remaining:
+        with get_part_path(session_id).open("rb") as part:
+            while remaining:
+                chunk = part.read(min(UPLOAD_CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise ValueError(f"Part file of upload session {session_id} is shorter than {offset} bytes")
+                hasher.update(chunk)
+                remaining -= len(chunk)
+    logger.info(f"Rebuilt hash state for upload session {session_id} at offset {offset}")
+    return hasher
+
+
+def store_hasher(session_id: str, offset: int, hasher) -> None:
+    with _hashers_lock:
+        _hashers[session_id] = (offset, hasher)
+
+
+def discard(session_id: str) -> None:
+    """删除会话的哈希缓存和分片文件"""
+    with _hashers_lock:
+        _hashers.pop(session_id, None)
+    get_part_path(session_id).unlink(missing_ok=True)
+
+
+def purge_expired_sessions(db: Session, *, batch_size: int = 100) -> int:
+    """
+    清理已过期的上传会话及其分片文件，返回清理的会话数量。
+    """
+    purged = 0
+    while True:
+        expired = crud_upload_session.get_expired(db, limit=batch_size)
+        if not expired:
+            break
+        for session in expired:
+            discard(session.id)
+            db.delete(session)
+        db.commit()
+        purged += len(expired)
+        if len(expired) < batch_size:
+            break
+    if purged:
+        logger.info(f"Purged {purged} expired upload sessions")
+    return purged
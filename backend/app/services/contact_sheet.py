@@ -0,0 +1,231 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from PIL import Image as PILImage, ImageOps
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.image_utils import draft_for_size, get_rendition_path, image_version, versioned_url
+from app.core.storage import get_storage, publish_files, storage_key, storage_path
+from app.db.session import SessionLocal
+from app.models.gallery import Gallery
+from app.models.image import Image
+
+logger = logging.getLogger(__name__)
+
+# 缺少文件的格子的底色（与前端无图占位的背景色一致）
+_BACKGROUND = (245, 245, 245)
+# 响应中每个格子的字段（存储的数据另外记录图片版本，用于判断格子是否变化）
+_TILE_FIELDS = ("image_id", "x", "y", "width", "height")
+
+
+def _layout() -> Dict[str, int]:
+    """影响拼图内容的配置，与格子列表一起决定拼图是否需要重新生成"""
+    return {
+        "tile_size": settings.CONTACT_SHEET_TILE_SIZE,
+        "columns": max(1, settings.CONTACT_SHEET_COLUMNS),
+        "quality": settings.CONTACT_SHEET_QUALITY,
+    }
+
+
+def _identity(tile: Dict[str, Any]) -> Tuple[int, str]:
+    return tile["image_id"], tile["version"]
+
+
+def _sheet_images(db: Session, gallery: Gallery) -> List[Image]:
+    """拼图中的图片：封面在前，其余按上传顺序，最多 CONTACT_SHEET_TILES 张"""
+    images: List[Image] = []
+    if gallery.cover_image_id:
+        cover = db.query(Image).get(gallery.cover_image_id)
+        if cover is not None:
+            images.append(cover)
+    query = db.query(Image).filter(Image.gallery_id == gallery.id)
+    if images:
+        query = query.filter(Image.id != images[0].id)
+    images += query.order_by(Image.id).limit(max(0, settings.CONTACT_SHEET_TILES - len(images))).all()
+    return images
+
+
+def _tile_source(filepath: str) -> Optional[str]:
+    """
+    格子使用的文件（存储key）：最长边不小于格子两倍的最小衍生图（宽高比在2:1以内的图片中心裁切为正方形后不需要放大），
+    没有合适的衍生图时使用原图。
+    """
+    storage = get_storage()
+    image_path = Path(filepath)
+    for name, size in sorted(settings.RENDITION_SIZES.items(), key=lambda item: item[1]):
+        if size < 2 * settings.CONTACT_SHEET_TILE_SIZE:
+            continue
+        rendition_key = storage_key(get_rendition_path(image_path, name))
+        if storage.exists(rendition_key):
+            return rendition_key
+    image_key = storage_key(image_path)
+    return image_key if storage.exists(image_key) else None
+
+
+def _render_tile(key: str, size: int) -> PILImage.Image:
+    """中心裁切为 size x size 的正方形格子"""
+    with get_storage().local_file(key) as path, PILImage.open(path) as img:
+        # 短边缩放到格子大小即可，JPEG在解码阶段直接缩小
+        scale = size / min(img.size)
+        draft_for_size(img, (math.ceil(img.width * scale), math.ceil(img.height * scale)))
+        return ImageOps.fit(img.convert("RGB"), (size, size), PILImage.LANCZOS)
+
+
+def _open_sheet(key: str) -> Optional[PILImage.Image]:
+    try:
+        with get_storage().local_file(key) as path, PILImage.open(path) as img:
+            return img.convert("RGB")
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read contact sheet {key}: {e}")
+        return None
+
+
+def _save_sheet(sheet: PILImage.Image, key: str, quality: int) -> None:
+    """先写入同目录下的临时文件再原子替换（同一内容的拼图key相同，可能正被读取），然后写入存储后端"""
+    path = storage_path(key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        sheet.save(tmp_path, "JPEG", quality=quality, optimize=True)
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    publish_files([path], content_type="image/jpeg")
+
+
+def refresh_contact_sheet(db: Session, gallery_id: int, force: bool = False) -> bool:
+    """
+    按图集当前的前几张图片更新拼图，返回是否有变化。
+    格子列表（图片ID和内容版本）与布局都没有变化时不做任何操作；有变化时，未变的格子从旧拼图中原样裁出复用
+    （格子边长是8的倍数，按块对齐，同质量重新编码几乎无损），只解码新增或内容变化的图片。
+    拼图按内容摘要命名，URL随内容变化，可以永久缓存；旧版本由文件回收任务清理。
+    force 为 True 时不复用旧拼图，全部重新生成。
+    """
+    gallery = db.query(Gallery).get(gallery_id)
+    if gallery is None:
+        return False
+
+    images = _sheet_images(db, gallery) if settings.CONTACT_SHEET_TILES > 0 else []
+    previous = gallery.contact_sheet_data
+    if not images:
+        if previous is None:
+            return False
+        gallery.contact_sheet_data = None
+        db.commit()
+        return True
+
+    layout = _layout()
+    tiles = [{"image_id": image.id, "version": image_version(image)} for image in images]
+    same_layout = bool(previous) and previous.get("layout") == layout
+    if (
+        not force and same_layout
+        and [_identity(tile) for tile in previous["tiles"]] == [_identity(tile) for tile in tiles]
+    ):
+        return False
+
+    old_boxes: Dict[Tuple[int, str], Tuple[int, int, int, int]] = {}
+    old_sheet = None
+    if same_layout and not force:
+        old_boxes = {
+            _identity(tile): (tile["x"], tile["y"], tile["x"] + tile["width"], tile["y"] + tile["height"])
+            for tile in previous["tiles"]
+        }
+        if any(_identity(tile) in old_boxes for tile in tiles):
+            old_sheet = _open_sheet(previous["key"])
+
+    size = layout["tile_size"]
+    columns = min(layout["columns"], len(tiles))
+    rows = math.ceil(len(tiles) / columns)
+    sheet = PILImage.new("RGB", (columns * size, rows * size), _BACKGROUND)
+    reused = 0
+    for index, (tile, image) in enumerate(zip(tiles, images)):
+        x, y = index % columns * size, index // columns * size
+        tile.update(x=x, y=y, width=size, height=size)
+        box = old_boxes.get(_identity(tile))
+        if old_sheet is not None and box is not None:
+            sheet.paste(old_sheet.crop(box), (x, y))
+            reused += 1
+            continue
+        source = _tile_source(image.filepath) if image.filepath else None
+        if source is None:
+            logger.warning(f"Image file not found for contact sheet of gallery {gallery_id}: image {image.id}")
+            continue
+        try:
+            sheet.paste(_render_tile(source, size), (x, y))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read image {source} for contact sheet of gallery {gallery_id}: {e}")
+
+    version = hashlib.sha256(
+        json.dumps([layout, [_identity(tile) for tile in tiles]]).encode()
+    ).hexdigest()[:16]
+    key = f"{settings.CONTACT_SHEET_DIRECTORY.strip('/')}/{gallery_id}/{version}.jpg"
+    _save_sheet(sheet, key, layout["quality"])
+
+    gallery.contact_sheet_data = {
+        "key": key,
+        "version": version,
+        "layout": layout,
+        "width": sheet.width,
+        "height": sheet.height,
+        "tiles": tiles,
+    }
+    db.commit()
+    logger.info(f"Contact sheet of gallery {gallery_id} updated: {len(tiles)} tiles, {reused} reused")
+    return True
+
+
+def contact_sheet_info(data: Dict[str, Any]) -> Dict[str, Any]:
+    """响应中的拼图信息：带版本参数的URL、拼图尺寸和各格子坐标（像素，顺序与拼图中的图片顺序一致）"""
+    return {
+        "url": versioned_url(get_storage().url(data["key"]), data["version"]),
+        "width": data["width"],
+        "height": data["height"],
+        "tiles": [{field: tile[field] for field in _TILE_FIELDS} for tile in data["tiles"]],
+    }
+
+
+class ContactSheetRefresher:
+    """
+    在后台线程中刷新拼图，请求线程只登记图集ID，不等待图片解码和写入。
+    同一图集排队期间的多次变化（批量上传、逐张删除）只刷新一次。
+    """
+
+    def __init__(self):
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def schedule(self, gallery_id: int) -> None:
+        if settings.CONTACT_SHEET_TILES <= 0:
+            return
+        with self._lock:
+            if gallery_id in self._pending:
+                return
+            self._pending.add(gallery_id)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="contact-sheet")
+            self._executor.submit(self._refresh, gallery_id)
+
+    def _refresh(self, gallery_id: int) -> None:
+        # 开始处理前移出排队集合，处理期间的新变化会再排一次
+        with self._lock:
+            self._pending.discard(gallery_id)
+        db = SessionLocal()
+        try:
+            refresh_contact_sheet(db, gallery_id)
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"Could not refresh contact sheet of gallery {gallery_id}: {e}")
+        finally:
+            db.close()
+
+
+contact_sheet_refresher = ContactSheetRefresher()
@@ -0,0 +1,392 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path, PurePosixPath
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.image_utils import get_rendition_path
+from app.core.storage import (
+    LocalStorage, StorageBackend, StoredObject, get_quarantine_storage, get_storage, storage_key, storage_path
+)
+from app.crud.crud_blob import blob as crud_blob
+from app.db.session import SessionLocal
+from app.models.blob import Blob
+from app.models.gallery import Gallery
+from app.models.image import Image
+
+try:
+    import fcntl
+except ImportError:  # Windows 开发环境没有 fcntl，不做跨进程互斥
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# 隔离区中每次回收一个子目录（前缀），以回收时间命名，便于按保留期整批清理
+_RUN_DIRECTORY_FORMAT = "%Y%m%d%H%M%S"
+_LOCK_FILENAME = ".gc.lock"
+# 上传临时文件（.<uuid>.upload）和存储写入中的临时文件（.<文件名>.<随机串>.tmp）
+_TEMP_SUFFIXES = (".upload", ".tmp")
+_IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp")
+
+
+def _lock_path() -> Path:
+    """进程间互斥的锁文件（本地文件，不随存储后端变化）"""
+    root = Path(settings.GC_QUARANTINE_DIRECTORY)
+    root.mkdir(parents=True, exist_ok=True)
+    return root / _LOCK_FILENAME
+
+
+def _new_stats() -> Dict[str, int]:
+    return {
+        "scanned": 0,
+        "orphans": 0,
+        "quarantined_bytes": 0,
+        "released_blobs": 0,
+        "restored": 0,
+        "purged": 0,
+        "reclaimed_bytes": 0,
+        "staging_removed": 0,
+    }
+
+
+def _base_key(key: str) -> str:
+    """衍生图（<原文件名>_<规格名>.jpg）对应的原图key，其他文件返回自身"""
+    for name in settings.RENDITION_SIZES:
+        suffix = f"_{name}.jpg"
+        if key.endswith(suffix):
+            return key[:-len(suffix)] + ".jpg"
+    return key
+
+
+def _legacy_referenced_keys(db: Session) -> Set[str]:
+    """
+    历史记录中不是标准形式（<UPLOAD_DIRECTORY>/<key>）的路径，例如绝对路径、Windows反斜杠路径
+    （uploads\\gallery_56\\<uuid>.jpg），经 storage_key 转换为key。
+    这些路径无法按key直接查询，每次回收读取一次；新记录都按标准形式写入，这部分不随图库增长。
+    """
+    prefix = str(Path(settings.UPLOAD_DIRECTORY)) + os.sep
+    irregular = ~Image.filepath.startswith(prefix, autoescape=True)
+    if os.sep != "\\":
+        irregular = irregular | Image.filepath.contains("\\", autoescape=True)
+    return {
+        storage_key(filepath)
+        for (filepath,) in db.query(Image.filepath).filter(irregular).distinct().yield_per(settings.GC_BATCH_SIZE)
+    }
+
+
+def _referenced_among(db: Session, keys: Iterable[str], legacy: Set[str]) -> Set[str]:
+    """
+    keys（原图key）中仍被引用的部分：按标准路径查询图片记录的 filepath（有索引），
+    内容寻址文件按文件名中的哈希查询引用计数 > 0 的记录，历史路径在 legacy 中查找。
+    调用方按 GC_BATCH_SIZE 分批传入，内存只与批大小有关。
+    """
+    keys = set(keys)
+    if not keys:
+        return set()
+    paths = {str(storage_path(key)): key for key in keys}
+    referenced = keys & legacy
+    referenced.update(paths[path] for (path,) in db.query(Image.filepath).filter(Image.filepath.in_(list(paths))))
+    blob_prefix = settings.BLOB_DIRECTORY.strip("/") + "/"
+    hashes = {PurePosixPath(key).stem: key for key in keys if key.startswith(blob_prefix)}
+    if hashes:
+        referenced.update(
+            hashes[file_hash]
+            for (file_hash,) in db.query(Blob.hash).filter(Blob.hash.in_(list(hashes)), Blob.refcount > 0)
+        )
+    return referenced
+
+
+def _is_collectable(key: str) -> bool:
+    """
+    可能是孤儿的文件：图片文件（含衍生图）以及中断的上传、写入一半的临时文件。
+    其他文件（.gitkeep、说明文件等）和 GC_EXCLUDED_FILES 中的静态文件（默认专题封面等）不回收。
+    """
+    if key in settings.GC_EXCLUDED_FILES:
+        return False
+    name = PurePosixPath(key).name
+    if name.startswith("."):
+        return name.endswith(_TEMP_SUFFIXES)
+    return name.lower().endswith(_IMAGE_SUFFIXES)
+
+
+def _local_excluded_keys() -> Set[str]:
+    """位于 UPLOAD_DIRECTORY 之下的本地工作目录（隔离目录、渲染缓存、分片上传），遍历时跳过"""
+    upload_dir = os.path.abspath(settings.UPLOAD_DIRECTORY)
+    excluded = set()
+    for directory in (
+        settings.GC_QUARANTINE_DIRECTORY, settings.RENDER_CACHE_DIRECTORY, settings.UPLOAD_SESSION_DIRECTORY,
+    ):
+        relative = os.path.relpath(os.path.abspath(directory), upload_dir)
+        if not relative.startswith(os.pardir):
+            excluded.add(relative)
+    return excluded
+
+
+def _restore_referenced(
+    db: Session,
+    storage: StorageBackend,
+    quarantine: StorageBackend,
+    run: str,
+    moved: List[str],
+    stats: Dict[str, int],
+    legacy: Set[str],
+) -> Set[str]:
+    """把隔离后又被引用的文件移回原位置（例如回收期间同一内容被重新上传），返回恢复的key"""
+    restored: Set[str] = set()
+    for start in range(0, len(moved), settings.GC_BATCH_SIZE):
+        batch = moved[start:start + settings.GC_BATCH_SIZE]
+        referenced = _referenced_among(db, (_base_key(key) for key in batch), legacy)
+        for key in batch:
+            if _base_key(key) not in referenced or key in restored:
+                continue
+            if quarantine.move(f"{run}/{key}", storage, key) is not None:
+                restored.add(key)
+                stats["restored"] += 1
+    return restored
+
+
+def _collect_released_blobs(
+    db: Session,
+    storage: StorageBackend,
+    quarantine: StorageBackend,
+    run: str,
+    stats: Dict[str, int],
+    dry_run: bool,
+    legacy: Set[str],
+) -> None:
+    """回收引用计数已归零的内容寻址文件（删除图片时只减少了计数）"""
+    moved: List[str] = []
+    after_hash = ""
+    while True:
+        blobs = crud_blob.get_unreferenced(db, after_hash=after_hash, limit=settings.GC_BATCH_SIZE)
+        if not blobs:
+            break
+        after_hash = blobs[-1].hash
+        for blob in blobs:
+            if dry_run:
+                stats["released_blobs"] += 1
+                continue
+            # 条件删除：计数在此期间被重新增加时删除落空，文件保留
+            path = crud_blob.delete_unreferenced(db, file_hash=blob.hash)
+            if not path:
+                continue
+            stats["released_blobs"] += 1
+            image_path = Path(path)
+            for file_path in [image_path] + [get_rendition_path(image_path, name) for name in settings.RENDITION_SIZES]:
+                key = storage_key(file_path)
+                size = storage.move(key, quarantine, f"{run}/{key}")
+                if size is not None:
+                    stats["quarantined_bytes"] += size
+                    moved.append(key)
+    if moved:
+        _restore_referenced(db, storage, quarantine, run, moved, stats, legacy)
+
+
+def _collect_orphans(
+    db: Session,
+    storage: StorageBackend,
+    quarantine: StorageBackend,
+    run: str,
+    stats: Dict[str, int],
+    dry_run: bool,
+    legacy: Set[str],
+) -> None:
+    """
+    遍历存储中的文件，按key与数据库中的文件路径做差集：既不被图片记录、也不被内容寻址文件引用的图片文件为孤儿文件。
+    候选文件按 GC_BATCH_SIZE 分批查询数据库，不把全部引用读入内存。
+    中断的上传、写入一半的临时文件超过最短保留时间即视为孤儿。
+    本地存储顺带删除内容寻址目录之外的空目录（历史的图集文件夹）。
+    """
+    # 拼图不属于图片记录，由 _collect_stale_contact_sheets 按图集引用单独回收
+    excluded = set(settings.GC_EXCLUDED_DIRECTORIES) | {settings.CONTACT_SHEET_DIRECTORY.strip("/")}
+    if storage.is_local:
+        excluded.update(_local_excluded_keys())
+    else:
+        excluded.add(settings.GC_QUARANTINE_DIRECTORY.strip("/"))
+    cutoff = time.time() - settings.GC_MIN_FILE_AGE
+
+    candidates: List[StoredObject] = []
+
+    def flush() -> None:
+        # 引用在每批检查时读取；隔离后再按最新引用核对一次，期间被重新引用的文件（秒传复用历史文件）移回原位置
+        referenced = _referenced_among(
+            db, (_base_key(obj.key) for obj in candidates if not PurePosixPath(obj.key).name.startswith(".")), legacy
+        )
+        moved: List[str] = []
+        for obj in candidates:
+            if not PurePosixPath(obj.key).name.startswith(".") and _base_key(obj.key) in referenced:
+                continue
+            stats["orphans"] += 1
+            if dry_run:
+                stats["quarantined_bytes"] += obj.size
+                continue
+            size = storage.move(obj.key, quarantine, f"{run}/{obj.key}")
+            if size is not None:
+                stats["quarantined_bytes"] += size
+                moved.append(obj.key)
+        if moved:
+            _restore_referenced(db, storage, quarantine, run, moved, stats, legacy)
+        candidates.clear()
+
+    for obj in storage.iter_objects(exclude=excluded, prune_empty_before=cutoff):
+        stats["scanned"] += 1
+        if obj.modified >= cutoff or not _is_collectable(obj.key):
+            continue
+        candidates.append(obj)
+        if len(candidates) >= settings.GC_BATCH_SIZE:
+            flush()
+    flush()
+
+
+def _collect_stale_contact_sheets(
+    db: Session, storage: StorageBackend, quarantine: StorageBackend, run: str, stats: Dict[str, int], dry_run: bool
+) -> None:
+    """不再被任何图集引用的拼图（重新生成后的旧版本、已删除图集的拼图）移入隔离区"""
+    current = {data["key"] for (data,) in db.query(Gallery.contact_sheet_data) if data}
+    cutoff = time.time() - settings.GC_MIN_FILE_AGE
+    prefix = settings.CONTACT_SHEET_DIRECTORY.strip("/") + "/"
+    for obj in storage.iter_objects(prefix=prefix, prune_empty_before=cutoff):
+        stats["scanned"] += 1
+        if obj.modified >= cutoff or obj.key in current:
+            continue
+        stats["orphans"] += 1
+        if dry_run:
+            stats["quarantined_bytes"] += obj.size
+        else:
+            stats["quarantined_bytes"] += storage.move(obj.key, quarantine, f"{run}/{obj.key}") or 0
+
+
+def _clean_staging(stats: Dict[str, int], dry_run: bool) -> None:
+    """
+    远程存储模式下，本地暂存目录中的文件在写入存储后即删除；
+    超过最短保留时间仍留在暂存目录的文件是中断的上传或处理留下的，直接删除。
+    """
+    staging = LocalStorage(Path(settings.UPLOAD_DIRECTORY))
+    cutoff = time.time() - settings.GC_MIN_FILE_AGE
+    for obj in staging.iter_objects(exclude=_local_excluded_keys(), prune_empty_before=cutoff):
+        if obj.modified >= cutoff:
+            continue
+        stats["staging_removed"] += 1
+        if not dry_run:
+            staging.delete(obj.key)
+
+
+def purge_quarantine(
+    db: Session,
+    stats: Optional[Dict[str, int]] = None,
+    retention_hours: Optional[int] = None,
+    legacy: Optional[Set[str]] = None,
+) -> Dict[str, int]:
+    """
+    永久删除超过保留期的隔离文件，统计回收的字节数。
+    删除前再次核对引用，期间又被引用的文件移回原位置。legacy 为本次回收已读取的历史路径key。
+    """
+    stats = stats if stats is not None else _new_stats()
+    legacy = _legacy_referenced_keys(db) if legacy is None else legacy
+    retention_hours = settings.GC_QUARANTINE_RETENTION_HOURS if retention_hours is None else retention_hours
+    storage = get_storage()
+    quarantine = get_quarantine_storage()
+    cutoff = time.time() - retention_hours * 3600
+
+    # 隔离区按回收批次（<回收时间>/<原key>）组织，只收集已过保留期的批次
+    expired: Dict[str, Dict[str, int]] = {}
+    for obj in quarantine.iter_objects():
+        run, _, key = obj.key.partition("/")
+        try:
+            quarantined_at = datetime.strptime(run, _RUN_DIRECTORY_FORMAT).timestamp()
+        except ValueError:
+            continue
+        if key and quarantined_at <= cutoff:
+            expired.setdefault(run, {})[key] = obj.size
+
+    for run in sorted(expired):
+        files = expired[run]
+        restored = _restore_referenced(db, storage, quarantine, run, list(files), stats, legacy)
+        try:
+            quarantine.delete_prefix(run)
+        except Exception as e:
+            logger.warning(f"Could not purge quarantine batch {run}: {e}")
+            continue
+        for key, size in files.items():
+            if key not in restored:
+                stats["purged"] += 1
+                stats["reclaimed_bytes"] += size
+    return stats
+
+
+def collect_garbage(
+    db: Session, *, dry_run: bool = False, purge: bool = True, retention_hours: Optional[int] = None
+) -> Dict[str, int]:
+    """
+    一次完整的回收：
+    1. 引用计数归零的内容寻址文件移入隔离区；
+    2. 遍历存储，把不再被引用的孤儿文件和旧版本拼图移入隔离区（远程存储时另外清理本地暂存目录的残留文件）；
+    3. 永久删除超过保留期的隔离文件。
+    dry_run 时只统计，不移动也不删除文件。
+    """
+    stats = _new_stats()
+    storage = get_storage()
+    quarantine = get_quarantine_storage()
+    run = datetime.now().strftime(_RUN_DIRECTORY_FORMAT)
+    started = time.monotonic()
+
+    legacy = _legacy_referenced_keys(db)
+    _collect_released_blobs(db, storage, quarantine, run, stats, dry_run, legacy)
+    _collect_orphans(db, storage, quarantine, run, stats, dry_run, legacy)
+    _collect_stale_contact_sheets(db, storage, quarantine, run, stats, dry_run)
+    if not storage.is_local:
+        _clean_staging(stats, dry_run)
+    if purge and not dry_run:
+        purge_quarantine(db, stats, retention_hours=retention_hours, legacy=legacy)
+
+    logger.info(
+        f"File GC finished in {time.monotonic() - started:.1f}s: scanned {stats['scanned']} files, "
+        f"released {stats['released_blobs']} blobs, quarantined {stats['orphans']} orphans "
+        f"({stats['quarantined_bytes']} bytes), restored {stats['restored']}, "
+        f"purged {stats['purged']} files ({stats['reclaimed_bytes']} bytes reclaimed), "
+        f"removed {stats['staging_removed']} stale staging files"
+    )
+    return stats
+
+
+def run_exclusive(**kwargs) -> Optional[Dict[str, int]]:
+    """
+    在独立会话中执行一次回收；多个API进程（或与定时任务）同时触发时只有一个执行，其余返回None。
+    """
+    lock_file = open(_lock_path(), "w")
+    try:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                logger.info("File GC is already running in another process, skipping")
+                return None
+        db = SessionLocal()
+        try:
+            return collect_garbage(db, **kwargs)
+        finally:
+            db.close()
+    finally:
+        lock_file.close()
+
+
+def start_periodic_gc(stop_event: threading.Event) -> Optional[threading.Thread]:
+    """按 GC_INTERVAL 在后台线程中定期回收，GC_INTERVAL 为0时不启动"""
+    if settings.GC_INTERVAL <= 0:
+        return None
+
+    def loop() -> None:
+        while not stop_event.wait(settings.GC_INTERVAL):
+            try:
+                run_exclusive()
+            except Exception as e:
+                logger.error(f"File GC failed: {e}")
+
+    thread = threading.Thread(target=loop, name="file-gc", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,185 @@
+import asyncio
+import functools
+import logging
+import multiprocessing
+import threading
+from asyncio import FIRST_COMPLETED
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ImageWorkerBusy(Exception):
+    """图片处理队列已满，调用方应稍后重试"""
+
+
+class ImageWorkerPool:
+    """
+    图片处理进程池。
+
+    Pillow 的解码/缩放/水印是CPU密集型操作，放在API线程池里会长时间占用线程。
+    这里把这些工作提交到独立的进程池执行；在途任务数（执行中 + 排队中）
+    上限为 max_workers + queue_size，超出时立即抛出 ImageWorkerBusy，而不是无限排队。
+    run/run_many 在事件循环中等待结果，不占用API线程。
+    max_workers 为 0 时在当前进程内执行（便于开发调试）。
+    """
+
+    def __init__(self, max_workers: int, queue_size: int):
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self._slots = threading.BoundedSemaphore(max(1, max_workers) + queue_size)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._count_lock = threading.Lock()
+        self._in_flight = 0
+
+    @property
+    def in_flight(self) -> int:
+        """当前执行中和排队中的任务数"""
+        return self._in_flight
+
+    def start(self) -> None:
+        """预先启动工作进程，避免首个上传请求承担进程启动开销"""
+        if self.max_workers > 0:
+            self._get_executor()
+            logger.info(f"Image worker pool started with {self.max_workers} processes, queue size {self.queue_size}")
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait, cancel_futures=True)
+                self._executor = None
+        logger.info("Image worker pool stopped")
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # 使用spawn而不是fork：API进程是多线程的，fork可能复制持有中的锁
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def _reset_executor(self) -> None:
+        """工作进程异常退出（例如被OOM杀死）后进程池不可再用，丢弃后下次提交时重建"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+        logger.warning("Image worker pool was broken and has been reset")
+
+    def _acquire(self) -> None:
+        if not self._slots.acquire(blocking=False):
+            raise ImageWorkerBusy(f"Image worker queue is full ({self._in_flight} tasks in flight)")
+        with self._count_lock:
+            self._in_flight += 1
+
+    def _release(self, _future: Any = None) -> None:
+        with self._count_lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def submit(self, fn: Callable, *args: Any, **kwargs: Any) -> Future:
+        """提交任务，队列已满时抛出 ImageWorkerBusy"""
+        self._acquire()
+        try:
+            if self.max_workers <= 0:
+                future: Future = Future()
+                try:
+                    future.set_result(fn(*args, **kwargs))
+                except Exception as e:
+                    future.set_exception(e)
+            else:
+                try:
+                    future = self._get_executor().submit(fn, *args, **kwargs)
+                except BrokenProcessPool:
+                    self._reset_executor()
+                    future = self._get_executor().submit(fn, *args, **kwargs)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _submit_async(self, fn: Callable, *args: Any, **kwargs: Any) -> "asyncio.Future":
+        """提交任务并返回可在事件循环中等待的 Future，队列已满时抛出 ImageWorkerBusy"""
+        if self.max_workers > 0:
+            return asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+        # 同步模式在默认线程池中执行，不阻塞事件循环
+        self._acquire()
+        future = asyncio.get_running_loop().run_in_executor(None, functools.partial(fn, *args, **kwargs))
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, fn: Callable, *args: Any, timeout: Optional[float] = None, **kwargs: Any) -> Any:
+        """提交任务并等待结果；等待期间不占用线程，超时抛出 asyncio.TimeoutError"""
+        future = self._submit_async(fn, *args, **kwargs)
+        try:
+            return await asyncio.wait_for(future, timeout or settings.IMAGE_WORKER_TIMEOUT)
+        except BrokenProcessPool:
+            self._reset_executor()
+            raise
+
+    async def run_many(
+        self, fn: Callable, args_list: Sequence[Sequence[Any]], timeout: Optional[float] = None
+    ) -> List[Any]:
+        """
+        并发执行一批任务，按提交顺序返回结果；失败的任务在对应位置返回异常对象。
+        队列已满时先等待本批次已提交的任务完成再继续提交，只有本批次没有在途任务
+        仍无法提交时，剩余任务才以 ImageWorkerBusy 结束，调用方可以只重试这些任务。
+        """
+        timeout = timeout or settings.IMAGE_WORKER_TIMEOUT
+        results: List[Any] = [None] * len(args_list)
+        pending: Dict["asyncio.Future", int] = {}
+
+        def collect(futures) -> None:
+            for future in futures:
+                index = pending.pop(future)
+                try:
+                    results[index] = future.result()
+                except BrokenProcessPool as e:
+                    self._reset_executor()
+                    results[index] = e
+                except Exception as e:
+                    results[index] = e
+
+        try:
+            for index, args in enumerate(args_list):
+                while True:
+                    try:
+                        pending[self._submit_async(fn, *args)] = index
+                        break
+                    except ImageWorkerBusy as e:
+                        if not pending:
+                            results[index] = e
+                            break
+                        done, _ = await asyncio.wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+                        if not done:
+                            results[index] = e
+                            break
+                        collect(done)
+
+            if pending:
+                done, not_done = await asyncio.wait(list(pending), timeout=timeout)
+                collect(done)
+                for future in not_done:
+                    future.cancel()
+                    results[pending.pop(future)] = TimeoutError("Image processing timed out")
+        except asyncio.CancelledError:
+            # 请求被取消（客户端断开）时撤回尚未开始执行的任务
+            for future in pending:
+                future.cancel()
+            raise
+        return results
+
+
+# 全局图片处理进程池实例
+image_worker = ImageWorkerPool(
+    max_workers=settings.IMAGE_WORKER_COUNT,
+    queue_size=settings.IMAGE_WORKER_QUEUE_SIZE,
+)
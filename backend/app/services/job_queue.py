@@ -0,0 +1,412 @@
+import asyncio
+import inspect
+import logging
+import os
+import random
+import socket
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.job import Job
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+DEAD = "dead"
+
+# 保存到任务记录的错误信息长度上限
+_ERROR_MAX_LENGTH = 2000
+# 清理已成功任务记录的间隔（秒）
+_HOUSEKEEPING_INTERVAL = 3600
+
+
+class PermanentJobError(Exception):
+    """重试也无法完成的任务（参数错误、没有对应的处理函数等），直接进入死信"""
+
+
+class LeasedJob(NamedTuple):
+    """已领取任务的快照，在会话之间传递（不持有ORM对象）"""
+    id: int
+    type: str
+    payload: Dict[str, Any]
+    attempts: int
+    max_attempts: int
+    locked_by: str
+
+
+class _Registration(NamedTuple):
+    handler: Callable[[Session, Dict[str, Any]], Any]
+    on_dead: Optional[Callable[[Session, Dict[str, Any], str], None]]
+
+
+_handlers: Dict[str, _Registration] = {}
+
+
+def job_handler(job_type: str, on_dead: Optional[Callable[[Session, Dict[str, Any], str], None]] = None):
+    """
+    注册任务处理函数：handler(db, payload)，同步或异步函数，在工作线程中执行，db 为独立的数据库会话；抛出异常即为失败。
+    on_dead(db, payload, error) 在任务进入死信时调用（例如把业务状态标记为失败）。
+    """
+    def decorator(handler):
+        _handlers[job_type] = _Registration(handler, on_dead)
+        return handler
+    return decorator
+
+
+def _utcnow() -> datetime:
+    return datetime.utcnow()
+
+
+def _truncate_error(error: str) -> str:
+    return error[:_ERROR_MAX_LENGTH]
+
+
+def retry_delay(attempts: int) -> float:
+    """第 attempts 次失败后的重试间隔：指数退避，上限 JOB_RETRY_MAX_DELAY，随机取后一半避免同时失败的任务同时重试"""
+    delay = min(settings.JOB_RETRY_BASE_DELAY * 2 ** max(0, attempts - 1), settings.JOB_RETRY_MAX_DELAY)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def enqueue(
+    db: Session,
+    job_type: str,
+    payload: Optional[Dict[str, Any]] = None,
+    *,
+    dedupe_key: Optional[str] = None,
+    delay: float = 0,
+    max_attempts: Optional[int] = None,
+    commit: bool = True,
+) -> Job:
+    """
+    添加任务。dedupe_key 相同的任务正在排队或执行时不重复添加，返回已有的任务。
+    commit 为 False 时由调用方统一提交（任务与业务数据在同一事务中写入，不会出现有数据没任务的情况）。
+    """
+    if dedupe_key:
+        existing = _active_job(db, dedupe_key)
+        if existing is not None:
+            return existing
+    job = Job(
+        type=job_type,
+        payload=payload or {},
+        status=QUEUED,
+        dedupe_key=dedupe_key,
+        attempts=0,
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+        run_at=_utcnow() + timedelta(seconds=delay),
+    )
+    try:
+        # 检查之后其他进程可能已添加同一 dedupe_key 的任务，由唯一索引兜底；
+        # 冲突时只回滚保存点，调用方事务中的其他改动保留
+        with db.begin_nested():
+            db.add(job)
+    except IntegrityError:
+        existing = _active_job(db, dedupe_key, lock=True) if dedupe_key else None
+        if existing is None:
+            raise
+        return existing
+    if commit:
+        db.commit()
+        db.refresh(job)
+    return job
+
+
+def _active_job(db: Session, dedupe_key: str, lock: bool = False) -> Optional[Job]:
+    """
+    dedupe_key 对应的排队或执行中的任务。lock 为 True 时使用加锁读
+    （读到其他事务刚提交的记录，不受可重复读快照的影响）。
+    """
+    query = db.query(Job).filter(Job.dedupe_key == dedupe_key, Job.status.in_((QUEUED, RUNNING)))
+    if lock:
+        query = query.with_for_update(read=True)
+    return query.first()
+
+
+def lease(db: Session, worker_id: str, limit: int = 1) -> List[LeasedJob]:
+    """
+    领取最多 limit 个可执行的任务：已到执行时间的 queued 任务，以及租约已过期的 running 任务（领取它的进程已崩溃或失联）。
+    SELECT ... FOR UPDATE SKIP LOCKED：并发领取的进程跳过彼此已锁定的行，既不等待也不会重复领取
+    （MySQL 8.0+ / PostgreSQL；不支持该子句的数据库会忽略它，例如开发用的SQLite，此时由按状态和次数的条件更新保证不重复领取）。
+    最后一次执行时租约过期的任务不再执行，直接进入死信。
+    """
+    now = _utcnow()
+    jobs = (
+        db.query(Job)
+        .filter(or_(
+            and_(Job.status == QUEUED, Job.run_at <= now),
+            and_(Job.status == RUNNING, Job.locked_until < now),
+        ))
+        .order_by(Job.run_at, Job.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    leased: List[LeasedJob] = []
+    dead: List[Tuple[str, Dict[str, Any], str]] = []
+    for job in jobs:
+        if job.status == RUNNING:
+            logger.warning(f"Job {job.id} ({job.type}) lease held by {job.locked_by} expired")
+        # 按读到的状态和次数条件更新（不支持 SKIP LOCKED 的数据库上并发领取同一行时只有一个进程能成功）
+        claim = db.query(Job).filter(Job.id == job.id, Job.status == job.status, Job.attempts == job.attempts)
+        if job.status == RUNNING and job.attempts >= job.max_attempts:
+            last_error = _truncate_error(f"Lease expired on the last attempt. {job.last_error or ''}".strip())
+            if claim.update(
+                {Job.status: DEAD, Job.locked_by: None, Job.locked_until: None, Job.finished_at: now, Job.last_error: last_error},
+                synchronize_session=False,
+            ):
+                dead.append((job.type, dict(job.payload or {}), last_error))
+            continue
+        if claim.update(
+            {
+                Job.status: RUNNING,
+                Job.attempts: job.attempts + 1,
+                Job.locked_by: worker_id,
+                Job.locked_until: now + timedelta(seconds=settings.JOB_VISIBILITY_TIMEOUT),
+            },
+            synchronize_session=False,
+        ):
+            leased.append(LeasedJob(job.id, job.type, dict(job.payload or {}), job.attempts + 1, job.max_attempts, worker_id))
+    db.commit()
+    for job_type, payload, error in dead:
+        _run_on_dead(db, job_type, payload, error)
+    return leased
+
+
+def _owned(db: Session, job: LeasedJob):
+    """仍由本进程持有租约的任务（租约过期后被其他进程领取的任务不能再修改）"""
+    return db.query(Job).filter(Job.id == job.id, Job.status == RUNNING, Job.locked_by == job.locked_by)
+
+
+def extend_lease(db: Session, job: LeasedJob) -> bool:
+    """续租，返回租约是否仍由本进程持有"""
+    updated = _owned(db, job).update(
+        {Job.locked_until: _utcnow() + timedelta(seconds=settings.JOB_VISIBILITY_TIMEOUT)},
+        synchronize_session=False,
+    )
+    db.commit()
+    return bool(updated)
+
+
+def complete(db: Session, job: LeasedJob) -> bool:
+    updated = _owned(db, job).update(
+        {Job.status: SUCCEEDED, Job.locked_by: None, Job.locked_until: None, Job.finished_at: _utcnow()},
+        synchronize_session=False,
+    )
+    db.commit()
+    return bool(updated)
+
+
+def fail(db: Session, job: LeasedJob, error: str, permanent: bool = False) -> bool:
+    """记录失败：还有重试次数时按退避间隔重新排队，否则（或 permanent）进入死信"""
+    error = _truncate_error(error)
+    now = _utcnow()
+    dead = permanent or job.attempts >= job.max_attempts
+    if dead:
+        values = {Job.status: DEAD, Job.finished_at: now}
+    else:
+        values = {Job.status: QUEUED, Job.run_at: now + timedelta(seconds=retry_delay(job.attempts))}
+    values.update({Job.locked_by: None, Job.locked_until: None, Job.last_error: error})
+    updated = _owned(db, job).update(values, synchronize_session=False)
+    db.commit()
+    if updated and dead:
+        logger.error(f"Job {job.id} ({job.type}) moved to dead letter after {job.attempts} attempts: {error}")
+        _run_on_dead(db, job.type, job.payload, error)
+    return bool(updated)
+
+
+def _run_on_dead(db: Session, job_type: str, payload: Dict[str, Any], error: str) -> None:
+    registration = _handlers.get(job_type)
+    if registration is None or registration.on_dead is None:
+        return
+    try:
+        registration.on_dead(db, payload, error)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Dead letter callback for {job_type} failed: {e}")
+
+
+def requeue_dead(db: Session, job_type: Optional[str] = None) -> int:
+    """
+    把死信重新排队（重置执行次数），返回任务数。
+    同一 dedupe_key 只重新排队最新的一个死信，已有排队或执行中任务的 dedupe_key 跳过。
+    """
+    query = db.query(Job.id, Job.dedupe_key).filter(Job.status == DEAD)
+    if job_type:
+        query = query.filter(Job.type == job_type)
+    dead = query.order_by(Job.id.desc()).all()
+    keys = {dedupe_key for _, dedupe_key in dead if dedupe_key}
+    taken = {
+        dedupe_key for (dedupe_key,) in
+        db.query(Job.dedupe_key).filter(Job.dedupe_key.in_(keys), Job.status.in_((QUEUED, RUNNING)))
+    } if keys else set()
+    ids = []
+    for job_id, dedupe_key in dead:
+        if dedupe_key:
+            if dedupe_key in taken:
+                continue
+            taken.add(dedupe_key)
+        ids.append(job_id)
+    count = db.query(Job).filter(Job.id.in_(ids), Job.status == DEAD).update(
+        {Job.status: QUEUED, Job.attempts: 0, Job.run_at: _utcnow(), Job.finished_at: None},
+        synchronize_session=False,
+    ) if ids else 0
+    db.commit()
+    return count
+
+
+def purge_finished(db: Session, retention_days: Optional[int] = None) -> int:
+    """删除超过保留期的已成功任务记录"""
+    retention_days = settings.JOB_RETENTION_DAYS if retention_days is None else retention_days
+    cutoff = _utcnow() - timedelta(days=retention_days)
+    count = (
+        db.query(Job)
+        .filter(Job.status == SUCCEEDED, Job.finished_at < cutoff)
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return count
+
+
+def queue_stats(db: Session) -> Dict[str, Dict[str, int]]:
+    """按任务类型和状态统计任务数"""
+    stats: Dict[str, Dict[str, int]] = {}
+    for job_type, status, count in db.query(Job.type, Job.status, func.count(Job.id)).group_by(Job.type, Job.status):
+        stats.setdefault(job_type, {})[status] = count
+    return stats
+
+
+def _with_session(fn, *args):
+    db = SessionLocal()
+    try:
+        return fn(db, *args)
+    finally:
+        db.close()
+
+
+def _call_handler(db: Session, job: LeasedJob) -> None:
+    registration = _handlers.get(job.type)
+    if registration is None:
+        raise PermanentJobError(f"No handler registered for job type {job.type!r}")
+    result = registration.handler(db, job.payload)
+    if inspect.isawaitable(result):
+        # 异步处理函数在工作线程内以独立的事件循环执行，其中的同步数据库和文件操作不会阻塞API的事件循环
+        asyncio.run(result)
+
+
+def _run_job(db: Session, job: LeasedJob) -> None:
+    """执行任务并提交结果（在工作线程中调用）"""
+    try:
+        _call_handler(db, job)
+    except PermanentJobError as e:
+        db.rollback()
+        fail(db, job, str(e), permanent=True)
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"Job {job.id} ({job.type}) attempt {job.attempts}/{job.max_attempts} failed: {e}")
+        fail(db, job, f"{type(e).__name__}: {e}")
+    else:
+        if not complete(db, job):
+            logger.warning(f"Job {job.id} ({job.type}) finished after its lease was lost")
+
+
+class JobWorker:
+    """
+    在事件循环中调度任务：concurrency 个协程各自领取一个任务，交给工作线程执行并提交结果。
+    处理函数和数据库操作都在线程中执行，不阻塞事件循环；执行期间按租约的1/3间隔续租，长任务不会被其他进程重复领取。
+    多个进程（API进程、app/run_jobs.py）可以同时运行，吞吐随进程数扩展。
+    """
+
+    def __init__(self):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks: List[asyncio.Task] = []
+        self._stopping: Optional[asyncio.Event] = None
+
+    def start(self, concurrency: Optional[int] = None) -> None:
+        """在当前事件循环中启动（concurrency 为0时不启动）"""
+        concurrency = settings.JOB_WORKER_CONCURRENCY if concurrency is None else concurrency
+        if concurrency <= 0 or self._tasks:
+            return
+        # 进程ID可能在 fork 后变化，启动时再确定
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._stopping = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(concurrency)]
+        self._tasks.append(asyncio.create_task(self._housekeeping()))
+        logger.info(f"Job worker {self.worker_id} started with concurrency {concurrency}")
+
+    async def stop(self) -> None:
+        """停止领取新任务；执行中的任务在线程中继续执行完并提交结果（事件循环关闭时等待线程结束）"""
+        if not self._tasks:
+            return
+        self._stopping.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info(f"Job worker {self.worker_id} stopped")
+
+    async def wait_stopped(self) -> None:
+        if self._stopping is not None:
+            await self._stopping.wait()
+
+    def request_stop(self) -> None:
+        """信号处理函数中调用：通知 wait_stopped 返回，由调用方 await stop()"""
+        if self._stopping is not None:
+            self._stopping.set()
+
+    async def _sleep(self, seconds: float) -> None:
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                jobs = await asyncio.to_thread(_with_session, lease, self.worker_id)
+            except Exception as e:
+                logger.error(f"Could not lease jobs: {e}")
+                jobs = []
+            if not jobs:
+                await self._sleep(settings.JOB_POLL_INTERVAL)
+                continue
+            for job in jobs:
+                await self._execute(job)
+
+    async def _execute(self, job: LeasedJob) -> None:
+        # 任务（包括提交结果）整体在线程中执行。停止时只取消等待它的协程，不交还任务：
+        # 线程仍在执行，交还后会被其他进程重复执行；线程结束时自行提交结果，来不及结束的由租约过期后重新领取
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            await asyncio.to_thread(_with_session, _run_job, job)
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat(self, job: LeasedJob) -> None:
+        while True:
+            await asyncio.sleep(settings.JOB_VISIBILITY_TIMEOUT / 3)
+            try:
+                if not await asyncio.to_thread(_with_session, extend_lease, job):
+                    logger.warning(f"Lost lease on job {job.id} ({job.type})")
+                    return
+            except Exception as e:
+                logger.error(f"Could not extend lease on job {job.id}: {e}")
+
+    async def _housekeeping(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                purged = await asyncio.to_thread(_with_session, purge_finished)
+                if purged:
+                    logger.info(f"Purged {purged} finished jobs")
+            except Exception as e:
+                logger.error(f"Could not purge finished jobs: {e}")
+            await self._sleep(_HOUSEKEEPING_INTERVAL)
+
+
+job_worker = JobWorker()
@@ -0,0 +1,411 @@
+import io
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from itertools import combinations
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.image import Image
+
+logger = logging.getLogger(__name__)
+
+# 64位感知哈希切分为4段16位，按段建立倒排（multi-index hashing）。
+# 由鸽巢原理，汉明距离 <= r 的两个哈希至少有一段的距离 <= r // 4，
+# 因此只需在每段探测距离 <= r // 4 的桶，再对候选做精确距离校验。
+_CHUNKS = 4
+_CHUNK_BITS = 16
+_CHUNK_MASK = (1 << _CHUNK_BITS) - 1
+# 每段最大探测半径（2 对应每段137个桶），即支持的最大查询距离为 4 * 2 + 3 = 11
+_MAX_CHUNK_RADIUS = 2
+MAX_SEARCH_DISTANCE = _CHUNKS * _MAX_CHUNK_RADIUS + _CHUNKS - 1
+# 增量插入先放在缓冲区中线性扫描，超过此数量时合并重建倒排
+_DELTA_REBUILD_SIZE = 4096
+# phash_updated_at 取自写入事务中的数据库时间，事务提交可能晚于该时间，
+# 因此刷新时从水位线往前回看一段时间（重复读到的记录按原样覆盖，不影响结果）
+_REFRESH_OVERLAP = timedelta(minutes=5)
+
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+# 每个探测半径对应的16位翻转掩码
+_PROBE_MASKS = [
+    np.array(
+        [sum(1 << bit for bit in bits) for r in range(radius + 1) for bits in combinations(range(_CHUNK_BITS), r)],
+        dtype=np.int64,
+    )
+    for radius in range(_MAX_CHUNK_RADIUS + 1)
+]
+
+
+def hamming_distances(hashes: np.ndarray, query: int) -> np.ndarray:
+    """uint64 哈希数组与查询哈希的汉明距离（查表统计置位数，不依赖 numpy 2 的 bitwise_count）"""
+    xor = np.bitwise_xor(hashes, np.uint64(query))
+    return _POPCOUNT_TABLE[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def touch_phash(db: Session, image_ids: Iterable[int]) -> None:
+    """
+    记录这些图片的感知哈希刚被改写（不提交）。批量改写 phash 的脚本必须调用，
+    各API进程的索引据此在下次刷新时读到改动；新建的记录由列默认值自动记录。
+    """
+    image_ids = list(image_ids)
+    if image_ids:
+        table = Image.__table__
+        db.execute(table.update().where(table.c.id.in_(image_ids)).values(phash_updated_at=func.now()))
+
+
+class _Arrays(NamedTuple):
+    """主体数据：按ID排序的ID和哈希，以及每段哈希的 CSR 倒排"""
+    ids: np.ndarray
+    hashes: np.ndarray
+    orders: List[np.ndarray]
+    offsets: List[np.ndarray]
+
+
+def _build_arrays(ids: np.ndarray, hashes: np.ndarray) -> _Arrays:
+    """用给定记录构建主体数组和倒排（纯计算，不访问索引状态，可在锁外执行）"""
+    order = np.argsort(ids, kind="stable")
+    ids, hashes = ids[order], hashes[order]
+    orders, offsets = [], []
+    for chunk in range(_CHUNKS):
+        values = ((hashes >> np.uint64(chunk * _CHUNK_BITS)) & np.uint64(_CHUNK_MASK)).astype(np.int64)
+        positions = np.argsort(values, kind="stable").astype(np.int32)
+        orders.append(positions)
+        offsets.append(np.searchsorted(values[positions], np.arange(_CHUNK_MASK + 2)))
+    return _Arrays(ids, hashes, orders, offsets)
+
+
+class PHashIndex:
+    """
+    图片感知哈希的内存近邻索引，用于查找近似重复（重新保存、轻微裁剪/压缩）的图片。
+
+    主体数据按图片ID排序存放在 numpy 数组中，每段哈希对应一份 CSR 结构的倒排
+    （排序后的位置数组 + 65537 个桶偏移），百万级图片约占 20MB 内存、单次查询在毫秒以内。
+    新增记录进入增量缓冲区，删除通过存活标记实现；缓冲区的合并和倒排重建在锁外进行，
+    只在换入新数组时短暂持锁，不阻塞查询。索引可保存为 .npz 快照以加快启动。
+
+    多个API进程各自维护索引：查询前会定期从数据库拉取新增的记录，以及 phash_updated_at
+    晚于水位线的记录（其他进程、重新处理或回填脚本改写了感知哈希），快照加载后同样据此补齐。
+    其他进程删除的记录可能仍留在索引中，调用方应以数据库查询结果为准。
+    """
+
+    def __init__(self, snapshot_path: str):
+        self.snapshot_path = Path(snapshot_path)
+        self._lock = threading.Lock()
+        # 保证同一时间只有一个线程在加载或刷新（数据库查询在 _lock 之外进行）
+        self._refresh_lock = threading.Lock()
+        self._loaded = False
+        self._last_refresh = 0.0
+        self._max_id = 0
+        # 已读到的最大 phash_updated_at，None 表示还没有读到带写入时间的记录
+        self._watermark: Optional[datetime] = None
+        self._arrays = _build_arrays(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint64))
+        self._alive = np.empty(0, dtype=bool)
+        self._delta: Dict[int, int] = {}
+        # 增量缓冲区的 numpy 视图，缓冲区变化时置空、查询时按需重建
+        self._delta_arrays: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        # 合并进行中时记录期间被删除或改写的ID，换入新数组时据此修正
+        self._merging = False
+        self._touched_during_merge: Set[int] = set()
+        # 每次完整加载或重建递增，合并期间发生重建时丢弃合并结果
+        self._generation = 0
+
+    def __len__(self) -> int:
+        return int(self._alive.sum()) + len(self._delta)
+
+    # --- 构建与持久化 ---
+
+    def _install(self, arrays: _Arrays, delta: Dict[int, int]) -> None:
+        """换入新的主体数组和增量缓冲区（调用方持有 _lock）"""
+        self._arrays = arrays
+        self._alive = np.ones(len(arrays.ids), dtype=bool)
+        self._delta = delta
+        self._delta_arrays = None
+
+    def _reset(self, arrays: _Arrays, watermark: Optional[datetime]) -> None:
+        """完整加载或重建后换入数据并重置水位线（调用方持有 _lock）"""
+        self._install(arrays, {})
+        self._generation += 1
+        self._max_id = int(arrays.ids[-1]) if len(arrays.ids) else 0
+        self._watermark = watermark
+        self._loaded = True
+        self._last_refresh = time.monotonic()
+
+    def _merge_delta(self) -> None:
+        """把增量缓冲区和存活标记合并进主体数组：锁内只复制数据和换入结果，重建倒排在锁外进行"""
+        with self._lock:
+            if self._merging or not self._loaded:
+                return
+            self._merging = True
+            self._touched_during_merge = set()
+            generation = self._generation
+            merged_delta = dict(self._delta)
+            ids = np.concatenate([
+                self._arrays.ids[self._alive], np.fromiter(merged_delta.keys(), dtype=np.int64, count=len(merged_delta))
+            ])
+            hashes = np.concatenate([
+                self._arrays.hashes[self._alive],
+                np.fromiter(merged_delta.values(), dtype=np.uint64, count=len(merged_delta)),
+            ])
+        try:
+            arrays = _build_arrays(ids, hashes)
+            with self._lock:
+                if generation != self._generation:
+                    return
+                touched = self._touched_during_merge
+                # 合并期间新增或改写的记录留在缓冲区；期间被删除或改写的记录在新数组中标记为失效
+                delta = {
+                    image_id: phash for image_id, phash in self._delta.items()
+                    if image_id in touched or merged_delta.get(image_id) != phash
+                }
+                self._install(arrays, delta)
+                for image_id in touched:
+                    self._kill_locked(image_id)
+        finally:
+            with self._lock:
+                self._merging = False
+                self._touched_during_merge = set()
+
+    def _load_rows(
+        self, db: Session, condition, batch_size: int = 50000
+    ) -> Tuple[np.ndarray, np.ndarray, List[int], Optional[datetime]]:
+        """
+        按ID分批读取满足 condition 的记录，返回有感知哈希的 (ids, hashes)、
+        感知哈希为空的ID列表和读到的最大 phash_updated_at。
+        """
+        ids: List[int] = []
+        hashes: List[int] = []
+        cleared: List[int] = []
+        watermark: Optional[datetime] = None
+        last_id = 0
+        while True:
+            rows = (
+                db.query(Image.id, Image.phash, Image.phash_updated_at)
+                .filter(Image.id > last_id, condition)
+                .order_by(Image.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                break
+            for image_id, phash, updated_at in rows:
+                if phash:
+                    ids.append(image_id)
+                    hashes.append(int(phash, 16))
+                else:
+                    cleared.append(image_id)
+                if updated_at is not None and (watermark is None or updated_at > watermark):
+                    watermark = updated_at
+            last_id = rows[-1].id
+            if len(rows) < batch_size:
+                break
+        return np.array(ids, dtype=np.int64), np.array(hashes, dtype=np.uint64), cleared, watermark
+
+    def _changed_condition(self, max_id: int, watermark: Optional[datetime]):
+        """max_id 之后新增的记录，以及水位线之后（含回看窗口）感知哈希被改写的记录"""
+        if watermark is None:
+            changed = Image.phash_updated_at.isnot(None)
+        else:
+            changed = Image.phash_updated_at >= watermark - _REFRESH_OVERLAP
+        return or_(Image.id > max_id, changed)
+
+    def _advance(self, max_id: int, watermark: Optional[datetime]) -> None:
+        self._max_id = max(self._max_id, max_id)
+        if watermark is not None and (self._watermark is None or watermark > self._watermark):
+            self._watermark = watermark
+
+    def _load_snapshot(self) -> Tuple[np.ndarray, np.ndarray, int, Optional[datetime]]:
+        """读取快照，快照不存在、损坏或格式过旧时返回空数据（随后从数据库完整加载）"""
+        empty = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint64), 0, None
+        if not self.snapshot_path.exists():
+            return empty
+        try:
+            with np.load(self.snapshot_path) as snapshot:
+                watermark = str(snapshot["watermark"])
+                return (
+                    snapshot["ids"], snapshot["hashes"], int(snapshot["max_id"]),
+                    datetime.fromisoformat(watermark) if watermark else None,
+                )
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not load perceptual hash index snapshot {self.snapshot_path}: {e}")
+            return empty
+
+    def _load(self, db: Session) -> None:
+        ids, hashes, max_id, watermark = self._load_snapshot()
+        if len(ids):
+            new_ids, new_hashes, cleared, new_watermark = self._load_rows(
+                db, self._changed_condition(max_id, watermark)
+            )
+            # 快照中被改写或清空的记录以数据库为准
+            keep = ~np.isin(ids, np.concatenate([new_ids, np.array(cleared, dtype=np.int64)]))
+            ids = np.concatenate([ids[keep], new_ids])
+            hashes = np.concatenate([hashes[keep], new_hashes])
+        else:
+            new_ids, new_hashes, _, new_watermark = self._load_rows(db, Image.phash.isnot(None))
+            ids, hashes = new_ids, new_hashes
+        arrays = _build_arrays(ids, hashes)
+        with self._lock:
+            self._reset(arrays, watermark)
+            self._advance(max_id, new_watermark)
+        logger.info(f"Perceptual hash index loaded with {len(self)} images ({len(new_ids)} from database)")
+
+    def load(self, db: Session) -> None:
+        """加载快照（如果存在），再从数据库补齐快照之后新增或改写的记录"""
+        with self._refresh_lock:
+            self._load(db)
+
+    def rebuild(self, db: Session) -> None:
+        """忽略快照，从数据库完整重建"""
+        with self._refresh_lock:
+            ids, hashes, _, watermark = self._load_rows(db, Image.phash.isnot(None))
+            arrays = _build_arrays(ids, hashes)
+            with self._lock:
+                self._reset(arrays, None)
+                self._advance(0, watermark)
+
+    def save(self) -> None:
+        """原子写入 .npz 快照（直接保存存活记录和缓冲区，倒排在加载时重建）"""
+        with self._lock:
+            if not self._loaded:
+                return
+            ids = np.concatenate([
+                self._arrays.ids[self._alive], np.fromiter(self._delta.keys(), dtype=np.int64, count=len(self._delta))
+            ])
+            hashes = np.concatenate([
+                self._arrays.hashes[self._alive],
+                np.fromiter(self._delta.values(), dtype=np.uint64, count=len(self._delta)),
+            ])
+            max_id, watermark = self._max_id, self._watermark
+        buffer = io.BytesIO()
+        np.savez(
+            buffer, ids=ids, hashes=hashes, max_id=np.int64(max_id),
+            watermark=np.array(watermark.isoformat() if watermark else ""),
+        )
+        self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.snapshot_path.with_name(f".{self.snapshot_path.name}.tmp")
+        tmp_path.write_bytes(buffer.getvalue())
+        os.replace(tmp_path, self.snapshot_path)
+        logger.info(f"Perceptual hash index snapshot saved to {self.snapshot_path}")
+
+    def ensure_loaded(self, db: Session) -> None:
+        """首次使用时加载；之后每隔 PHASH_REFRESH_INTERVAL 秒拉取新增和感知哈希被改写的记录"""
+        if not self._loaded:
+            with self._refresh_lock:
+                if not self._loaded:
+                    self._load(db)
+            return
+        if time.monotonic() - self._last_refresh < settings.PHASH_REFRESH_INTERVAL:
+            return
+        # 其他线程正在刷新时直接使用当前索引
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_refresh = time.monotonic()
+            with self._lock:
+                max_id, watermark = self._max_id, self._watermark
+            new_ids, new_hashes, cleared, new_watermark = self._load_rows(
+                db, self._changed_condition(max_id, watermark)
+            )
+            with self._lock:
+                for image_id in cleared:
+                    self._remove_locked(image_id)
+                for image_id, phash in zip(new_ids.tolist(), new_hashes.tolist()):
+                    self._add_locked(image_id, phash)
+                self._advance(max(int(new_ids.max(initial=0)), max(cleared, default=0)), new_watermark)
+        finally:
+            self._refresh_lock.release()
+        self._merge_if_needed()
+
+    # --- 增量更新 ---
+
+    def _kill_locked(self, image_id: int) -> None:
+        """在主体数组中把记录标记为失效"""
+        ids = self._arrays.ids
+        position = int(np.searchsorted(ids, image_id))
+        if position < len(ids) and ids[position] == image_id:
+            self._alive[position] = False
+
+    def _add_locked(self, image_id: int, phash: int) -> None:
+        self._remove_locked(image_id)
+        self._delta[image_id] = phash
+        self._delta_arrays = None
+        self._max_id = max(self._max_id, image_id)
+
+    def _remove_locked(self, image_id: int) -> None:
+        if self._delta.pop(image_id, None) is not None:
+            self._delta_arrays = None
+        self._kill_locked(image_id)
+        if self._merging:
+            self._touched_during_merge.add(image_id)
+
+    def _merge_if_needed(self) -> None:
+        if len(self._delta) >= _DELTA_REBUILD_SIZE:
+            self._merge_delta()
+
+    def add(self, image_id: int, phash: Optional[str]) -> None:
+        """新图片入库后加入索引（索引尚未加载时忽略，加载时会从数据库读到）"""
+        if not phash:
+            return
+        with self._lock:
+            if not self._loaded:
+                return
+            self._add_locked(image_id, int(phash, 16))
+        self._merge_if_needed()
+
+    def remove(self, image_id: int) -> None:
+        with self._lock:
+            if self._loaded:
+                self._remove_locked(image_id)
+
+    # --- 查询 ---
+
+    def search(self, phash: str, max_distance: int, exclude_id: Optional[int] = None) -> List[Tuple[int, int]]:
+        """
+        查找汉明距离不超过 max_distance 的图片，按距离升序返回 (图片ID, 距离)。
+        """
+        if max_distance > MAX_SEARCH_DISTANCE:
+            raise ValueError(f"max_distance must not exceed {MAX_SEARCH_DISTANCE}")
+        query = int(phash, 16)
+        probe_masks = _PROBE_MASKS[max_distance // _CHUNKS]
+
+        with self._lock:
+            arrays = self._arrays
+            buckets = []
+            for chunk in range(_CHUNKS if len(arrays.ids) else 0):
+                probes = ((query >> (chunk * _CHUNK_BITS)) & _CHUNK_MASK) ^ probe_masks
+                offsets, order = arrays.offsets[chunk], arrays.orders[chunk]
+                starts, ends = offsets[probes], offsets[probes + 1]
+                buckets.extend(order[start:end] for start, end in zip(starts.tolist(), ends.tolist()) if end > start)
+
+            matches: Dict[int, int] = {}
+            if buckets:
+                # 同一图片可能在多段命中，不去重（重复计算距离比排序去重更便宜），结果按ID合并
+                positions = np.concatenate(buckets)
+                positions = positions[self._alive[positions]]
+                distances = hamming_distances(arrays.hashes[positions], query)
+                keep = distances <= max_distance
+                matches.update(zip(arrays.ids[positions[keep]].tolist(), distances[keep].tolist()))
+
+            if self._delta:
+                if self._delta_arrays is None:
+                    self._delta_arrays = (
+                        np.fromiter(self._delta.keys(), dtype=np.int64, count=len(self._delta)),
+                        np.fromiter(self._delta.values(), dtype=np.uint64, count=len(self._delta)),
+                    )
+                delta_ids, delta_hashes = self._delta_arrays
+                distances = hamming_distances(delta_hashes, query)
+                keep = distances <= max_distance
+                matches.update(zip(delta_ids[keep].tolist(), distances[keep].tolist()))
+
+        matches.pop(exclude_id, None)
+        return sorted(matches.items(), key=lambda item: (item[1], item[0]))
+
+
+# 全局近似重复索引实例
+phash_index = PHashIndex(snapshot_path=settings.PHASH_INDEX_PATH)
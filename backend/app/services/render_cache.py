@@ -0,0 +1,149 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+from app.core.config import settings
+from app.core.image_utils import RENDER_FORMATS
+from app.core.storage import StoredObject
+
+logger = logging.getLogger(__name__)
+
+# cover 模式的宽高比按 1/20 取整并限制范围，与宽度档位一起约束缓存条目数量
+_ASPECT_STEPS = 20
+_MIN_ASPECT = 0.25
+_MAX_ASPECT = 4.0
+
+
+def normalize_width(value: int) -> int:
+    """向上取整到最近的宽度档位，超出最大档位时取最大档位"""
+    buckets = sorted(settings.RENDER_WIDTH_BUCKETS)
+    for bucket in buckets:
+        if value <= bucket:
+            return bucket
+    return buckets[-1]
+
+
+def normalize_dimensions(width: Optional[int], height: Optional[int]) -> Tuple[Optional[int], Optional[int]]:
+    """
+    把请求的宽高规整到有限的档位：宽度（或只给高度时的高度）取档位，
+    同时给出宽高时按量化后的宽高比推算高度。
+    """
+    if width and height:
+        aspect = min(_MAX_ASPECT, max(_MIN_ASPECT, height / width))
+        aspect = round(aspect * _ASPECT_STEPS) / _ASPECT_STEPS
+        width = normalize_width(width)
+        return width, max(1, round(width * aspect))
+    if width:
+        return normalize_width(width), None
+    if height:
+        return None, normalize_width(height)
+    return None, None
+
+
+class RenderCache:
+    """
+    按需缩放图的磁盘缓存，总容量受 max_bytes 约束，超出时按最近最少使用（LRU）淘汰。
+
+    索引（缓存键 -> 文件大小）保存在内存中，首次使用时扫描缓存目录按文件修改时间重建；
+    命中时更新文件修改时间，使重启后的淘汰顺序仍然接近LRU。多个API进程各自维护索引，
+    命中其他进程生成的文件时会并入本进程索引。
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def make_key(self, source: StoredObject, width: Optional[int], height: Optional[int], fit: str, fmt: str) -> str:
+        """缓存键包含原图的存储key和修改时间，原图被替换（例如重新处理）后自动失效"""
+        digest = hashlib.sha1(f"{source.key}:{source.modified}".encode()).hexdigest()[:20]
+        return f"{digest}_{width or 0}x{height or 0}_{fit}.{RENDER_FORMATS[fmt][1]}"
+
+    def path_for(self, key: str) -> Path:
+        """缓存文件路径，按键前两位分目录，避免单目录文件过多"""
+        directory = self.directory / key[:2]
+        directory.mkdir(parents=True, exist_ok=True)
+        return directory / key
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        files = []
+        if self.directory.exists():
+            for shard in os.scandir(self.directory):
+                if not shard.is_dir():
+                    continue
+                for entry in os.scandir(shard.path):
+                    if entry.is_file() and not entry.name.startswith("."):
+                        stat = entry.stat()
+                        files.append((stat.st_mtime, entry.name, stat.st_size))
+        files.sort()
+        for _, key, size in files:
+            self._entries[key] = size
+            self._total_bytes += size
+        self._loaded = True
+        logger.info(f"Render cache loaded {len(self._entries)} entries ({self._total_bytes} bytes)")
+
+    def get(self, key: str) -> Optional[Path]:
+        """命中时返回缓存文件路径并标记为最近使用，否则返回None"""
+        path = self.directory / key[:2] / key
+        with self._lock:
+            self._load()
+            if key in self._entries:
+                if not path.exists():
+                    self._total_bytes -= self._entries.pop(key)
+                    return None
+                self._entries.move_to_end(key)
+            elif path.exists():
+                self._track(key, path.stat().st_size)
+            else:
+                return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def add(self, key: str) -> Path:
+        """登记已写入 path_for(key) 的缓存文件，并在超出容量时淘汰最久未使用的条目"""
+        path = self.path_for(key)
+        size = path.stat().st_size
+        with self._lock:
+            self._load()
+            self._track(key, size)
+            self._evict()
+        return path
+
+    def _track(self, key: str, size: int) -> None:
+        if key in self._entries:
+            self._total_bytes -= self._entries.pop(key)
+        self._entries[key] = size
+        self._total_bytes += size
+
+    def _evict(self) -> None:
+        # 至少保留刚写入的条目
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                (self.directory / key[:2] / key).unlink(missing_ok=True)
+            except OSError as e:
+                logger.warning(f"Could not evict render cache entry {key}: {e}")
+
+
+# 全局按需缩放缓存实例
+render_cache = RenderCache(
+    directory=settings.RENDER_CACHE_DIRECTORY,
+    max_bytes=settings.RENDER_CACHE_MAX_BYTES,
+)
@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Hashable, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 等待时间统计保留最近的样本数（用于计算分位数）
+_WAIT_SAMPLES = 1000
+
+
+class AdmissionTimeout(Exception):
+    """在排队超时前未获准进入图片处理阶段，调用方应返回503并提示稍后重试"""
+
+
+class _Waiter:
+    __slots__ = ("key", "cost", "enqueued_at", "admitted", "loop", "future")
+
+    def __init__(self, key: Hashable, cost: int):
+        self.key = key
+        self.cost = cost
+        self.enqueued_at = time.monotonic()
+        self.admitted = False
+        self.loop = asyncio.get_running_loop()
+        self.future: "asyncio.Future[None]" = self.loop.create_future()
+
+    def wake(self) -> None:
+        """在等待者所在的事件循环中唤醒它（放行可能发生在其他线程的事件循环里）"""
+        try:
+            self.loop.call_soon_threadsafe(_set_done, self.future)
+        except RuntimeError:
+            # 事件循环已关闭，等待者已不存在
+            pass
+
+
+def _set_done(future: "asyncio.Future[None]") -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class UploadAdmissionController:
+    """
+    图片处理阶段的准入控制。
+
+    每个请求按解码后的像素内存（宽 x 高 x 通道数，读取文件头估算）申请额度：
+    - 所有进行中请求的额度之和不超过 max_bytes（全局内存预算）；
+    - 同一用户同时进行中的请求数不超过 per_key_limit。
+    额度不足时按到达顺序（FIFO）排队：排在前面、因内存预算被阻塞的请求不会被后来的小请求越过，
+    仅因用户并发数受限的请求则不阻塞其他用户。超过 timeout 秒仍未获准时抛出 AdmissionTimeout。
+    单个请求的额度超过总预算时按总预算计算，即在没有其他请求时独占执行。
+    排队通过 asyncio 等待，不占用线程；状态由线程锁保护，多个事件循环可共用同一个实例。
+    """
+
+    def __init__(self, max_bytes: int, per_key_limit: int, timeout: float):
+        self.max_bytes = max_bytes
+        self.per_key_limit = per_key_limit
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._queue: Deque[_Waiter] = deque()
+        self._in_use_bytes = 0
+        self._active: Dict[Hashable, int] = {}
+        # 统计指标
+        self._admitted_total = 0
+        self._timeouts_total = 0
+        self._wait_seconds_total = 0.0
+        self._wait_samples: Deque[float] = deque(maxlen=_WAIT_SAMPLES)
+
+    def _dispatch(self) -> None:
+        """按队列顺序放行能满足额度的请求（调用方持有锁）"""
+        budget_blocked = False
+        for waiter in list(self._queue):
+            if self._active.get(waiter.key, 0) >= self.per_key_limit:
+                continue
+            if budget_blocked or self._in_use_bytes + waiter.cost > self.max_bytes:
+                # 保持FIFO：内存预算不足时，后面的请求也不能越过它
+                budget_blocked = True
+                continue
+            self._queue.remove(waiter)
+            waiter.admitted = True
+            self._in_use_bytes += waiter.cost
+            self._active[waiter.key] = self._active.get(waiter.key, 0) + 1
+            waiter.wake()
+
+    async def acquire(self, key: Hashable, cost: int, timeout: Optional[float] = None) -> int:
+        """申请额度，返回实际占用的字节数（用于 release）；超时抛出 AdmissionTimeout"""
+        cost = max(0, min(int(cost), self.max_bytes))
+        timeout = self.timeout if timeout is None else timeout
+        waiter = _Waiter(key, cost)
+        with self._lock:
+            self._queue.append(waiter)
+            self._dispatch()
+        try:
+            if not waiter.admitted:
+                await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+        except asyncio.TimeoutError:
+            if self._abandon(waiter, timed_out=True):
+                raise AdmissionTimeout(
+                    f"Waited {timeout:.0f}s for image processing capacity ({len(self._queue)} requests queued)"
+                )
+            # 超时的同时已被放行，按获准处理
+        except asyncio.CancelledError:
+            # 请求被取消（例如客户端断开）：离开队列，已获准的额度立即归还
+            if not self._abandon(waiter):
+                self.release(key, cost)
+            raise
+        waited = time.monotonic() - waiter.enqueued_at
+        with self._lock:
+            self._admitted_total += 1
+            self._wait_seconds_total += waited
+            self._wait_samples.append(waited)
+        return cost
+
+    def _abandon(self, waiter: _Waiter, timed_out: bool = False) -> bool:
+        """把未获准的等待者移出队列并返回True；已获准时返回False"""
+        with self._lock:
+            if waiter.admitted:
+                return False
+            self._queue.remove(waiter)
+            if timed_out:
+                self._timeouts_total += 1
+            # 排在前面的请求离开后，后面的请求可能已经可以放行
+            self._dispatch()
+            return True
+
+    def release(self, key: Hashable, cost: int) -> None:
+        with self._lock:
+            self._in_use_bytes -= cost
+            remaining = self._active.get(key, 0) - 1
+            if remaining > 0:
+                self._active[key] = remaining
+            else:
+                self._active.pop(key, None)
+            self._dispatch()
+
+    @asynccontextmanager
+    async def admit(self, key: Hashable, cost: int, timeout: Optional[float] = None) -> AsyncIterator[None]:
+        """async with admission.admit(user_id, cost): 在额度内执行图片处理"""
+        cost = await self.acquire(key, cost, timeout=timeout)
+        try:
+            yield
+        finally:
+            self.release(key, cost)
+
+    def metrics(self) -> Dict[str, Any]:
+        """队列长度、占用额度与等待时间统计（本进程）"""
+        with self._lock:
+            samples = sorted(self._wait_samples)
+            oldest_wait = time.monotonic() - self._queue[0].enqueued_at if self._queue else 0.0
+
+            def percentile(p: float) -> float:
+                return samples[min(len(samples) - 1, int(p * len(samples)))] if samples else 0.0
+
+            return {
+                "queue_length": len(self._queue),
+                "oldest_wait_seconds": round(oldest_wait, 3),
+                "active_requests": sum(self._active.values()),
+                "active_users": len(self._active),
+                "in_use_bytes": self._in_use_bytes,
+                "max_bytes": self.max_bytes,
+                "per_user_limit": self.per_key_limit,
+                "admitted_total": self._admitted_total,
+                "timeouts_total": self._timeouts_total,
+                "wait_seconds_total": round(self._wait_seconds_total, 3),
+                "wait_seconds_p50": round(percentile(0.5), 3),
+                "wait_seconds_p95": round(percentile(0.95), 3),
+                "wait_seconds_max": round(samples[-1], 3) if samples else 0.0,
+            }
+
+
+# 全局上传准入控制实例（每个API进程一份，预算按进程配置）
+upload_admission = UploadAdmissionController(
+    max_bytes=settings.UPLOAD_ADMISSION_MAX_BYTES,
+    per_key_limit=settings.UPLOAD_ADMISSION_PER_USER,
+    timeout=settings.UPLOAD_ADMISSION_TIMEOUT,
+)
@@ -0,0 +1,165 @@
+"""
+图片文件发送的吞吐与CPU开销基准：Starlette 默认的 StaticFiles / FileResponse（64KB分块）
+与 CachedStaticFiles / RangeFileResponse（FILE_RESPONSE_CHUNK_SIZE 大块读取，服务器支持时零拷贝发送）对比。
+
+在子进程中用 uvicorn 启动只包含这几个路由的应用，多个并发连接反复下载同一个样本文件（完整文件或随机区间），
+报告吞吐（MB/s）和服务器进程每发送1GB消耗的CPU秒数（读取 /proc/<pid>/stat，仅限Linux）。
+
+用法:
+    python benchmarks/bench_file_serving.py                         # 20MB 样本，4个并发连接
+    python benchmarks/bench_file_serving.py --size-mb 50 --concurrency 8 --requests 200
+    python benchmarks/bench_file_serving.py --range-kb 256          # 随机 256KB 区间请求
+"""
+import argparse
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add the project root directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import httpx
+
+SAMPLE_NAME = "sample.jpg"
+
+TARGETS = {
+    "static": "StaticFiles",
+    "cached_static": "CachedStaticFiles",
+    "file_response": "FileResponse",
+    "range_file_response": "RangeFileResponse",
+}
+
+
+def create_app(directory: str):
+    """子进程中执行：只包含被测路由的应用"""
+    from starlette.applications import Starlette
+    from starlette.responses import FileResponse
+    from starlette.routing import Mount, Route
+    from starlette.staticfiles import StaticFiles
+
+    from app.core.http_cache import CachedStaticFiles, RangeFileResponse
+
+    sample = os.path.join(directory, SAMPLE_NAME)
+
+    async def file_response(request):
+        return FileResponse(sample, media_type="image/jpeg")
+
+    async def range_file_response(request):
+        return RangeFileResponse(sample, media_type="image/jpeg")
+
+    return Starlette(routes=[
+        Mount("/static", StaticFiles(directory=directory)),
+        Mount("/cached_static", CachedStaticFiles(directory=directory)),
+        Route(f"/file_response/{SAMPLE_NAME}", file_response),
+        Route(f"/range_file_response/{SAMPLE_NAME}", range_file_response),
+    ])
+
+
+def serve(directory: str, port: int) -> None:
+    import uvicorn
+
+    uvicorn.run(create_app(directory), host="127.0.0.1", port=port, log_level="warning", access_log=False)
+
+
+def process_cpu_seconds(pid: int) -> float:
+    """进程累计的用户态+内核态CPU时间（秒）"""
+    with open(f"/proc/{pid}/stat") as stat:
+        fields = stat.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(base_url: str, timeout: float = 15.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"{base_url}/static/{SAMPLE_NAME}", headers={"Range": "bytes=0-0"}, timeout=1.0)
+            return
+        except httpx.TransportError:
+            time.sleep(0.1)
+    raise RuntimeError("Benchmark server did not start")
+
+
+def run_target(base_url: str, target: str, pid: int, args, file_size: int) -> dict:
+    url = f"{base_url}/{target}/{SAMPLE_NAME}"
+    range_bytes = args.range_kb * 1024
+    rng = random.Random(0)
+    ranges = [rng.randrange(0, file_size - range_bytes) for _ in range(args.requests)] if range_bytes else []
+
+    def fetch(index: int) -> int:
+        headers = {}
+        if range_bytes:
+            start = ranges[index]
+            headers["Range"] = f"bytes={start}-{start + range_bytes - 1}"
+        received = 0
+        with client.stream("GET", url, headers=headers) as response:
+            response.raise_for_status()
+            for chunk in response.iter_raw(1024 * 1024):
+                received += len(chunk)
+        return received
+
+    with httpx.Client(timeout=60.0, limits=httpx.Limits(max_connections=args.concurrency)) as client:
+        fetch(0)  # 预热
+        cpu_before = process_cpu_seconds(pid)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            total = sum(executor.map(fetch, range(args.requests)))
+        elapsed = time.perf_counter() - started
+        cpu = process_cpu_seconds(pid) - cpu_before
+
+    gigabytes = total / 1024 ** 3
+    return {
+        "mb_per_s": total / 1024 ** 2 / elapsed,
+        "cpu_per_gb": cpu / gigabytes if gigabytes else 0.0,
+        "requests_per_s": args.requests / elapsed,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=20, help="样本文件大小（MB）")
+    parser.add_argument("--requests", type=int, default=100, help="每个目标的请求数")
+    parser.add_argument("--concurrency", type=int, default=4, help="并发连接数")
+    parser.add_argument("--range-kb", type=int, default=0, help="每个请求随机读取的区间大小（KB），0表示完整文件")
+    parser.add_argument("--serve", nargs=2, metavar=("DIRECTORY", "PORT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve[0], int(args.serve[1]))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sample = Path(tmp) / SAMPLE_NAME
+        sample.write_bytes(os.urandom(args.size_mb * 1024 * 1024))
+        file_size = sample.stat().st_size
+        port = free_port()
+        server = subprocess.Popen([sys.executable, __file__, "--serve", tmp, str(port)])
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            wait_until_ready(base_url)
+            mode = f"random {args.range_kb}KB ranges" if args.range_kb else "full file"
+            print(f"\n{args.size_mb} MB sample, {mode}, {args.requests} requests, {args.concurrency} connections")
+            for target, label in TARGETS.items():
+                result = run_target(base_url, target, server.pid, args, file_size)
+                print(
+                    f"  {label:<20} {result['mb_per_s']:9.1f} MB/s   {result['requests_per_s']:8.1f} req/s"
+                    f"   server CPU {result['cpu_per_gb']:6.2f} s/GB"
+                )
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
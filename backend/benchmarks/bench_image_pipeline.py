@@ -0,0 +1,142 @@
+"""
+上传图片处理流程的微基准测试：单次解码的 process_image 对比原先的两次解码流程
+（compress_image 保存JPEG后，add_watermark 再重新打开、合成并保存）。
+
+用法:
+    python benchmarks/bench_image_pipeline.py                       # 使用生成的大图样本
+    python benchmarks/bench_image_pipeline.py photo1.jpg photo2.png # 使用指定样本
+    python benchmarks/bench_image_pipeline.py --repeat 5 --font /path/to/font.ttf
+
+最后单独对比水印叠加：整图透明图层 + alpha_composite 对比缓存蒙版的角落局部混合。
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add the project root directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from PIL import Image, ImageDraw, ImageFont
+
+from app.core.config import settings
+from app.core.image_utils import apply_watermark, generate_renditions, process_image
+
+FALLBACK_FONTS = [
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans.ttf",
+    "/Library/Fonts/Arial.ttf",
+    "C:/Windows/Fonts/arial.ttf",
+]
+
+
+def legacy_two_pass(image_path: Path, quality: int = 85, max_size: tuple = (1920, 1080)):
+    """原先的两次解码流程（compress_image 含衍生图生成 + add_watermark），仅用于对比"""
+    with Image.open(image_path) as img:
+        if img.size[0] > max_size[0] or img.size[1] > max_size[1]:
+            img.thumbnail(max_size, Image.Resampling.LANCZOS)
+        if img.mode in ('RGBA', 'P'):
+            img = img.convert('RGB')
+        img.save(image_path, 'JPEG', quality=quality, optimize=True)
+        generate_renditions(img, image_path)
+
+    if not settings.WATERMARK_TEXT or not Path(settings.WATERMARK_FONT_PATH).exists():
+        return
+
+    with Image.open(image_path) as base:
+        legacy_watermark_overlay(base).save(image_path)
+
+
+def legacy_watermark_overlay(img: Image.Image) -> Image.Image:
+    """原先的水印叠加：每次加载字体、分配整图RGBA图层并整图合成，仅用于对比"""
+    base = img.convert("RGBA")
+    txt = Image.new("RGBA", base.size, (255, 255, 255, 0))
+    fnt = ImageFont.truetype(settings.WATERMARK_FONT_PATH, settings.WATERMARK_FONT_SIZE)
+    d = ImageDraw.Draw(txt)
+    text_bbox = d.textbbox((0, 0), settings.WATERMARK_TEXT, font=fnt)
+    position = (base.width - (text_bbox[2] - text_bbox[0]) - 10,
+                base.height - (text_bbox[3] - text_bbox[1]) - 10)
+    d.text(position, settings.WATERMARK_TEXT, font=fnt, fill=(255, 255, 255, 128))
+    return Image.alpha_composite(base, txt).convert('RGB')
+
+
+def time_watermark(func, frame: Image.Image, repeat: int) -> list:
+    timings = []
+    for _ in range(repeat):
+        work = frame.copy()
+        start = time.perf_counter()
+        func(work)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def make_samples(directory: Path) -> list:
+    """生成大尺寸JPEG/PNG样本（带噪声，避免编码器走捷径）"""
+    samples = []
+    for name, size, fmt in [("large_24mp.jpg", (6000, 4000), "JPEG"),
+                            ("large_12mp.jpg", (4032, 3024), "JPEG"),
+                            ("large_8mp.png", (3840, 2160), "PNG")]:
+        img = Image.effect_noise(size, 64).convert("RGB")
+        overlay = Image.linear_gradient("L").resize(size).convert("RGB")
+        img = Image.blend(img, overlay, 0.5)
+        path = directory / name
+        img.save(path, fmt, quality=95) if fmt == "JPEG" else img.save(path, fmt)
+        samples.append(path)
+    return samples
+
+
+def time_variant(func, sample: Path, workdir: Path, repeat: int) -> list:
+    timings = []
+    for i in range(repeat):
+        work_path = workdir / f"{i}_{sample.name}"
+        shutil.copyfile(sample, work_path)
+        start = time.perf_counter()
+        func(work_path)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("samples", nargs="*", type=Path, help="样本图片路径，留空则自动生成")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--font", help="水印字体路径，默认使用配置或系统常见字体")
+    args = parser.parse_args()
+
+    font = args.font or next((f for f in [settings.WATERMARK_FONT_PATH, *FALLBACK_FONTS] if Path(f).exists()), None)
+    if font:
+        settings.WATERMARK_FONT_PATH = font
+    else:
+        print("Warning: no watermark font found, both variants will skip the watermark step")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+        samples = args.samples or make_samples(tmp_dir)
+
+        print(f"{'sample':<24}{'two-pass (ms)':>16}{'single-pass (ms)':>18}{'speedup':>10}")
+        for sample in samples:
+            legacy = time_variant(legacy_two_pass, sample, tmp_dir, args.repeat)
+            single = time_variant(process_image, sample, tmp_dir, args.repeat)
+            legacy_ms = statistics.median(legacy) * 1000
+            single_ms = statistics.median(single) * 1000
+            print(f"{sample.name:<24}{legacy_ms:>16.1f}{single_ms:>18.1f}{legacy_ms / single_ms:>9.2f}x")
+
+        if font and settings.WATERMARK_TEXT:
+            print()
+            print(f"{'watermark frame':<24}{'full-frame (ms)':>16}{'corner (ms)':>18}{'speedup':>10}")
+            for size in [(1920, 1080), (1280, 853), (640, 427)]:
+                frame = Image.effect_noise(size, 64).convert("RGB")
+                legacy = time_watermark(legacy_watermark_overlay, frame, args.repeat * 5)
+                corner = time_watermark(apply_watermark, frame, args.repeat * 5)
+                legacy_ms = statistics.median(legacy) * 1000
+                corner_ms = statistics.median(corner) * 1000
+                label = f"{size[0]}x{size[1]}"
+                print(f"{label:<24}{legacy_ms:>16.2f}{corner_ms:>18.2f}{legacy_ms / corner_ms:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+大尺寸原图（24-50MP 相机JPEG）入库处理的耗时与峰值内存基准：
+完整解码后缩放、Pillow thumbnail 默认的解码缩小（reducing_gap=2），
+以及完整的 process_image 流程在按目标尺寸 draft 解码前后的对比。
+
+每个样本、每种方式在独立子进程中运行。峰值内存取子进程的 VmHWM（Linux），其他平台取 ru_maxrss；
+同时报告相对处理前常驻内存的增量，即单个上传处理占用的内存。
+
+用法:
+    python benchmarks/bench_large_decode.py                        # 使用生成的 24MP / 48MP 样本
+    python benchmarks/bench_large_decode.py photo1.jpg photo2.jpg  # 使用指定样本
+    python benchmarks/bench_large_decode.py --repeat 5
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add the project root directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from PIL import Image
+
+from app.core.config import settings
+
+# 生成样本的尺寸：24MP（6000x4000）与 48MP（8000x6000）
+SAMPLE_SIZES = [(6000, 4000), (8000, 6000)]
+
+MODES = {
+    "full": "完整解码后缩放",
+    "thumbnail": "thumbnail 默认解码缩小",
+    "process_image_no_draft": "process_image（不做 draft）",
+    "process_image": "process_image（draft 到目标尺寸）",
+}
+
+
+def make_sample(path: Path, size: tuple) -> None:
+    """生成带细节的大图样本（低分辨率噪声放大），使JPEG解码量接近真实照片"""
+    import numpy as np
+
+    rng = np.random.default_rng(size[0])
+    noise = rng.integers(0, 256, (size[1] // 10, size[0] // 10, 3), dtype=np.uint8)
+    Image.fromarray(noise).resize(size, Image.Resampling.BILINEAR).save(path, "JPEG", quality=90)
+
+
+def peak_rss_mb() -> float:
+    """当前进程的峰值常驻内存（MB）。Linux 读取 VmHWM（ru_maxrss 会跨 exec 继承父进程的峰值）"""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 以字节为单位，其他平台以 KB 为单位
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def run_once(mode: str, sample: Path, workdir: Path) -> dict:
+    """子进程中执行一次处理，返回耗时（毫秒）、峰值内存与处理占用的内存增量（MB）"""
+    from app.core import image_utils
+
+    max_size = (settings.IMAGE_MAX_WIDTH, settings.IMAGE_MAX_HEIGHT)
+    source = workdir / f"source{sample.suffix}"
+    shutil.copyfile(sample, source)
+    baseline = peak_rss_mb()
+    started = time.perf_counter()
+    if mode.startswith("process_image"):
+        if mode == "process_image_no_draft":
+            image_utils.draft_for_size = lambda img, min_size: False
+        info = image_utils.process_image(source, workdir / "out.jpg")
+        size = (info["width"], info["height"])
+    else:
+        with Image.open(source) as img:
+            if mode == "full":
+                img.load()
+            img.thumbnail(max_size, Image.Resampling.LANCZOS)
+            img.save(workdir / "out.jpg", "JPEG", quality=settings.IMAGE_QUALITY)
+            size = img.size
+    elapsed = (time.perf_counter() - started) * 1000
+    peak = peak_rss_mb()
+    return {"ms": elapsed, "peak_mb": peak, "delta_mb": peak - baseline, "size": list(size)}
+
+
+def measure(mode: str, sample: Path) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", mode, str(sample), tmp],
+            check=True, capture_output=True, text=True,
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("samples", nargs="*", help="样本图片路径，省略时生成 24MP / 48MP 样本")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--child", nargs=3, metavar=("MODE", "SAMPLE", "WORKDIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        mode, sample, workdir = args.child
+        print(json.dumps(run_once(mode, Path(sample), Path(workdir))))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        samples = [Path(sample) for sample in args.samples]
+        if not samples:
+            for width, height in SAMPLE_SIZES:
+                sample = Path(tmp) / f"sample_{width}x{height}.jpg"
+                make_sample(sample, (width, height))
+                samples.append(sample)
+
+        for sample in samples:
+            with Image.open(sample) as img:
+                megapixels = img.size[0] * img.size[1] / 1e6
+                print(f"\n{sample.name}: {img.size[0]}x{img.size[1]} ({megapixels:.1f} MP, {img.format})")
+            for mode, label in MODES.items():
+                runs = [measure(mode, sample) for _ in range(args.repeat)]
+                print(
+                    f"  {label:<36} median {statistics.median(r['ms'] for r in runs):8.1f} ms"
+                    f"   peak RSS {max(r['peak_mb'] for r in runs):7.1f} MB"
+                    f" (+{max(r['delta_mb'] for r in runs):6.1f} MB)   -> {runs[0]['size'][0]}x{runs[0]['size'][1]}"
+                )
+
+
+if __name__ == "__main__":
+    main()
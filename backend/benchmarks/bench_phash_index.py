@@ -0,0 +1,62 @@
+"""
+近似重复索引（PHashIndex）的查询延迟基准：随机生成 N 个64位感知哈希，
+其中一部分带有少量翻转位的“近似副本”，测量构建时间和不同距离阈值下的单次查询耗时。
+
+用法:
+    python benchmarks/bench_phash_index.py                 # 默认 100 万张图片
+    python benchmarks/bench_phash_index.py --size 200000 --queries 2000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+# Add the project root directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+
+from app.services.phash_index import PHashIndex
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    hashes = rng.integers(0, 2 ** 63, size=args.size, dtype=np.uint64) * np.uint64(2) + rng.integers(0, 2, size=args.size, dtype=np.uint64)
+    # 每100张中有1张是前一张翻转了1-6位的近似副本
+    copies = np.arange(1, args.size, 100)
+    for index in copies:
+        flips = rng.choice(64, size=rng.integers(1, 7), replace=False)
+        hashes[index] = hashes[index - 1] ^ np.uint64(sum(1 << int(bit) for bit in flips))
+
+    index = PHashIndex(snapshot_path=os.devnull)
+    start = time.perf_counter()
+    index._build(np.arange(1, args.size + 1, dtype=np.int64), hashes)
+    index._loaded = True
+    print(f"built index of {args.size} hashes in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    # 增量插入：模拟自上次重建以来新增的图片
+    for image_id in range(args.size + 1, args.size + 2001):
+        index.add(image_id, f"{int(rng.integers(0, 2 ** 63)):016x}")
+
+    queries = [f"{int(hashes[i - 1]):016x}" for i in rng.choice(copies, size=args.queries)]
+    print(f"{'max distance':<14}{'median (ms)':>12}{'p99 (ms)':>10}{'avg matches':>13}")
+    for max_distance in (3, 6, 7, 11):
+        timings, found = [], []
+        for query in queries:
+            start = time.perf_counter()
+            matches = index.search(query, max_distance)
+            timings.append(time.perf_counter() - start)
+            found.append(len(matches))
+        timings.sort()
+        print(f"{max_distance:<14}{statistics.median(timings) * 1000:>12.3f}"
+              f"{timings[int(len(timings) * 0.99)] * 1000:>10.3f}{statistics.mean(found):>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+测试环境：临时目录中的SQLite数据库和上传目录，图片在请求线程内同步处理，不启动应用的后台任务（lifespan）。
+环境变量必须在导入 app 之前设置。
+"""
+import io
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+TEST_DIR = Path(tempfile.mkdtemp(prefix="gallery-tests-"))
+
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{TEST_DIR / 'test.db'}",
+    UPLOAD_DIRECTORY=str(TEST_DIR / "uploads"),
+    UPLOAD_SESSION_DIRECTORY=str(TEST_DIR / "upload_sessions"),
+    GC_QUARANTINE_DIRECTORY=str(TEST_DIR / "gc_quarantine"),
+    RENDER_CACHE_DIRECTORY=str(TEST_DIR / "render_cache"),
+    PHASH_INDEX_PATH=str(TEST_DIR / "phash_index.npz"),
+    STORAGE_BACKEND="local",
+    IMAGE_WORKER_COUNT="0",
+    CONTACT_SHEET_TILES="0",
+    JOB_WORKER_CONCURRENCY="0",
+    GC_INTERVAL="0",
+    WATERMARK_TEXT="",
+)
+sys.path.insert(0, str(BACKEND_DIR))
+(TEST_DIR / "uploads").mkdir()
+
+from fastapi.testclient import TestClient  # noqa: E402
+from PIL import Image as PILImage  # noqa: E402
+
+from app import crud, schemas  # noqa: E402
+from app.core import security  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.db.base import Base  # noqa: E402
+from app.db.session import SessionLocal, engine  # noqa: E402
+from app.main import app as fastapi_app  # noqa: E402
+from app.services.phash_index import phash_index  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    """每个测试使用空的数据库和上传目录"""
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    for directory in (settings.UPLOAD_DIRECTORY, settings.UPLOAD_SESSION_DIRECTORY, settings.GC_QUARANTINE_DIRECTORY):
+        shutil.rmtree(directory, ignore_errors=True)
+        Path(directory).mkdir(parents=True)
+    db = SessionLocal()
+    try:
+        phash_index.rebuild(db)
+    finally:
+        db.close()
+    yield
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def user(db):
+    return crud.user.create(
+        db, obj_in=schemas.UserCreate(username="alice", email="alice@example.com", password="password123")
+    )
+
+
+@pytest.fixture
+def auth_headers(user):
+    return {"Authorization": f"Bearer {security.create_access_token({'sub': user.username})}"}
+
+
+@pytest.fixture
+def client():
+    # 不进入 lifespan：测试不启动任务执行、文件回收等后台线程
+    return TestClient(fastapi_app)
+
+
+def make_jpeg(width: int = 640, height: int = 480, color=(120, 30, 200)) -> bytes:
+    buffer = io.BytesIO()
+    PILImage.new("RGB", (width, height), color).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def jpeg():
+    return make_jpeg
@@ -0,0 +1,110 @@
+import hashlib
+
+from app import crud, models, schemas
+from app.core import security
+
+
+def upload(client, headers, content, **data):
+    response = client.post(
+        "/api/v1/images/",
+        files={"file": ("photo.jpg", content, "image/jpeg")},
+        data={"title": "photo", **data},
+        headers=headers,
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def refcount(db, file_hash):
+    db.expire_all()
+    blob = crud.blob.get_by_hash(db, file_hash=file_hash)
+    return blob.refcount if blob else None
+
+
+def test_upload_acquires_blob(client, auth_headers, db, jpeg):
+    content = jpeg()
+    image = upload(client, auth_headers, content)
+    file_hash = hashlib.sha256(content).hexdigest()
+
+    assert refcount(db, file_hash) == 1
+    assert db.query(models.Image).get(image["id"]).blob_hash == file_hash
+
+
+def test_fast_upload_into_gallery_shares_blob(client, auth_headers, db, user, jpeg):
+    gallery = crud.gallery.create_with_owner(db, obj_in=schemas.GalleryCreate(title="trip"), owner_id=user.id)
+    content = jpeg()
+    original = upload(client, auth_headers, content)
+    copy = upload(client, auth_headers, content, gallery_id=gallery.id)
+
+    assert copy["id"] != original["id"]
+    assert refcount(db, hashlib.sha256(content).hexdigest()) == 2
+
+
+def test_batch_upload_counts_each_record(client, auth_headers, db, jpeg):
+    content = jpeg(color=(10, 200, 30))
+    response = client.post(
+        "/api/v1/images/batch",
+        files=[("files", ("a.jpg", content, "image/jpeg")), ("files", ("b.jpg", content, "image/jpeg"))],
+        headers=auth_headers,
+    )
+    assert response.status_code == 200, response.text
+    items = response.json()["items"]
+
+    assert [item["status"] for item in items] == ["created", "fast_upload"]
+    assert refcount(db, items[0]["file_hash"]) == 2
+
+
+def test_remove_releases_blob(client, auth_headers, db, user, jpeg):
+    gallery = crud.gallery.create_with_owner(db, obj_in=schemas.GalleryCreate(title="trip"), owner_id=user.id)
+    content = jpeg()
+    original = upload(client, auth_headers, content)
+    copy = upload(client, auth_headers, content, gallery_id=gallery.id)
+
+    file_hash = hashlib.sha256(content).hexdigest()
+
+    crud.image.remove(db, id=copy["id"])
+    assert refcount(db, file_hash) == 1
+
+    crud.image.remove(db, id=original["id"])
+    assert refcount(db, file_hash) == 0
+    assert [blob.hash for blob in crud.blob.get_unreferenced(db)] == [file_hash]
+
+
+def test_user_delete_releases_cascaded_images(client, auth_headers, db, user, jpeg):
+    bob = crud.user.create(db, obj_in=schemas.UserCreate(username="bob", email="bob@example.com", password="password123"))
+    bob_headers = {"Authorization": f"Bearer {security.create_access_token({'sub': bob.username})}"}
+    gallery = crud.gallery.create_with_owner(db, obj_in=schemas.GalleryCreate(title="trip"), owner_id=bob.id)
+    shared, own = jpeg(), jpeg(color=(0, 0, 0))
+    upload(client, auth_headers, shared)
+    upload(client, auth_headers, own)
+    upload(client, bob_headers, shared, gallery_id=gallery.id)
+    shared_hash, own_hash = hashlib.sha256(shared).hexdigest(), hashlib.sha256(own).hexdigest()
+    assert refcount(db, shared_hash) == 2
+
+    crud.user.remove(db, id=user.id)
+
+    assert db.query(models.Image).filter(models.Image.owner_id == user.id).count() == 0
+    assert refcount(db, shared_hash) == 1
+    assert refcount(db, own_hash) == 0
+
+
+def test_gallery_delete_releases_blobs_without_per_image_bookkeeping(
+    client, auth_headers, db, user, jpeg, monkeypatch
+):
+    gallery = crud.gallery.create_with_owner(db, obj_in=schemas.GalleryCreate(title="trip"), owner_id=user.id)
+    shared, own = jpeg(), jpeg(color=(0, 0, 0))
+    upload(client, auth_headers, shared)
+    cover = upload(client, auth_headers, shared, gallery_id=gallery.id)
+    upload(client, auth_headers, own, gallery_id=gallery.id)
+    shared_hash, own_hash = hashlib.sha256(shared).hexdigest(), hashlib.sha256(own).hexdigest()
+    crud.gallery.update(db, db_obj=gallery, obj_in={"cover_image_id": cover["id"]})
+    scheduled = []
+    monkeypatch.setattr("app.crud.crud_gallery.contact_sheet_refresher.schedule", scheduled.append)
+
+    crud.gallery.remove(db, id=gallery.id)
+
+    assert db.query(models.Gallery).get(gallery.id) is None
+    assert db.query(models.Image).filter(models.Image.gallery_id == gallery.id).count() == 0
+    assert refcount(db, shared_hash) == 1
+    assert refcount(db, own_hash) == 0
+    assert scheduled == []
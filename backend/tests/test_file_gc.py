@@ -0,0 +1,87 @@
+import os
+import time
+import uuid
+from pathlib import Path
+
+from app import crud, schemas
+from app.core.config import settings
+from app.core.image_utils import generate_image_url
+from app.services.file_gc import collect_garbage
+
+
+def write_file(key: str, content: bytes = b"\xff\xd8data") -> Path:
+    """在上传目录中写入文件，修改时间早于最短保留时间"""
+    path = Path(settings.UPLOAD_DIRECTORY) / key
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+    old = time.time() - settings.GC_MIN_FILE_AGE - 60
+    os.utime(path, (old, old))
+    return path
+
+
+def add_image(db, user, filepath: str):
+    return crud.image.create(
+        db,
+        obj_in=schemas.ImageCreate(title="legacy"),
+        owner_id=user.id,
+        filename=f"{uuid.uuid4()}.jpg",
+        filepath=filepath,
+    )
+
+
+def test_legacy_and_absolute_paths_are_referenced(client, db, user):
+    backslash_name = f"{uuid.uuid4()}.jpg"
+    backslash_file = write_file(f"gallery_56/{backslash_name}")
+    backslash_image = add_image(db, user, f"uploads\\gallery_56\\{backslash_name}")
+    absolute_file = write_file(f"gallery_57/{uuid.uuid4()}.jpg")
+    add_image(db, user, os.path.abspath(absolute_file))
+    relative_file = write_file(f"{uuid.uuid4()}.jpg")
+    add_image(db, user, f"uploads/{relative_file.name}")
+    orphan_file = write_file(f"gallery_56/{uuid.uuid4()}.jpg")
+
+    stats = collect_garbage(db, purge=False)
+
+    assert stats["orphans"] == 1
+    assert not orphan_file.exists()
+    assert backslash_file.exists() and absolute_file.exists() and relative_file.exists()
+    assert client.get(generate_image_url(backslash_image)).status_code == 200
+
+
+def test_static_and_non_image_files_are_kept(db):
+    kept = [write_file(".gitkeep", b""), write_file("default_topic_cover.jpg"), write_file("README.txt", b"notes")]
+    interrupted_upload = write_file(f".{uuid.uuid4()}.upload")
+
+    stats = collect_garbage(db, purge=False)
+
+    assert all(path.exists() for path in kept)
+    assert not interrupted_upload.exists()
+    assert stats["orphans"] == 1
+
+
+def test_released_blob_is_quarantined(client, auth_headers, db, jpeg):
+    response = client.post(
+        "/api/v1/images/", files={"file": ("a.jpg", jpeg(), "image/jpeg")}, data={"title": "a"}, headers=auth_headers
+    )
+    image_path = Path(db.query(crud.image.model).get(response.json()["id"]).filepath)
+    crud.image.remove(db, id=response.json()["id"])
+
+    stats = collect_garbage(db, purge=False)
+
+    assert stats["released_blobs"] == 1
+    assert not image_path.exists()
+
+
+def test_orphans_are_found_in_batches(db, user, monkeypatch):
+    monkeypatch.setattr(settings, "GC_BATCH_SIZE", 2)
+    referenced = [write_file(f"gallery_1/{uuid.uuid4()}.jpg") for _ in range(3)]
+    for path in referenced:
+        add_image(db, user, str(Path(settings.UPLOAD_DIRECTORY) / path.relative_to(settings.UPLOAD_DIRECTORY)))
+    legacy = write_file(f"gallery_2/{uuid.uuid4()}.jpg")
+    add_image(db, user, f"uploads\\gallery_2\\{legacy.name}")
+    orphans = [write_file(f"gallery_1/{uuid.uuid4()}.jpg") for _ in range(4)]
+
+    stats = collect_garbage(db, purge=False)
+
+    assert stats["orphans"] == 4 and stats["restored"] == 0
+    assert all(path.exists() for path in referenced + [legacy])
+    assert not any(path.exists() for path in orphans)
@@ -0,0 +1,39 @@
+from app import crud, schemas
+
+
+def upload(client, headers, content, **data):
+    response = client.post(
+        "/api/v1/images/",
+        files={"file": ("photo.jpg", content, "image/jpeg")},
+        data={"title": "photo", **data},
+        headers=headers,
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_gallery_lists_omit_images_and_default_the_cover(client, auth_headers, db, user, jpeg):
+    trip = crud.gallery.create_with_owner(db, obj_in=schemas.GalleryCreate(title="trip"), owner_id=user.id)
+    walk = crud.gallery.create_with_owner(db, obj_in=schemas.GalleryCreate(title="walk"), owner_id=user.id)
+    first = upload(client, auth_headers, jpeg(color=(200, 0, 0)), gallery_id=trip.id)
+    upload(client, auth_headers, jpeg(color=(0, 200, 0)), gallery_id=trip.id)
+    cover = upload(client, auth_headers, jpeg(color=(0, 0, 200)), gallery_id=walk.id)
+    upload(client, auth_headers, jpeg(color=(90, 90, 0)), gallery_id=walk.id)
+    response = client.put(
+        f"/api/v1/galleries/{walk.id}", json={"cover_image_id": cover["id"]}, headers=auth_headers
+    )
+    assert response.status_code == 200, response.text
+
+    for path in ("/api/v1/galleries/", "/api/v1/galleries/recent", "/api/v1/users/alice/galleries"):
+        response = client.get(path, headers=auth_headers)
+        assert response.status_code == 200, response.text
+        galleries = {gallery["title"]: gallery for gallery in response.json()}
+
+        assert all("images" not in gallery for gallery in galleries.values())
+        assert galleries["trip"]["cover_image"]["id"] == first["id"]
+        assert "?v=" in galleries["trip"]["cover_image"]["thumbnail_url"]
+        assert galleries["walk"]["cover_image"]["id"] == cover["id"]
+
+    # 列表中的默认封面只用于展示，不写回数据库
+    db.expire_all()
+    assert crud.gallery.get(db, id=trip.id).cover_image_id is None
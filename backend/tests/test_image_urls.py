@@ -0,0 +1,80 @@
+from pathlib import Path
+
+from app import crud, models, schemas
+from app.core.image_utils import get_rendition_path
+from app.core.storage import LocalStorage
+
+
+def get_image(client, headers, image_id):
+    response = client.get(f"/api/v1/images/{image_id}", headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_batch_upload_urls_match_image_endpoint(client, auth_headers, jpeg):
+    first, second = jpeg(color=(200, 0, 0)), jpeg(color=(0, 0, 200))
+    response = client.post(
+        "/api/v1/images/batch",
+        files=[
+            ("files", ("a.jpg", first, "image/jpeg")),
+            ("files", ("b.jpg", second, "image/jpeg")),
+            ("files", ("c.jpg", first, "image/jpeg")),
+        ],
+        headers=auth_headers,
+    )
+    assert response.status_code == 200, response.text
+    items = response.json()["items"]
+    assert [item["status"] for item in items] == ["created", "created", "fast_upload"]
+
+    for item in items:
+        image = get_image(client, auth_headers, item["image_id"])
+        assert item["image_url"] == image["image_url"]
+        assert item["thumbnail_url"] == image["thumbnail_url"]
+        assert "?v=" in item["image_url"]
+    # 同一内容的记录共用同一个版本化URL
+    assert items[2]["image_url"] == items[0]["image_url"]
+    assert items[1]["image_url"] != items[0]["image_url"]
+
+
+def test_fast_upload_copy_shares_version_and_etag(client, auth_headers, db, user, jpeg):
+    gallery = crud.gallery.create_with_owner(db, obj_in=schemas.GalleryCreate(title="trip"), owner_id=user.id)
+    content = jpeg()
+    ids = []
+    for data in ({"title": "a"}, {"title": "b", "gallery_id": gallery.id}):
+        response = client.post(
+            "/api/v1/images/", files={"file": ("a.jpg", content, "image/jpeg")}, data=data, headers=auth_headers
+        )
+        assert response.status_code == 200, response.text
+        ids.append(response.json()["id"])
+    original, copy = (get_image(client, auth_headers, image_id) for image_id in ids)
+
+    assert copy["id"] != original["id"]
+    assert copy["image_url"] == original["image_url"]
+    etags = {client.get(f"/api/v1/images/{image_id}/file").headers["etag"] for image_id in ids}
+    assert len(etags) == 1
+
+
+def test_missing_rendition_redirects_to_original(client, auth_headers, db, jpeg, monkeypatch):
+    response = client.post(
+        "/api/v1/images/", files={"file": ("a.jpg", jpeg(), "image/jpeg")}, data={"title": "a"}, headers=auth_headers
+    )
+    assert response.status_code == 200, response.text
+    image_id = response.json()["id"]
+    image_path = Path(db.get(models.Image, image_id).filepath)
+    # 模拟尚未生成衍生图的历史图片
+    get_rendition_path(image_path, "thumb").unlink()
+
+    # 序列化时不逐个检查衍生图文件
+    def fail(self, key):
+        raise AssertionError(f"unexpected exists({key})")
+
+    monkeypatch.setattr(LocalStorage, "exists", fail)
+    image = get_image(client, auth_headers, image_id)
+    monkeypatch.undo()
+
+    assert f"{image_path.stem}_thumb.jpg?v=" in image["thumbnail_url"]
+    thumb = client.get(image["thumbnail_url"], follow_redirects=False)
+    assert thumb.status_code == 302
+    assert thumb.headers["location"] == image_path.name
+    assert client.get(image["thumbnail_url"]).content == image_path.read_bytes()
+    assert client.get(image["medium_url"], follow_redirects=False).status_code == 200
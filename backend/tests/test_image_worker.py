@@ -0,0 +1,69 @@
+import asyncio
+import math
+import threading
+import time
+
+import pytest
+
+from app.services.image_worker import ImageWorkerBusy, ImageWorkerPool
+
+
+def test_run_in_process_pool():
+    pool = ImageWorkerPool(max_workers=1, queue_size=0)
+    try:
+        assert asyncio.run(pool.run(math.factorial, 10)) == 3628800
+        assert pool.in_flight == 0
+    finally:
+        pool.shutdown()
+
+
+def test_inline_mode_runs_off_the_event_loop_thread():
+    pool = ImageWorkerPool(max_workers=0, queue_size=0)
+
+    async def main():
+        return threading.get_ident(), await pool.run(threading.get_ident)
+
+    loop_thread, task_thread = asyncio.run(main())
+    assert task_thread != loop_thread
+
+
+def test_run_times_out_and_rejects_when_full():
+    pool = ImageWorkerPool(max_workers=0, queue_size=0)
+
+    async def main():
+        slow = asyncio.ensure_future(pool.run(time.sleep, 0.3))
+        await asyncio.sleep(0.05)
+        with pytest.raises(ImageWorkerBusy):
+            await pool.run(time.sleep, 0)
+        await slow
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.run(time.sleep, 0.3, timeout=0.05)
+
+    asyncio.run(main())
+
+
+def test_run_many_waits_for_own_tasks_when_full():
+    pool = ImageWorkerPool(max_workers=0, queue_size=0)
+
+    def fail_on_two(n):
+        if n == 2:
+            raise ValueError("bad input")
+        return n * 10
+
+    results = asyncio.run(pool.run_many(fail_on_two, [(1,), (2,), (3,)]))
+
+    assert results[0] == 10 and results[2] == 30
+    assert isinstance(results[1], ValueError)
+    assert pool.in_flight == 0
+
+
+def test_render_endpoint(client, auth_headers, jpeg):
+    response = client.post(
+        "/api/v1/images/", files={"file": ("a.jpg", jpeg(), "image/jpeg")}, data={"title": "a"}, headers=auth_headers
+    )
+    image_id = response.json()["id"]
+
+    rendered = client.get(f"/api/v1/images/{image_id}/render", params={"w": 100, "fmt": "webp"})
+
+    assert rendered.status_code == 200
+    assert rendered.headers["content-type"] == "image/webp"
@@ -0,0 +1,216 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.config import settings
+from app.models.job import Job
+from app.services import job_queue
+from app.services.job_queue import (
+    DEAD, QUEUED, RUNNING, SUCCEEDED, JobWorker, PermanentJobError, complete, enqueue, fail, job_handler, lease,
+    retry_delay,
+)
+
+
+@pytest.fixture(autouse=True)
+def isolated_handlers(monkeypatch):
+    monkeypatch.setattr(job_queue, "_handlers", dict(job_queue._handlers))
+    monkeypatch.setattr(settings, "JOB_POLL_INTERVAL", 0.05)
+    monkeypatch.setattr(settings, "JOB_RETRY_BASE_DELAY", 30)
+    monkeypatch.setattr(settings, "JOB_RETRY_MAX_DELAY", 3600)
+
+
+def reload(db, job_id):
+    db.expire_all()
+    return db.query(Job).get(job_id)
+
+
+def run_worker(seconds: float, concurrency: int = 1) -> None:
+    async def main():
+        worker = JobWorker()
+        worker.start(concurrency)
+        await asyncio.sleep(seconds)
+        await worker.stop()
+
+    asyncio.run(main())
+
+
+def test_retry_delay_is_exponential_with_jitter_and_capped():
+    for attempts in range(1, 5):
+        expected = 30 * 2 ** (attempts - 1)
+        assert expected / 2 <= retry_delay(attempts) <= expected
+    assert retry_delay(20) <= settings.JOB_RETRY_MAX_DELAY
+
+
+def test_enqueue_dedupes_pending_jobs(db):
+    first = enqueue(db, "thumbnail", {"id": 1}, dedupe_key="thumbnail:1")
+    second = enqueue(db, "thumbnail", {"id": 1}, dedupe_key="thumbnail:1")
+    assert second.id == first.id
+
+    leased = lease(db, "w1")
+    complete(db, leased[0])
+    third = enqueue(db, "thumbnail", {"id": 1}, dedupe_key="thumbnail:1")
+    assert third.id != first.id
+
+
+
+def test_concurrent_enqueue_returns_existing_job(db, user, monkeypatch):
+    existing = enqueue(db, "thumbnail", {"id": 1}, dedupe_key="thumbnail:1")
+    active_job = job_queue._active_job
+    # 模拟另一个进程在去重检查之后、插入之前添加了同一任务
+    monkeypatch.setattr(
+        job_queue, "_active_job", lambda db, key, lock=False: active_job(db, key) if lock else None
+    )
+    user.full_name = "Alice"
+
+    job = enqueue(db, "thumbnail", {"id": 1}, dedupe_key="thumbnail:1", commit=False)
+    db.commit()
+
+    assert job.id == existing.id
+    assert db.query(Job).filter(Job.dedupe_key == "thumbnail:1").count() == 1
+    # 唯一索引冲突只回滚保存点，调用方事务中的改动仍然提交
+    db.expire_all()
+    assert user.full_name == "Alice"
+
+
+def test_requeue_dead_skips_keys_with_active_jobs(db):
+    for key in ("a", "a", "b", None):
+        job = enqueue(db, "thumbnail", dedupe_key=key)
+        db.query(Job).filter(Job.id == job.id).update({Job.status: DEAD})
+        db.commit()
+    active = enqueue(db, "thumbnail", dedupe_key="b")
+
+    assert job_queue.requeue_dead(db) == 2
+    queued = db.query(Job).filter(Job.status == QUEUED).order_by(Job.id).all()
+    assert [(job.id, job.dedupe_key) for job in queued] == [(2, "a"), (4, None), (active.id, "b")]
+
+def test_failure_backs_off_then_dead_letters(db):
+    dead_letters = []
+    job_handler("flaky", on_dead=lambda db, payload, error: dead_letters.append((payload, error)))(lambda db, p: None)
+    job = enqueue(db, "flaky", {"n": 1}, max_attempts=2)
+
+    (leased,) = lease(db, "w1")
+    assert leased.attempts == 1
+    before = datetime.utcnow()
+    assert fail(db, leased, "boom")
+    requeued = reload(db, job.id)
+    assert requeued.status == QUEUED and requeued.last_error == "boom"
+    assert before + timedelta(seconds=14) <= requeued.run_at <= before + timedelta(seconds=31)
+    assert lease(db, "w1") == []
+
+    db.query(Job).filter(Job.id == job.id).update({Job.run_at: datetime.utcnow()})
+    db.commit()
+    (leased,) = lease(db, "w1")
+    assert leased.attempts == 2
+    fail(db, leased, "boom again")
+
+    assert reload(db, job.id).status == DEAD
+    assert dead_letters == [({"n": 1}, "boom again")]
+
+
+def test_expired_lease_is_reclaimed_and_old_owner_cannot_complete(db):
+    job = enqueue(db, "slow", {})
+    (first,) = lease(db, "w1")
+    db.query(Job).filter(Job.id == job.id).update({Job.locked_until: datetime.utcnow() - timedelta(seconds=1)})
+    db.commit()
+
+    (second,) = lease(db, "w2")
+
+    assert second.locked_by == "w2" and second.attempts == 2
+    assert not complete(db, first)
+    assert complete(db, second)
+    assert reload(db, job.id).status == SUCCEEDED
+
+
+def test_expired_lease_on_last_attempt_is_dead_lettered(db):
+    job = enqueue(db, "slow", {}, max_attempts=1)
+    lease(db, "w1")
+    db.query(Job).filter(Job.id == job.id).update({Job.locked_until: datetime.utcnow() - timedelta(seconds=1)})
+    db.commit()
+
+    assert lease(db, "w2") == []
+    assert reload(db, job.id).status == DEAD
+
+
+def test_worker_retries_and_dead_letters(db, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_RETRY_BASE_DELAY", 0)
+    calls = []
+
+    @job_handler("always_fails")
+    def always_fails(db, payload):
+        calls.append(payload)
+        raise RuntimeError("unavailable")
+
+    @job_handler("bad_payload")
+    def bad_payload(db, payload):
+        raise PermanentJobError("missing image_id")
+
+    retried = enqueue(db, "always_fails", {"n": 1}, max_attempts=3)
+    permanent = enqueue(db, "bad_payload", {}, max_attempts=3)
+    unknown = enqueue(db, "no_such_type", {}, max_attempts=3)
+
+    run_worker(1.0)
+
+    assert len(calls) == 3
+    retried = reload(db, retried.id)
+    assert retried.status == DEAD and retried.attempts == 3
+    assert retried.last_error == "RuntimeError: unavailable"
+    assert (reload(db, permanent.id).status, reload(db, permanent.id).attempts) == (DEAD, 1)
+    assert reload(db, unknown.id).status == DEAD
+
+
+def test_async_handler_runs_off_the_event_loop_thread(db):
+    threads = {}
+
+    @job_handler("async_job")
+    async def async_job(db, payload):
+        threads["handler"] = threading.get_ident()
+        await asyncio.sleep(0)
+
+    job = enqueue(db, "async_job", {})
+
+    async def main():
+        threads["loop"] = threading.get_ident()
+        worker = JobWorker()
+        worker.start(1)
+        await asyncio.sleep(0.5)
+        await worker.stop()
+
+    asyncio.run(main())
+
+    assert threads["handler"] != threads["loop"]
+    assert reload(db, job.id).status == SUCCEEDED
+
+
+def test_stop_does_not_release_a_running_job(db):
+    started = threading.Event()
+    release = threading.Event()
+    states = []
+
+    @job_handler("long_job")
+    def long_job(handler_db, payload):
+        started.set()
+        release.wait(5)
+
+    job = enqueue(db, "long_job", {})
+
+    async def main():
+        worker = JobWorker()
+        worker.start(1)
+        await asyncio.to_thread(started.wait, 5)
+        await worker.stop()
+        # 停止后任务仍由本进程持有，不会被其他进程重复领取
+        current = await asyncio.to_thread(reload, db, job.id)
+        states.append((current.status, current.locked_by))
+        release.set()
+
+    asyncio.run(main())
+
+    assert states == [(RUNNING, JobWorker().worker_id)]
+    # 事件循环关闭时等待线程执行完，由线程提交结果
+    deadline = time.monotonic() + 5
+    while reload(db, job.id).status != SUCCEEDED and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert reload(db, job.id).status == SUCCEEDED
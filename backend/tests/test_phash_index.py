@@ -0,0 +1,90 @@
+import numpy as np
+
+from app import crud, models, schemas
+from app.services import phash_index as phash_index_module
+from app.services.phash_index import PHashIndex, touch_phash
+
+
+def create_image(db, user, name, phash):
+    return crud.image.create(
+        db,
+        obj_in=schemas.ImageCreate(title=name),
+        owner_id=user.id,
+        filename=f"{name}.jpg",
+        filepath=f"/uploads/{name}.jpg",
+        file_info={"phash": phash},
+    )
+
+
+def rewrite_phash(db, image_id, phash):
+    """模拟重新处理或回填脚本在另一个进程中改写感知哈希"""
+    db.bulk_update_mappings(models.Image, [{"id": image_id, "phash": phash}])
+    touch_phash(db, [image_id])
+    db.commit()
+
+
+def found(index, phash):
+    return [image_id for image_id, _ in index.search(phash, 0)]
+
+
+def test_refresh_picks_up_rewritten_phash(db, user, tmp_path, monkeypatch):
+    image = create_image(db, user, "a", "00000000000000ff")
+    cleared = create_image(db, user, "b", "ffff000000000000")
+    index = PHashIndex(str(tmp_path / "index.npz"))
+    index.ensure_loaded(db)
+
+    rewrite_phash(db, image.id, "0f0f0f0f0f0f0f0f")
+    rewrite_phash(db, cleared.id, None)
+    monkeypatch.setattr(phash_index_module.settings, "PHASH_REFRESH_INTERVAL", 0)
+    index.ensure_loaded(db)
+
+    assert found(index, "00000000000000ff") == []
+    assert found(index, "0f0f0f0f0f0f0f0f") == [image.id]
+    assert found(index, "ffff000000000000") == []
+
+
+def test_stale_snapshot_is_brought_up_to_date(db, user, tmp_path):
+    image = create_image(db, user, "a", "00000000000000ff")
+    snapshot = str(tmp_path / "index.npz")
+    index = PHashIndex(snapshot)
+    index.ensure_loaded(db)
+    index.save()
+
+    rewrite_phash(db, image.id, "0f0f0f0f0f0f0f0f")
+    added = create_image(db, user, "c", "ff00000000000000")
+    restarted = PHashIndex(snapshot)
+    restarted.ensure_loaded(db)
+
+    assert found(restarted, "00000000000000ff") == []
+    assert found(restarted, "0f0f0f0f0f0f0f0f") == [image.id]
+    assert found(restarted, "ff00000000000000") == [added.id]
+
+
+def test_merge_keeps_changes_made_while_rebuilding(db, tmp_path, monkeypatch):
+    index = PHashIndex(str(tmp_path / "index.npz"))
+    index.rebuild(db)
+    for image_id in range(1, 5):
+        index.add(image_id, f"{image_id:016x}")
+
+    build_arrays = phash_index_module._build_arrays
+
+    def build_while_writing(ids, hashes):
+        # 重建在锁外进行：期间的写入不会阻塞，且合并后仍然生效
+        index.remove(1)
+        index.add(2, "00000000000000ff")
+        index.add(3, f"{3:016x}")
+        index.add(9, f"{9:016x}")
+        return build_arrays(ids, hashes)
+
+    monkeypatch.setattr(phash_index_module, "_build_arrays", build_while_writing)
+    index._merge_delta()
+
+    assert not index._merging
+    assert found(index, f"{1:016x}") == []
+    assert found(index, f"{2:016x}") == []
+    assert found(index, "00000000000000ff") == [2]
+    assert found(index, f"{3:016x}") == [3]
+    assert found(index, f"{4:016x}") == [4]
+    assert found(index, f"{9:016x}") == [9]
+    assert len(index) == 4
+    assert np.array_equal(index._arrays.ids, [1, 2, 3, 4])
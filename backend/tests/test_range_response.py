@@ -0,0 +1,122 @@
+from email.utils import formatdate
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.core.http_cache import conditional_file_response, make_etag
+
+CONTENT = bytes(range(256)) * 40
+ETAG = make_etag("abc123", len(CONTENT))
+
+
+@pytest.fixture
+def file_client(tmp_path):
+    path = tmp_path / "photo.jpg"
+    path.write_bytes(CONTENT)
+    modified = path.stat().st_mtime
+    app = FastAPI()
+
+    @app.api_route("/file", methods=["GET", "HEAD"])
+    def serve(request: Request):
+        return conditional_file_response(request, path, etag=ETAG, modified=modified, media_type="image/jpeg")
+
+    client = TestClient(app)
+    client.last_modified = formatdate(modified, usegmt=True)
+    return client
+
+
+def test_full_response_advertises_ranges(file_client):
+    response = file_client.get("/file")
+
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["etag"] == ETAG
+
+
+def test_single_range(file_client):
+    response = file_client.get("/file", headers={"Range": "bytes=100-199"})
+
+    assert response.status_code == 206
+    assert response.content == CONTENT[100:200]
+    assert response.headers["content-range"] == f"bytes 100-199/{len(CONTENT)}"
+    assert response.headers["content-length"] == "100"
+
+
+def test_suffix_and_open_ended_ranges(file_client):
+    suffix = file_client.get("/file", headers={"Range": "bytes=-10"})
+    open_ended = file_client.get("/file", headers={"Range": f"bytes={len(CONTENT) - 5}-"})
+
+    assert suffix.status_code == 206 and suffix.content == CONTENT[-10:]
+    assert open_ended.status_code == 206 and open_ended.content == CONTENT[-5:]
+
+
+def test_multiple_ranges_are_multipart(file_client):
+    response = file_client.get("/file", headers={"Range": "bytes=0-9,20-29"})
+
+    assert response.status_code == 206
+    content_type = response.headers["content-type"]
+    assert content_type.startswith("multipart/byteranges; boundary=")
+    boundary = content_type.split("boundary=")[1].encode()
+    body = response.content
+    assert body.endswith(b"--" + boundary + b"--\r\n")
+    assert CONTENT[0:10] in body and CONTENT[20:30] in body
+    assert f"Content-Range: bytes 20-29/{len(CONTENT)}".encode() in body
+    assert int(response.headers["content-length"]) == len(body)
+
+
+def test_unsatisfiable_range(file_client):
+    response = file_client.get("/file", headers={"Range": f"bytes={len(CONTENT) + 10}-"})
+
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+
+def test_invalid_range_returns_full_file(file_client):
+    response = file_client.get("/file", headers={"Range": "items=0-10"})
+
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+
+@pytest.mark.parametrize("use_etag", [True, False])
+def test_if_range_matching_validator(file_client, use_etag):
+    validator = ETAG if use_etag else file_client.last_modified
+    response = file_client.get("/file", headers={"Range": "bytes=0-9", "If-Range": validator})
+
+    assert response.status_code == 206
+    assert response.content == CONTENT[:10]
+
+
+@pytest.mark.parametrize("validator", ['"stale-1"', f"W/{ETAG}", "Thu, 01 Jan 1970 00:00:00 GMT"])
+def test_if_range_mismatch_returns_full_file(file_client, validator):
+    response = file_client.get("/file", headers={"Range": "bytes=0-9", "If-Range": validator})
+
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+
+def test_conditional_requests_return_304(file_client):
+    by_etag = file_client.get("/file", headers={"If-None-Match": f'"other", W/{ETAG}'})
+    by_date = file_client.get("/file", headers={"If-Modified-Since": file_client.last_modified})
+    changed = file_client.get("/file", headers={"If-None-Match": '"other"', "If-Modified-Since": file_client.last_modified})
+
+    assert by_etag.status_code == 304 and by_etag.content == b""
+    assert by_etag.headers["etag"] == ETAG
+    assert by_date.status_code == 304
+    # If-None-Match 优先于 If-Modified-Since
+    assert changed.status_code == 200
+
+
+def test_head_has_headers_without_body(file_client):
+    response = file_client.head("/file", headers={"Range": "bytes=0-9"})
+
+    assert response.status_code == 206
+    assert response.content == b""
+    assert response.headers["content-length"] == "10"
+
+
+def test_versioned_url_is_immutable(file_client):
+    assert "immutable" in file_client.get("/file?v=abc").headers["cache-control"]
+    assert "immutable" not in file_client.get("/file").headers["cache-control"]
@@ -0,0 +1,123 @@
+import io
+import os
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+import pytest
+
+from app.core import storage as storage_module
+from app.core.storage import S3Storage, StorageBackend, publish_files, storage_path
+
+moto_server = pytest.importorskip("moto.server")
+
+
+@pytest.fixture(scope="module")
+def endpoint():
+    """本地S3协议服务（代替MinIO）"""
+    server = moto_server.ThreadedMotoServer(ip_address="127.0.0.1", port=0)
+    server.start()
+    host, port = server.get_host_and_port()
+    yield f"http://{host}:{port}"
+    server.stop()
+
+
+def connect(endpoint, bucket, prefix="site/", **kwargs):
+    return S3Storage(
+        bucket, prefix=prefix, endpoint_url=endpoint, region="us-east-1",
+        access_key="minio", secret_key="minio123", **kwargs,
+    )
+
+
+@pytest.fixture
+def s3(endpoint):
+    backend = connect(endpoint, f"photos-{uuid.uuid4().hex[:12]}")
+    backend.client.create_bucket(Bucket=backend.bucket)
+    return backend
+
+
+def test_storage_backend_is_abstract():
+    with pytest.raises(TypeError):
+        StorageBackend()
+
+
+def test_put_stat_read_and_delete(s3, tmp_path):
+    local = tmp_path / "a.jpg"
+    local.write_bytes(b"jpeg-bytes" * 1000)
+    s3.put_file("blobs/ab/a.jpg", local, content_type="image/jpeg")
+    s3.put_stream("blobs/ab/b.jpg", io.BytesIO(b"stream"))
+
+    stored = s3.stat("blobs/ab/a.jpg")
+    assert stored.key == "blobs/ab/a.jpg" and stored.size == 10000
+    assert abs(stored.modified - time.time()) < 60
+    assert b"".join(s3.iter_bytes("blobs/ab/b.jpg")) == b"stream"
+    assert s3.stat("missing.jpg") is None
+    with pytest.raises(FileNotFoundError):
+        list(s3.iter_bytes("missing.jpg"))
+    # 对象写在前缀下
+    head = s3.client.head_object(Bucket=s3.bucket, Key="site/blobs/ab/a.jpg")
+    assert head["ContentType"] == "image/jpeg" and "immutable" in head["CacheControl"]
+
+    s3.delete("blobs/ab/a.jpg")
+    assert not s3.exists("blobs/ab/a.jpg")
+    s3.delete("blobs/ab/a.jpg")  # 不存在时忽略
+
+
+def test_iter_objects_and_delete_prefix(s3):
+    for key in ("blobs/1.jpg", "blobs/2.jpg", "trash/3.jpg", "4.jpg"):
+        s3.put_stream(key, io.BytesIO(b"x"))
+
+    assert sorted(obj.key for obj in s3.iter_objects()) == ["4.jpg", "blobs/1.jpg", "blobs/2.jpg", "trash/3.jpg"]
+    assert sorted(obj.key for obj in s3.iter_objects(exclude=["trash"])) == ["4.jpg", "blobs/1.jpg", "blobs/2.jpg"]
+
+    s3.delete_prefix("blobs")
+    assert sorted(obj.key for obj in s3.iter_objects()) == ["4.jpg", "trash/3.jpg"]
+
+
+def test_urls(s3, endpoint):
+    s3.put_stream("blobs/a.jpg", io.BytesIO(b"content"))
+
+    assert s3.url("blobs/a.jpg") == "/uploads/blobs/a.jpg"
+    presigned = s3.presigned_url("blobs/a.jpg", download_name="holiday.jpg")
+    response = httpx.get(presigned)
+    assert response.status_code == 200 and response.content == b"content"
+    assert 'filename="holiday.jpg"' in response.headers["content-disposition"]
+
+    public = connect(endpoint, s3.bucket, public_url="https://cdn.example.com/")
+    assert public.url("blobs/a.jpg") == "https://cdn.example.com/site/blobs/a.jpg"
+
+
+def test_local_file_downloads_to_a_temporary_copy(s3):
+    s3.put_stream("blobs/a.jpg", io.BytesIO(b"content"))
+
+    with s3.local_file("blobs/a.jpg") as path:
+        assert path.name == "a.jpg" and path.read_bytes() == b"content"
+    assert not path.exists()
+    with pytest.raises(FileNotFoundError):
+        with s3.local_file("missing.jpg"):
+            pass
+
+
+def test_move_copies_on_the_server(s3, endpoint):
+    quarantine = connect(endpoint, s3.bucket, prefix="site/quarantine/")
+    s3.put_stream("blobs/a.jpg", io.BytesIO(b"content"))
+
+    assert s3.move("blobs/a.jpg", quarantine, "run/blobs/a.jpg") == 7
+    assert not s3.exists("blobs/a.jpg")
+    assert b"".join(quarantine.iter_bytes("run/blobs/a.jpg")) == b"content"
+    assert s3.move("blobs/a.jpg", quarantine, "run/blobs/a.jpg") is None
+
+
+def test_publish_files_uploads_and_removes_staged_copies(s3, monkeypatch):
+    monkeypatch.setattr(storage_module, "_instances", {(False, os.getpid()): s3})
+    staged = [storage_path("blobs/cd/c.jpg"), storage_path("blobs/cd/c_thumb.jpg")]
+    for path in staged:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(path.name.encode())
+
+    publish_files(staged, content_type="image/jpeg")
+
+    assert not any(path.exists() for path in staged)
+    assert b"".join(s3.iter_bytes("blobs/cd/c_thumb.jpg")) == b"c_thumb.jpg"
+    assert s3.stat("blobs/cd/c.jpg").size == len(b"c.jpg")
@@ -0,0 +1,18 @@
+from app import crud, models, schemas
+
+
+def test_topic_cover_records_file_info(client, auth_headers, db, user, jpeg):
+    user.is_superuser = True
+    db.commit()
+    topic = crud.topic.create(db, obj_in=schemas.TopicCreate(name="Travel", slug="travel"))
+
+    response = client.post(
+        f"/api/v1/topics/{topic.id}/upload-cover",
+        files={"file": ("cover.jpg", jpeg(width=800, height=600), "image/jpeg")},
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 200, response.text
+    image = db.query(models.Image).get(response.json()["image_id"])
+    assert (image.width, image.height) == (800, 600)
+    assert image.file_size and image.file_type and image.blurhash and image.phash
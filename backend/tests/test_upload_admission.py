@@ -0,0 +1,120 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.services.upload_admission import AdmissionTimeout, UploadAdmissionController
+
+
+def controller(**kwargs):
+    options = {"max_bytes": 100, "per_key_limit": 2, "timeout": 5}
+    options.update(kwargs)
+    return UploadAdmissionController(**options)
+
+
+def test_queue_is_fifo_by_memory_budget():
+    admission = controller()
+    order = []
+
+    async def request(name, key, cost, hold):
+        async with admission.admit(key, cost):
+            order.append(name)
+            await asyncio.sleep(hold)
+
+    async def main():
+        first = asyncio.ensure_future(request("big-1", "a", 80, 0.1))
+        await asyncio.sleep(0.01)
+        # big-2 排在 small 前面：虽然 small 放得下，也不能越过被预算阻塞的 big-2
+        second = asyncio.ensure_future(request("big-2", "b", 80, 0))
+        await asyncio.sleep(0.01)
+        third = asyncio.ensure_future(request("small", "c", 10, 0))
+        await asyncio.gather(first, second, third)
+
+    asyncio.run(main())
+    assert order == ["big-1", "big-2", "small"]
+
+
+def test_per_user_limit_does_not_block_other_users():
+    admission = controller(per_key_limit=1)
+    order = []
+
+    async def request(name, key, hold):
+        async with admission.admit(key, 10):
+            order.append(name)
+            await asyncio.sleep(hold)
+
+    async def main():
+        first = asyncio.ensure_future(request("a-1", "a", 0.1))
+        await asyncio.sleep(0.01)
+        await asyncio.gather(first, request("a-2", "a", 0), request("b-1", "b", 0))
+
+    asyncio.run(main())
+    assert order == ["a-1", "b-1", "a-2"]
+
+
+def test_wait_does_not_block_the_event_loop():
+    admission = controller(max_bytes=10, timeout=0.2)
+    ticks = []
+
+    async def ticker():
+        for _ in range(5):
+            ticks.append(threading.get_ident())
+            await asyncio.sleep(0.02)
+
+    async def main():
+        holder = await admission.acquire("a", 10)
+        with pytest.raises(AdmissionTimeout):
+            await asyncio.gather(admission.acquire("b", 10), ticker())
+        admission.release("a", holder)
+
+    asyncio.run(main())
+    assert len(ticks) == 5
+    metrics = admission.metrics()
+    assert metrics["timeouts_total"] == 1
+    assert metrics["queue_length"] == 0 and metrics["in_use_bytes"] == 0
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    admission = controller(max_bytes=10)
+
+    async def main():
+        holder = await admission.acquire("a", 10)
+        waiter = asyncio.ensure_future(admission.acquire("b", 10))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert admission.metrics()["queue_length"] == 0
+        admission.release("a", holder)
+        # 取消的等待者没有占用额度，后续请求可以立即获准
+        async with admission.admit("c", 10, timeout=0):
+            pass
+
+    asyncio.run(main())
+    assert admission.metrics()["in_use_bytes"] == 0
+
+
+def test_release_from_another_event_loop_wakes_waiter():
+    admission = controller(max_bytes=10)
+    holder = {}
+    acquired = threading.Event()
+
+    def other_loop():
+        async def hold():
+            holder["cost"] = await admission.acquire("a", 10)
+            acquired.set()
+            await asyncio.sleep(0.1)
+            admission.release("a", holder["cost"])
+
+        asyncio.run(hold())
+
+    thread = threading.Thread(target=other_loop)
+    thread.start()
+    acquired.wait(5)
+
+    async def main():
+        async with admission.admit("b", 10, timeout=2):
+            return True
+
+    assert asyncio.run(main())
+    thread.join()
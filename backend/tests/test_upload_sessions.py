@@ -0,0 +1,139 @@
+import hashlib
+
+from app import crud
+from app.api.v1.endpoints import upload_sessions
+from app.services import chunked_upload
+
+BASE = "/api/v1/upload-sessions"
+
+
+def create_session(client, headers, content: bytes, **extra):
+    response = client.post(
+        f"{BASE}/",
+        json={
+            "filename": "photo.jpg",
+            "total_size": len(content),
+            "file_hash": hashlib.sha256(content).hexdigest(),
+            "title": "photo",
+            **extra,
+        },
+        headers=headers,
+    )
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+
+def put_chunk(client, headers, session_id, content: bytes, start: int, end: int):
+    return client.put(
+        f"{BASE}/{session_id}",
+        content=content[start : end + 1],
+        headers={**headers, "Content-Range": f"bytes {start}-{end}/{len(content)}"},
+    )
+
+
+def test_chunked_upload_completes(client, auth_headers, jpeg):
+    content = jpeg()
+    session_id = create_session(client, auth_headers, content)
+    middle = len(content) // 2
+
+    first = put_chunk(client, auth_headers, session_id, content, 0, middle - 1)
+    assert first.status_code == 200 and first.json()["received_size"] == middle
+    # 未带 Content-Range 时从已接收偏移追加
+    second = client.put(f"{BASE}/{session_id}", content=content[middle:], headers=auth_headers)
+    assert second.status_code == 200 and second.json()["completed"]
+
+    response = client.post(f"{BASE}/{session_id}/complete", headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert not chunked_upload.get_part_path(session_id).exists()
+
+
+def test_chunk_at_wrong_offset_conflicts(client, auth_headers, jpeg):
+    content = jpeg()
+    session_id = create_session(client, auth_headers, content)
+    assert put_chunk(client, auth_headers, session_id, content, 0, 99).status_code == 200
+
+    replayed = put_chunk(client, auth_headers, session_id, content, 0, 99)
+    skipped = put_chunk(client, auth_headers, session_id, content, 200, 299)
+
+    for response in (replayed, skipped):
+        assert response.status_code == 409
+        assert response.headers["upload-offset"] == "100"
+    assert chunked_upload.get_part_path(session_id).stat().st_size == 100
+
+
+def test_chunk_while_another_request_writes_conflicts(client, auth_headers, jpeg):
+    content = jpeg()
+    session_id = create_session(client, auth_headers, content)
+
+    with chunked_upload.locked_part(session_id):
+        response = put_chunk(client, auth_headers, session_id, content, 0, 99)
+
+    assert response.status_code == 409
+    assert response.headers["upload-offset"] == "0"
+    assert put_chunk(client, auth_headers, session_id, content, 0, 99).status_code == 200
+
+
+def test_offset_is_rechecked_after_acquiring_the_lock(client, auth_headers, db, jpeg, monkeypatch):
+    content = jpeg()
+    session_id = create_session(client, auth_headers, content)
+    acquire_part = chunked_upload.acquire_part
+
+    def acquire_after_concurrent_chunk(sid):
+        # 模拟另一个请求在偏移检查之后、加锁之前写完了同一分片
+        chunked_upload.get_part_path(sid).write_bytes(content[:100])
+        crud.upload_session.advance(db, id=sid, expected_offset=0, new_offset=100)
+        return acquire_part(sid)
+
+    monkeypatch.setattr(chunked_upload, "acquire_part", acquire_after_concurrent_chunk)
+    response = put_chunk(client, auth_headers, session_id, content, 0, 99)
+
+    assert response.status_code == 409
+    assert response.headers["upload-offset"] == "100"
+    assert chunked_upload.get_part_path(session_id).read_bytes() == content[:100]
+
+
+def test_oversized_chunk_is_rolled_back(client, auth_headers, jpeg):
+    content = jpeg()
+    session_id = create_session(client, auth_headers, content)
+    response = client.put(
+        f"{BASE}/{session_id}",
+        content=content[:200],
+        headers={**auth_headers, "Content-Range": f"bytes 0-99/{len(content)}"},
+    )
+
+    assert response.status_code == 400
+    assert client.get(f"{BASE}/{session_id}", headers=auth_headers).json()["received_size"] == 0
+    assert chunked_upload.get_part_path(session_id).stat().st_size == 0
+
+
+def test_incomplete_session_cannot_complete(client, auth_headers, jpeg):
+    content = jpeg()
+    session_id = create_session(client, auth_headers, content)
+    put_chunk(client, auth_headers, session_id, content, 0, 99)
+
+    response = client.post(f"{BASE}/{session_id}/complete", headers=auth_headers)
+
+    assert response.status_code == 409
+    assert response.headers["upload-offset"] == "100"
+
+
+def test_chunk_is_synced_before_offset_advances(client, auth_headers, jpeg, monkeypatch):
+    content = jpeg()
+    session_id = create_session(client, auth_headers, content)
+    calls = []
+    fsync, advance = upload_sessions.os.fsync, crud.upload_session.advance
+
+    def record_fsync(fd):
+        calls.append("fsync")
+        fsync(fd)
+
+    def record_advance(*args, **kwargs):
+        calls.append("advance")
+        return advance(*args, **kwargs)
+
+    monkeypatch.setattr(upload_sessions.os, "fsync", record_fsync)
+    monkeypatch.setattr(crud.upload_session, "advance", record_advance)
+    response = put_chunk(client, auth_headers, session_id, content, 0, len(content) - 1)
+
+    assert response.status_code == 200, response.text
+    assert calls == ["fsync", "advance"]
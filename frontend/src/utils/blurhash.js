@@ -0,0 +1,106 @@
+/**
+ * BlurHash 解码（https://blurha.sh），把后端计算的占位图字符串渲染为小尺寸 data URL，
+ * 在原图加载完成前作为背景显示。解码结果按字符串缓存。
+ */
+const BASE83_CHARS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~';
+const PLACEHOLDER_SIZE = 32;
+const cache = new Map();
+
+function decode83(str) {
+  let value = 0;
+  for (const char of str) {
+    value = value * 83 + BASE83_CHARS.indexOf(char);
+  }
+  return value;
+}
+
+function sRGBToLinear(value) {
+  const v = value / 255;
+  return v <= 0.04045 ? v / 12.92 : Math.pow((v + 0.055) / 1.055, 2.4);
+}
+
+function linearToSRGB(value) {
+  const v = Math.max(0, Math.min(1, value));
+  return v <= 0.0031308
+    ? Math.round(v * 12.92 * 255)
+    : Math.round((1.055 * Math.pow(v, 1 / 2.4) - 0.055) * 255);
+}
+
+function signPow(value, exponent) {
+  return Math.sign(value) * Math.pow(Math.abs(value), exponent);
+}
+
+/**
+ * 把 BlurHash 解码为 RGBA 像素数组
+ * @param {string} hash - BlurHash 字符串
+ * @param {number} width - 输出宽度
+ * @param {number} height - 输出高度
+ * @returns {Uint8ClampedArray|null} 像素数据，字符串无效时返回 null
+ */
+export function decodeBlurhash(hash, width, height) {
+  if (!hash || hash.length < 6) return null;
+
+  const sizeFlag = decode83(hash[0]);
+  const numX = (sizeFlag % 9) + 1;
+  const numY = Math.floor(sizeFlag / 9) + 1;
+  if (hash.length !== 4 + 2 * numX * numY) return null;
+
+  const maxValue = (decode83(hash[1]) + 1) / 166;
+  const colors = new Array(numX * numY);
+  const dc = decode83(hash.substring(2, 6));
+  colors[0] = [sRGBToLinear(dc >> 16), sRGBToLinear((dc >> 8) & 255), sRGBToLinear(dc & 255)];
+  for (let i = 1; i < colors.length; i++) {
+    const value = decode83(hash.substring(4 + i * 2, 6 + i * 2));
+    colors[i] = [
+      signPow((Math.floor(value / (19 * 19)) - 9) / 9, 2) * maxValue,
+      signPow(((Math.floor(value / 19) % 19) - 9) / 9, 2) * maxValue,
+      signPow(((value % 19) - 9) / 9, 2) * maxValue,
+    ];
+  }
+
+  const pixels = new Uint8ClampedArray(width * height * 4);
+  for (let y = 0; y < height; y++) {
+    for (let x = 0; x < width; x++) {
+      let r = 0, g = 0, b = 0;
+      for (let j = 0; j < numY; j++) {
+        const basisY = Math.cos((Math.PI * y * j) / height);
+        for (let i = 0; i < numX; i++) {
+          const basis = Math.cos((Math.PI * x * i) / width) * basisY;
+          const color = colors[i + j * numX];
+          r += color[0] * basis;
+          g += color[1] * basis;
+          b += color[2] * basis;
+        }
+      }
+      const offset = 4 * (x + y * width);
+      pixels[offset] = linearToSRGB(r);
+      pixels[offset + 1] = linearToSRGB(g);
+      pixels[offset + 2] = linearToSRGB(b);
+      pixels[offset + 3] = 255;
+    }
+  }
+  return pixels;
+}
+
+/**
+ * 把 BlurHash 渲染为可直接用于 CSS background-image 的 data URL
+ * @param {string} hash - BlurHash 字符串
+ * @returns {string|null} data URL，无占位图或解码失败时返回 null
+ */
+export function blurhashToDataURL(hash) {
+  if (!hash || typeof document === 'undefined') return null;
+  if (cache.has(hash)) return cache.get(hash);
+
+  let url = null;
+  const pixels = decodeBlurhash(hash, PLACEHOLDER_SIZE, PLACEHOLDER_SIZE);
+  if (pixels) {
+    const canvas = document.createElement('canvas');
+    canvas.width = PLACEHOLDER_SIZE;
+    canvas.height = PLACEHOLDER_SIZE;
+    const ctx = canvas.getContext('2d');
+    ctx.putImageData(new ImageData(pixels, PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), 0, 0);
+    url = canvas.toDataURL();
+  }
+  cache.set(hash, url);
+  return url;
+}